@@ -1,47 +1,21 @@
 #a.py
 
 import streamlit as st
+import os
 import re
-from PIL import Image
-import requests
-from io import BytesIO
+from functools import partial
 from streamlit_cropper import st_cropper
-import numpy as np
 import drive_module.drive_ops as drive_ops
-import cv2
-import tempfile
-
-def get_video_size_from_drive(file_id: str):
-    url = f"https://drive.google.com/uc?export=download&id={file_id}"
-
-    # tải về file tạm
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-        r = requests.get(url, stream=True)
-        for chunk in r.iter_content(chunk_size=8192):
-            tmp.write(chunk)
-        tmp_path = tmp.name
-
-    # đọc metadata bằng cv2
-    cap = cv2.VideoCapture(tmp_path)
-    width  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    cap.release()
-    return width, height, frame_count
-
-def get_image_size_from_drive(file_id: str):
-    url = f"https://drive.google.com/uc?export=download&id={file_id}"
-    r = requests.get(url)  # không dùng stream=True
-    r.raise_for_status()
-    img = Image.open(BytesIO(r.content))
-    return img.width, img.height, 1
-
-
-def get_file_size(file_id: str, is_video: bool):
-    if is_video:
-        return get_video_size_from_drive(file_id)
-    else:
-        return get_image_size_from_drive(file_id)
+from drive_module.media_size import get_file_size
+from drive_module.snippets import image_html, image_markdown, is_still_image, iter_media_sizes, thumbnail_url, video_embed, video_iframe
+from drive_module.preview_cache import get_preview_cache
+from drive_module.image_crop import ASPECT_RATIOS, compute_crop_box, crop_and_encode, make_proxy, rect_to_full, scale_box
+from drive_module.batch_crop import build_crop_zip, save_archive
+from drive_module.scheduler import DOWNLOAD, INTERACTIVE, get_scheduler
+from drive_module.instrumentation import start_trace
+
+# Mỗi lần rerun là một trace riêng
+start_trace("Drive_HTML")
 
 if "file_name_om" not in st.session_state:
     st.session_state.file_name_om = ""
@@ -50,46 +24,11 @@ if "file_name_om" not in st.session_state:
 def reset_filename():
     st.session_state.file_name_om = ""
 
-    
-def get_largest_crop_fit(img_width, img_height, aspect_ratio):
-    """
-    Tìm khung crop lớn nhất với tỉ lệ aspect_ratio (w/h),
-    sao cho không vượt ra ngoài ảnh và ít nhất 1 chiều đạt max (rộng hoặc cao).
-    Trả về: crop_width, crop_height, (min_cx, max_cx, min_cy, max_cy)
-    """
-    a, b = aspect_ratio
-    crop_width_by_height = int(img_height * a / b)
-
-    if crop_width_by_height <= img_width:
-        # Chiều cao chiếm tối đa
-        crop_width = crop_width_by_height
-        crop_height = img_height
-    else:
-        # Chiều rộng chiếm tối đa
-        crop_width = img_width
-        crop_height = int(img_width * b / a)
-
-    # Giới hạn tâm khung để khung không vượt biên
-    min_cx = crop_width // 2
-    max_cx = img_width - crop_width // 2
-    min_cy = crop_height // 2
-    max_cy = img_height - crop_height // 2
-
-    center_range = (min_cx, max_cx, min_cy, max_cy)
-
-    return crop_width, crop_height, center_range
-
-def get_crop_center(rect):
-    left = rect[0]
-    top = rect[1]
-    width = rect[2]
-    height = rect[3]
-
-    center_x = left + width / 2
-    center_y = top + height / 2
-
-    return center_x, center_y
+def read_file_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
 
+    
 def extract_file_id(link):
     """
     Trích xuất file_id từ URL Google Drive
@@ -112,38 +51,60 @@ with st.sidebar:
     image_list = []
     video_list = []
     if folder_id:
-        image_list_unsort, video_list_unsort = drive_ops.get_images_in_folder(folder_id)  # List of tuples: (name, file_id)
+        image_list_unsort, video_list_unsort = drive_ops.get_images_in_folder(folder_id)  # List of MediaFile: (name, file_id, ..., width, height)
         image_list_none= sorted(image_list_unsort, key=lambda x: x[0])
-        image_list = st.multiselect("Các ảnh:", options=image_list_none, default= image_list_none, key= "linksheeh")
+        image_list = st.multiselect("Các ảnh:", options=image_list_none, default= image_list_none, format_func=lambda x: x.name, key= "linksheeh")
         video_list_none = sorted(video_list_unsort, key=lambda x: x[0])
-        video_list = st.multiselect("Các video:", options=video_list_none, default= video_list_none, key= "linkshevideo") 
+        video_list = st.multiselect("Các video:", options=video_list_none, default= video_list_none, format_func=lambda x: x.name, key= "linkshevideo") 
 # Tabs
-tab1, tab2 = st.tabs(["Drive Link", "Crop Image"])
+tab1, tab2, tab3 = st.tabs(["Drive Link", "Crop Image", "Batch Crop"])
 with tab1:
     st.title("Google Drive Image Link Formatter")
     video_mode = st.sidebar.checkbox("Video Mode?", key="Video_modeLL")
+    max_concurrency = st.sidebar.number_input("Số file xử lý song song:", min_value=1, max_value=32, value=8, key="preview_concurrency")
     # Load selected file_id from sidebar (if any)
     mul_link = []
     if image_list or video_list: 
         st.markdown("### ✅ Ảnh xem trước:")
         cols = st.columns(3)
 
+        # Đặt sẵn ô giữ chỗ cho mọi ảnh, rồi lấy kích thước song song và điền từng ô khi có kết quả
+        cells = []
         for i, image in enumerate(image_list):
+            with cols[i % 3]:
+                cell = st.empty()
+                cell.caption(f"⏳ {image.name}")
+                cells.append(cell)
+
+        image_links = [None] * len(image_list)
+        for i, image, size, error in iter_media_sizes(image_list, video_mode, max_workers=max_concurrency):
             file_id = image[1]
-            original_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-            img_width_, img_height_, Blue = get_file_size(file_id, video_mode)
-            thumbnail_url = f"https://drive.google.com/thumbnail?id={file_id}&sz=s{max(img_width_, img_height_)}"
-            html_code = f"<img src='{thumbnail_url}' alt='{image[0]}' style='width:100%; border-radius:6px;'>"
-            markdown_code = f'![Preview]({thumbnail_url})'
-            if Blue == 1 or Blue < 0:
-                with cols[i % 3]:
+            if error is not None:
+                cells[i].error(f"❌ {image.name}: {error}")
+                continue
+            img_width_, img_height_, Blue = size
+            image_url = thumbnail_url(file_id, img_width_, img_height_)
+            # Ảnh xem trước lấy từ cache cục bộ; chưa có thì dùng thumbnail Drive và tạo nền
+            preview_src = image_url
+            if image.modified_time:
+                preview_cache = get_preview_cache()
+                preview_src = preview_cache.data_uri(file_id, image.modified_time) or image_url
+                preview_cache.request(file_id, image.modified_time)
+            html_code = image_html(preview_src, alt=image[0], style="width:100%; border-radius:6px;")
+            if is_still_image(Blue):
+                with cells[i].container():
                     st.markdown(html_code, unsafe_allow_html=True)
-                    st.code(thumbnail_url)
-                mul_link.append(f"- {thumbnail_url}")
+                    st.code(image_url)
+                image_links[i] = f"- {image_url}"
+            else:
+                cells[i].empty()
+
+        # Giữ đúng thứ tự ảnh trong khối link, không phụ thuộc thứ tự tải xong
+        mul_link.extend(link for link in image_links if link)
 
         for i, video in enumerate(video_list):
             file_id = video[1]
-            video_link = f"<iframe src='https://drive.google.com/file/d/{file_id}/preview' width='1024' height='576' allow='autoplay' allowfullscreen webkitallowfullscreen mozallowfullscreen></iframe>"
+            video_link = video_iframe(file_id)
             st.markdown('### 📋 Video:')
             st.markdown(video_link, unsafe_allow_html=True)
             st.code(video_link)
@@ -161,96 +122,86 @@ with tab1:
             file_id = extract_file_id(drive_link)
             if file_id:
                 original_url = f"https://drive.google.com/uc?export=download&id={file_id}"
-                img_width_, img_height_, Blue = get_file_size(file_id, video_mode)
-                thumbnail_url = f"https://drive.google.com/thumbnail?id={file_id}&sz=s{max(img_width_, img_height_)}"
-                html_code = f"<img src='{thumbnail_url}' alt='Preview'>"
-                markdown_code = f'![Preview]({thumbnail_url})'
-                if Blue == 1 or Blue < 0:
-                    st.markdown("### ✅ Ảnh xem trước:")
-                    st.markdown(html_code, unsafe_allow_html=True)
-
-                    st.markdown("### URL Ảnh:")
-                    st.code(thumbnail_url)
-                    st.markdown("### 📋 HTML:")
-                    st.code(html_code, language="html")
-                    st.markdown("### 📋 Markdown:")
-                    st.code(markdown_code, language="markdown")
+                try:
+                    img_width_, img_height_, Blue = get_file_size(file_id, video_mode)
+                except Exception as e:
+                    # Lỗi tải / md5 / mạng → báo lỗi như iter_media_sizes thay vì traceback
+                    st.error(f"❌ Không đọc được kích thước của {file_id}: {e}")
                 else:
-                    video_link = f"""
-                        <style>
-                        .embed-container {{ position: relative; width: 100%; padding-bottom: 56.25%; height: 0; overflow: hidden; }}
-                        .embed-container iframe, .embed-container video {{ position: absolute; top:0; left:0; width:100%; height:100%; }}
-                        </style>
-
-                        <div class="embed-container">
-                        <iframe src="https://drive.google.com/file/d/{file_id}/preview" frameborder="0" allowfullscreen></iframe>
-                        </div>
-                    """
-                    st.markdown('### 📋 Video:')
-                    st.markdown(video_link, unsafe_allow_html=True)
-                    st.code(video_link)
-                    st.sidebar.markdown("Bìa Video:")
-                st.sidebar.code(thumbnail_url)
+                    image_url = thumbnail_url(file_id, img_width_, img_height_)
+                    html_code = image_html(image_url)
+                    markdown_code = image_markdown(image_url)
+                    if is_still_image(Blue):
+                        st.markdown("### ✅ Ảnh xem trước:")
+                        st.markdown(html_code, unsafe_allow_html=True)
+
+                        st.markdown("### URL Ảnh:")
+                        st.code(image_url)
+                        st.markdown("### 📋 HTML:")
+                        st.code(html_code, language="html")
+                        st.markdown("### 📋 Markdown:")
+                        st.code(markdown_code, language="markdown")
+                    else:
+                        video_link = video_embed(file_id)
+                        st.markdown('### 📋 Video:')
+                        st.markdown(video_link, unsafe_allow_html=True)
+                        st.code(video_link)
+                        st.sidebar.markdown("Bìa Video:")
+                    st.sidebar.code(image_url)
             else:
                 st.error("❌ Không thể trích xuất file_id từ link đã nhập.")
 
 
 
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def fetch_image_bytes(url):
+    response = get_scheduler().get(url, DOWNLOAD, INTERACTIVE)
+    response.raise_for_status()
+    return response.content
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_crop_proxy(url):
+    # Ảnh proxy thu nhỏ cho st_cropper, chỉ tạo một lần cho mỗi URL
+    return make_proxy(fetch_image_bytes(url))
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def encode_crop(url, box, ratio):
+    # Decode ảnh gốc và encode PNG một lần cho mỗi (url, khung, tỉ lệ)
+    return crop_and_encode(fetch_image_bytes(url), box, fmt="PNG")
+
 with tab2:
     demo_url = st.text_input("Dán URL ảnh vào đây:", value="")
 
     return_type = st.checkbox("Chế Độ Auto?", value=True)
     ratio_choice = st.selectbox("Chọn tỉ lệ crop:", ["3:2", "2:3", "1:1", "4:3", "16:9", "3:4", "9:16", "1:1.4"])
-    aspect_dict = {
-        "1:1": (1, 1),
-        "16:9": (16, 9),
-        "4:3": (4, 3),
-        "3:4": (3, 4),
-        "2:3": (2, 3),
-        "9:16": (9, 16),
-        "3:2": (3,2),
-        "1:1.4": (10,14)
-    }
+    aspect_dict = ASPECT_RATIOS
     aspect_ratio = aspect_dict[ratio_choice]
     if demo_url and not drive_link:
-        response = requests.get(demo_url)
-        if response.status_code == 200:
-            img = Image.open(BytesIO(response.content))
-            
-        img_width, img_height = img.size
-        raw_image = np.asarray(img).astype('uint8')
+        # st_cropper làm việc trên proxy nhỏ, toạ độ được đổi về ảnh gốc
+        proxy_img, scale, (img_width, img_height) = load_crop_proxy(demo_url)
         rect = st_cropper(
-            img,
+            proxy_img,
             realtime_update=True,
             box_color="#0000FF",
             aspect_ratio=aspect_ratio,
             return_type="box",
             stroke_width=1
         )
-        left, top, width, height = tuple(map(int, rect.values()))
-
-        if return_type:
-            crop_width, crop_height, center_range = get_largest_crop_fit(img_width, img_height, aspect_ratio)
-            center = get_crop_center(tuple(map(int, rect.values())))
-
-            clamped_x = max(center_range[0], min(center[0], center_range[1]))
-            clamped_y = max(center_range[2], min(center[1], center_range[3]))
-            crop_left = int(clamped_x - crop_width / 2)
-            crop_top = int(clamped_y - crop_height / 2)
-
-            # Cắt ảnh theo đúng rect đã chọn
-            cropped_np = raw_image[crop_top:crop_top + crop_height, crop_left:crop_left + crop_width]
-        else:
-            cropped_np = raw_image[top:top + height, left:left + width]
+        full_rect = rect_to_full(tuple(map(int, rect.values())), scale)
+        crop_box = compute_crop_box(img_width, img_height, aspect_ratio, full_rect, auto=return_type)
+        # Nhớ tâm khung của ảnh Drive này để Batch Crop dùng lại
+        crop_file_id = extract_file_id(demo_url)
+        if crop_file_id:
+            st.session_state.setdefault("crop_centers", {})[crop_file_id] = (
+                (crop_box[0] + crop_box[2]) / 2,
+                (crop_box[1] + crop_box[3]) / 2
+            )
 
-        cropped_img = Image.fromarray(cropped_np)
+        # Xem trước cắt từ proxy, không đụng tới ảnh gốc
+        cropped_img = proxy_img.crop(scale_box(crop_box, scale))
         st.write("Preview")
         st.image(cropped_img)
-        # Save the cropped image to a BytesIO buffer in PNG format
-        buf = BytesIO()
-        cropped_img.save(buf, format="PNG")
-        buf.seek(0)
 
         st.text_input("Tên ảnh khi tải xuống:", key="file_name_om")
 
@@ -258,8 +209,59 @@ with tab2:
             file_name = f"{st.session_state.file_name_om}.png"
             st.download_button(
                 label="Download Cropped Image",
-                data=buf,
+                data=encode_crop(demo_url, crop_box, ratio_choice),
                 file_name=file_name,
                 mime="image/png",
                 on_click=reset_filename  # Reset sau khi tải
             )
+
+with tab3:
+    st.title("Crop hàng loạt cả thư mục")
+    if not image_list:
+        st.info("Chọn thư mục Drive (và các ảnh) ở sidebar trước.")
+    else:
+        batch_ratio = st.selectbox("Chọn tỉ lệ crop:", list(ASPECT_RATIOS), key="batch_ratio")
+        batch_format = st.selectbox("Định dạng:", ["PNG", "JPEG", "WEBP"], key="batch_format")
+        batch_workers = st.number_input("Số ảnh xử lý song song:", min_value=1, max_value=32, value=4, key="batch_workers")
+        saved_centers = st.session_state.get("crop_centers", {})
+        st.caption(f"{len(image_list)} ảnh, {sum(1 for m in image_list if m.id in saved_centers)} ảnh có tâm đã lưu từ tab Crop Image.")
+
+        if st.button("Crop tất cả", key="batch_run"):
+            progress_bar = st.progress(0.0)
+            status = st.empty()
+
+            def report(done, total, name, error):
+                progress_bar.progress(done / total)
+                status.write(f"{done}/{total}: {name}" + (f" ❌ {error}" if error else ""))
+
+            archive, failures = build_crop_zip(
+                image_list,
+                ASPECT_RATIOS[batch_ratio],
+                centers=saved_centers,
+                fmt=batch_format,
+                max_workers=int(batch_workers),
+                progress=report
+            )
+            # Session chỉ giữ đường dẫn ZIP trên đĩa (và tên file theo tỉ lệ đã dùng), không giữ bytes
+            previous = st.session_state.get("batch_zip")
+            if previous and os.path.exists(previous["path"]):
+                os.remove(previous["path"])
+            st.session_state["batch_zip"] = {
+                "path": save_archive(archive),
+                "file_name": f"crop_{batch_ratio.replace(':', 'x')}.zip",
+            }
+            archive.close()
+            for name, error in failures:
+                st.error(f"❌ {name}: {error}")
+
+        batch_zip = st.session_state.get("batch_zip")
+        if batch_zip and os.path.exists(batch_zip["path"]):
+            st.download_button(
+                label="Download ZIP",
+                data=partial(read_file_bytes, batch_zip["path"]),  # chỉ đọc file khi bấm tải
+                file_name=batch_zip["file_name"],
+                mime="application/zip"
+            )
+
+drive_ops.search_panel(folder_id)
+drive_ops.metrics_panel(show=st.sidebar.checkbox("📊 Hiện số liệu hiệu năng", key="show_metrics"))
@@ -0,0 +1,47 @@
+#bench_auth_startup.py
+"""
+Đo thời gian import drive_module.drive_ops, thời gian tạo Drive service lần đầu
+và thời gian tới khi request đầu tiên trả về. Mỗi lần đo chạy trong một interpreter mới.
+Cần credentials thật (drive_module/secrets.toml).
+
+Chạy từ thư mục gốc repo (chạy trên commit cũ và mới để so sánh):
+    python -m benchmarks.bench_auth_startup --runs 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import drive_module.drive_ops as drive_ops
+t1 = time.perf_counter()
+# Bản cũ tạo service ngay lúc import (drive_ops.drive_service), bản mới tạo lười
+service = getattr(drive_ops, "drive_service", None) or drive_ops.get_drive_service()
+t2 = time.perf_counter()
+service.files().list(pageSize=1, fields="files(id)").execute()
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "service": t2 - t1, "first_request": t3 - t2, "total": t3 - t0}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], check=True, capture_output=True, text=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    for key in ("import", "service", "first_request", "total"):
+        values = [s[key] for s in samples]
+        print(f"{key:<14} median {statistics.median(values) * 1000:>9.1f} ms   min {min(values) * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
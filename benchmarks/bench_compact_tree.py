@@ -0,0 +1,65 @@
+#bench_compact_tree.py
+"""
+So sánh build_tree (dict-of-lists, file là chuỗi "id|modifiedTime|name") với CompactTree
+trên cây lớn: thời gian dựng, bộ nhớ giữ lại (tracemalloc), duyệt mọi file .md và tra cứu theo id.
+
+Chạy từ thư mục gốc repo:
+    python -m benchmarks.bench_compact_tree --depth 4 --fanout 8 --files 25
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.fake_drive import FakeDrive, generate_tree
+from drive_module.compact_tree import CompactTree
+from drive_module.drive_api import build_tree, iter_markdown_files
+
+
+def measure(label, build, items, root_id, lookups):
+    tracemalloc.start()
+    start = time.perf_counter()
+    tree = build(items)
+    build_seconds = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    files = sum(1 for _ in iter_markdown_files(root_id, tree))
+    walk_seconds = time.perf_counter() - start
+
+    # Tra cứu thông tin của một file theo id: tree cũ phải quét chuỗi của cả folder cha
+    start = time.perf_counter()
+    for item in lookups:
+        if isinstance(tree, CompactTree):
+            tree.modified[tree.index_of(item["id"])]
+        else:
+            next(f.split("|")[1] for f in tree[item["parents"][0]]["files"] if f.startswith(item["id"] + "|"))
+    lookup_seconds = time.perf_counter() - start
+
+    print(f"{label:<14} dựng {build_seconds:>7.3f}s  giữ {retained / 1024 / 1024:>7.1f} MB  "
+          f"duyệt {walk_seconds:>7.3f}s ({files} file)  tra {len(lookups)} id {lookup_seconds:>7.3f}s")
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=8)
+    parser.add_argument("--files", type=int, default=25, help="Số file .md mỗi folder")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    drive = generate_tree(FakeDrive(), depth=args.depth, fanout=args.fanout, files_per_folder=args.files)
+    items = list(drive.files.values())
+    # Cây dựng từ snapshot JSON (TreeSync) nên chuỗi không dùng chung với items
+    items = [dict(item, id=item["id"][:], name=item["name"][:]) for item in items]
+    lookups = [i for i in items if i["mimeType"] == "text/markdown" and i["parents"][0] != "root"][::max(1, len(items) // args.lookups)][:args.lookups]
+    print(f"{len(items)} item")
+
+    measure("build_tree", build_tree, items, "root", lookups)
+    measure("CompactTree", lambda it: CompactTree(it, "root"), items, "root", lookups)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#bench_crawler.py
+"""
+So sánh cách duyệt đệ quy tuần tự cũ (mỗi folder một lần gọi API, depth-first)
+với FolderCrawler (BFS, gộp query theo tầng, chạy song song) trên Drive giả có độ trễ.
+
+Chạy từ thư mục gốc repo:
+    python -m benchmarks.bench_crawler --depth 4 --fanout 4 --latency 0.05 --workers 8
+"""
+
+import argparse
+import time
+
+from benchmarks.fake_drive import FOLDER_MIME, FakeDrive, generate_tree
+from drive_module.crawler import crawl_folder_tree
+
+
+def sequential_recursive(service, folder_id):
+    """Tái hiện list_folder_contents_recursive cũ: một files().list mỗi folder, đệ quy."""
+    query = f"'{folder_id}' in parents and trashed = false"
+    items = service.files().list(q=query, pageSize=1000).execute().get("files", [])
+    all_items = []
+    for item in items:
+        all_items.append(item)
+        if item.get("mimeType") == FOLDER_MIME:
+            all_items.extend(sequential_recursive(service, item["id"]))
+    return all_items
+
+
+def run(label, drive, func):
+    drive.calls = 0
+    start = time.perf_counter()
+    items = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:>8.3f}s {drive.calls:>8} calls {len(items):>8} items")
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--files", type=int, default=5, help="Số file .md mỗi folder")
+    parser.add_argument("--latency", type=float, default=0.05, help="Độ trễ mỗi lần gọi API (giây)")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    drive = generate_tree(FakeDrive(args.latency), depth=args.depth, fanout=args.fanout,
+                          files_per_folder=args.files)
+    folders = sum(1 for f in drive.files.values() if f["mimeType"] == FOLDER_MIME)
+    print(f"{len(drive.files)} items, {folders} folders, latency {args.latency * 1000:.0f} ms/call")
+
+    baseline = run("sequential depth-first", drive, lambda: sequential_recursive(drive.service(), "root"))
+    crawled = run(f"BFS crawler ({args.workers} workers)", drive,
+                  lambda: crawl_folder_tree(drive.service, "root", max_workers=args.workers))
+
+    assert sorted(i["id"] for i in baseline) == sorted(i["id"] for i in crawled)
+
+
+if __name__ == "__main__":
+    main()
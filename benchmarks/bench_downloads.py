@@ -0,0 +1,128 @@
+#bench_downloads.py
+"""
+Đo DownloadManager (drive_module/downloads.py) trên Drive giả với video lớn:
+- tải cả file theo cách cũ (8 KB/lần, file tạm không xóa) so với tải theo đoạn Range lớn
+- 16 thread cùng xin một file: số lần tải thật
+- kết nối đứt giữa chừng: số byte tải lại khi tải tiếp bằng Range
+- md5Checksum sai → ChecksumError, không để lại file hỏng trong kho
+- kho bị giới hạn dung lượng sau khi tải nhiều file
+
+Chạy từ thư mục gốc repo:
+    python -m benchmarks.bench_downloads --mb 64 --files 8
+"""
+
+import os
+import tempfile
+
+# Kho tải về nằm trong thư mục tạm, không đụng ~/.cache của máy
+os.environ.setdefault("DRIVE2HTML_CACHE_DIR", tempfile.mkdtemp(prefix="drive2html-bench-"))
+
+import argparse
+import glob
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_drive import FakeDrive, make_mp4
+from drive_module import auth
+from drive_module.downloads import DRIVE_DOWNLOAD_URL, ChecksumError, DownloadManager
+from drive_module.scheduler import configure_scheduler
+
+MB = 1024 * 1024
+
+
+def old_full_download(session, file_id):
+    """Như get_video_size_from_drive cũ: một request, ghi 8 KB/lần vào NamedTemporaryFile(delete=False)."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4", prefix="bench-old-") as tmp:
+        r = session.get(DRIVE_DOWNLOAD_URL.format(file_id=file_id), stream=True)
+        for chunk in r.iter_content(chunk_size=8192):
+            tmp.write(chunk)
+    return tmp.name
+
+
+def report(label, drive, seconds, extra=""):
+    c = drive.counters()
+    print(f"{label:<34} {seconds:>8.3f}s  HTTP {c['http_requests']:>5}  tải {c['bytes'] / MB:>8.1f} MB  {extra}")
+    drive.reset_counters()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=64, help="Dung lượng mỗi video (MB)")
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--chunk-mb", type=float, default=8)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    drive = FakeDrive(args.latency)
+    for n in range(args.files):
+        # Mỗi video khác nhau 8 byte cuối để md5 không trùng
+        data = make_mp4(1280, 720, mdat_bytes=args.mb * MB)
+        drive.add({"id": f"vid{n}", "name": f"vid{n}.mp4", "mimeType": "video/mp4", "parents": ["root"]},
+                  data[:-8] + n.to_bytes(8, "big"))
+    auth.set_service_factory(drive.service)
+    configure_scheduler({name: (1e9, 10 ** 9) for name in ("metadata", "media", "download")})
+    session = drive.http_session()
+    store = tempfile.mkdtemp(prefix="bench-downloads-")
+    manager = DownloadManager(store, max_bytes=10 ** 12, chunk_size=int(args.chunk_mb * MB), session=session)
+    print(f"{args.files} video x {args.mb} MB, chunk {args.chunk_mb} MB")
+
+    # 1. tải một file: cách cũ và DownloadManager
+    start = time.perf_counter()
+    leaked = old_full_download(session, "vid0")
+    report("cũ: 8 KB/lần, file tạm", drive, time.perf_counter() - start)
+    os.remove(leaked)
+
+    start = time.perf_counter()
+    manager.fetch("vid0")
+    report("mới: Range theo đoạn + md5", drive, time.perf_counter() - start)
+
+    # 2. nhiều thread cùng xin một file
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        leaked = list(pool.map(lambda _: old_full_download(session, "vid1"), range(args.threads)))
+    report(f"cũ: {args.threads} thread cùng file", drive, time.perf_counter() - start,
+           f"{len(leaked)} file tạm bị bỏ lại")
+    for path in leaked:
+        os.remove(path)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        paths = set(pool.map(lambda _: manager.fetch("vid1"), range(args.threads)))
+    report(f"mới: {args.threads} thread cùng file", drive, time.perf_counter() - start,
+           f"{len(paths)} file, gộp {manager.stats['deduped']} request")
+
+    start = time.perf_counter()
+    manager.fetch("vid1")
+    report("mới: lần sau (có trong kho)", drive, time.perf_counter() - start)
+
+    # 3. đứt kết nối 3 lần, mỗi lần sau khi gửi được nửa đoạn
+    drive.inject_drops(3, int(args.chunk_mb * MB) // 2)
+    start = time.perf_counter()
+    manager.fetch("vid2")
+    report("mới: đứt kết nối 3 lần", drive, time.perf_counter() - start,
+           f"tải tiếp {manager.stats['resumes']} lần")
+
+    # 4. md5 sai: thử lại một lần từ đầu rồi báo lỗi, không giữ file
+    drive.files["vid3"]["md5Checksum"] = "0" * 32
+    start = time.perf_counter()
+    try:
+        manager.fetch("vid3")
+        outcome = "KHÔNG phát hiện"
+    except ChecksumError:
+        outcome = "ChecksumError"
+    left = glob.glob(os.path.join(store, "vid3*"))
+    report("mới: md5 sai", drive, time.perf_counter() - start, f"{outcome}, còn {len(left)} file")
+
+    # 5. kho giới hạn 3 file
+    manager.max_bytes = 3 * args.mb * MB + MB
+    start = time.perf_counter()
+    for n in range(args.files):
+        if n != 3:
+            manager.fetch(f"vid{n}")
+    report("mới: kho giới hạn 3 file", drive, time.perf_counter() - start,
+           f"kho {manager.total_bytes() / MB:.0f} MB, đã dọn {manager.stats['evicted']} file")
+
+
+if __name__ == "__main__":
+    main()
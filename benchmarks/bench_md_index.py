@@ -0,0 +1,87 @@
+#bench_md_index.py
+"""
+Microbenchmark: phân tích front matter + section bằng regex (extract_yaml /
+extract_bullet_items_from_section hiện tại) so với md_index (quét một lượt + nhớ theo file).
+
+Chạy từ thư mục gốc repo:
+    python -m benchmarks.bench_md_index --notes 2000 --lookups 4
+"""
+
+import argparse
+import random
+import re
+import time
+
+import yaml
+
+from drive_module.md_index import NoteIndex
+
+SECTIONS = ["tags", "links", "related", "sources", "todo"]
+
+
+def regex_extract_yaml(content):
+    """Bản sao extract_yaml trong drive_ops (bỏ st.error) làm mốc so sánh."""
+    match = re.search(r'^---\s*(.*?)\s*---', content, re.DOTALL | re.MULTILINE)
+    if not match:
+        return {}
+    try:
+        return yaml.safe_load(match.group(1)) or {}
+    except yaml.YAMLError:
+        return {}
+
+
+def regex_bullets(content, section_name):
+    """Bản sao extract_bullet_items_from_section trong drive_ops làm mốc so sánh."""
+    pattern = rf"##\s*{re.escape(section_name)}\s*:\s*(.*?)(?=\n##\s|\Z)"
+    match = re.search(pattern, content, re.DOTALL | re.IGNORECASE)
+    if not match:
+        return []
+    lines = match.group(1).strip().splitlines()
+    return [line.strip() for line in lines if line.strip().startswith("-")]
+
+
+def make_note(rng, body_lines):
+    lines = ["---", f"title: note {rng.random()}", f"tags: [{', '.join(rng.sample(SECTIONS, 2))}]", "---", ""]
+    for name in SECTIONS:
+        lines.append(f"## {name}:")
+        lines.extend(f"- item {rng.randint(0, 999)}" for _ in range(rng.randint(1, 8)))
+        lines.extend(f"Lorem ipsum dolor sit amet {i}" for i in range(body_lines))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=4, help="Số section tra cứu mỗi note")
+    parser.add_argument("--body", type=int, default=30, help="Số dòng văn bản mỗi section")
+    parser.add_argument("--reruns", type=int, default=3, help="Số lần tra lại (mô phỏng Streamlit rerun)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    notes = [(f"id{i}", "2024-01-01", make_note(rng, args.body)) for i in range(args.notes)]
+    lookups = SECTIONS[:args.lookups]
+
+    start = time.perf_counter()
+    for _ in range(args.reruns):
+        for _, _, content in notes:
+            regex_extract_yaml(content)
+            for name in lookups:
+                regex_bullets(content, name)
+    regex_time = time.perf_counter() - start
+
+    index = NoteIndex()
+    start = time.perf_counter()
+    for _ in range(args.reruns):
+        for file_id, modified_time, content in notes:
+            parsed = index.get(file_id, modified_time, content)
+            for name in lookups:
+                parsed.bullets(name)
+    index_time = time.perf_counter() - start
+
+    print(f"{args.notes} notes x {args.lookups} lookups x {args.reruns} reruns")
+    print(f"regex     {regex_time:>8.3f}s")
+    print(f"md_index  {index_time:>8.3f}s  ({regex_time / index_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
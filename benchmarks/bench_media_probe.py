@@ -0,0 +1,100 @@
+#bench_media_probe.py
+"""
+So sánh số byte phải tải để lấy kích thước ảnh/video:
+dò header bằng HTTP Range (media_probe) với cách cũ tải toàn bộ file.
+
+Chạy từ thư mục gốc repo:
+    python -m benchmarks.bench_media_probe <file_id> [<file_id> ...]
+    python -m benchmarks.bench_media_probe --local ảnh.jpg video.mp4
+    python -m benchmarks.bench_media_probe --full <file_id>   # tải toàn bộ thật để đo thời gian cách cũ
+"""
+
+import argparse
+import os
+import time
+
+import requests
+
+from drive_module.media_probe import (
+    DRIVE_DOWNLOAD_URL,
+    ProbeError,
+    RangeReader,
+    http_range_fetcher,
+    probe_media_size,
+)
+
+
+def local_fetcher(path):
+    """fetch(start, end) đọc từ file trên đĩa, dùng để đo mà không cần mạng."""
+    total = os.path.getsize(path)
+
+    def fetch(start, end):
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start + 1), total
+
+    return fetch
+
+
+def full_download_bytes(url):
+    """Tải toàn bộ file như get_image_size_from_drive/get_video_size_from_drive cũ."""
+    total = 0
+    with requests.get(url, stream=True) as r:
+        r.raise_for_status()
+        for chunk in r.iter_content(chunk_size=8192):
+            total += len(chunk)
+    return total
+
+
+def bench_one(target, local=False, full=False):
+    if local:
+        reader = RangeReader(local_fetcher(target))
+    else:
+        url = DRIVE_DOWNLOAD_URL.format(file_id=target)
+        reader = RangeReader(http_range_fetcher(url))
+
+    start = time.perf_counter()
+    try:
+        size = probe_media_size(reader)
+    except ProbeError as e:
+        size = f"lỗi: {e}"
+    probe_time = time.perf_counter() - start
+
+    full_bytes = reader.size
+    full_time = None
+    if full and not local:
+        start = time.perf_counter()
+        full_bytes = full_download_bytes(url)
+        full_time = time.perf_counter() - start
+
+    return {
+        "target": target,
+        "size": size,
+        "probe_bytes": reader.bytes_transferred,
+        "probe_time": probe_time,
+        "full_bytes": full_bytes,
+        "full_time": full_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="+", help="Drive file id (hoặc đường dẫn file nếu dùng --local)")
+    parser.add_argument("--local", action="store_true", help="Đọc file trên đĩa thay vì Drive")
+    parser.add_argument("--full", action="store_true", help="Tải toàn bộ thật để đo thời gian cách cũ")
+    args = parser.parse_args()
+
+    print(f"{'file':<40} {'kích thước':<22} {'probe (B)':>12} {'toàn bộ (B)':>14} {'tỉ lệ':>9} {'probe (s)':>10} {'full (s)':>10}")
+    for target in args.targets:
+        r = bench_one(target, local=args.local, full=args.full)
+        ratio = f"{r['probe_bytes'] / r['full_bytes']:.4%}" if r["full_bytes"] else "?"
+        full_time = f"{r['full_time']:.3f}" if r["full_time"] is not None else "-"
+        print(
+            f"{os.path.basename(r['target'])[:40]:<40} {str(r['size'])[:22]:<22} "
+            f"{r['probe_bytes']:>12} {str(r['full_bytes'] or '?'):>14} {ratio:>9} "
+            f"{r['probe_time']:>10.3f} {full_time:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#bench_scheduler.py
+"""
+Drive giả có quota (403 userRateLimitExceeded khi vượt N request/giây): so sánh gọi thẳng
+execute() với đi qua RequestScheduler (token bucket + backoff), và đo độ trễ của request
+tương tác khi hàng đợi đang đầy prefetch chạy nền.
+
+Chạy từ thư mục gốc repo:
+    python -m benchmarks.bench_scheduler --requests 200 --quota 50 --rate 40 --threads 16
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.errors import HttpError
+
+from benchmarks.fake_drive import FakeDrive, generate_tree
+from drive_module.scheduler import BACKGROUND, INTERACTIVE, METADATA, RequestScheduler
+
+
+def direct(drive, file_id):
+    try:
+        drive.service().files().get(fileId=file_id).execute()
+        return True
+    except HttpError:
+        return False
+
+
+def run_direct(drive, file_ids, threads):
+    drive.calls = drive.rejected = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        ok = sum(pool.map(lambda f: direct(drive, f), file_ids))
+    elapsed = time.perf_counter() - start
+    print(f"{'execute() trực tiếp':<30} {elapsed:>8.3f}s {ok:>6} ok {len(file_ids) - ok:>6} lỗi "
+          f"{drive.calls:>6} calls {drive.rejected:>6} bị 403")
+
+
+def run_scheduled(drive, file_ids, threads, rate, burst, interactive):
+    drive.calls = drive.rejected = 0
+    scheduler = RequestScheduler({METADATA: (rate, burst)}, backoff=0.1)
+    latencies = []
+
+    def fetch(file_id, priority):
+        start = time.perf_counter()
+        scheduler.execute(drive.service().files().get(fileId=file_id), METADATA, priority)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        background = [pool.submit(fetch, f, BACKGROUND) for f in file_ids]
+        time.sleep(0.1)
+        # Người dùng mở ảnh trong lúc prefetch đang chạy
+        with ThreadPoolExecutor(max_workers=interactive) as ui:
+            latencies = list(ui.map(lambda f: fetch(f, INTERACTIVE), file_ids[:interactive]))
+        bg_latencies = [f.result() for f in background]
+    elapsed = time.perf_counter() - start
+
+    m = scheduler.metrics()[METADATA]
+    print(f"{'qua RequestScheduler':<30} {elapsed:>8.3f}s {len(file_ids) + interactive:>6} ok {0:>6} lỗi "
+          f"{drive.calls:>6} calls {drive.rejected:>6} bị 403")
+    print(f"  thử lại {m['retries']}, chờ token tổng {m['throttle_seconds']:.2f}s, "
+          f"hàng đợi sâu nhất {m['max_queue_depth']}")
+    print(f"  độ trễ tương tác: trung vị {statistics.median(latencies) * 1000:.0f} ms, "
+          f"nền: trung vị {statistics.median(bg_latencies) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Số request prefetch chạy nền")
+    parser.add_argument("--quota", type=int, default=50, help="Quota của Drive giả (request/giây)")
+    parser.add_argument("--rate", type=float, default=40, help="Token bucket của scheduler (request/giây)")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--interactive", type=int, default=5, help="Số request tương tác chen vào giữa chừng")
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    drive = generate_tree(FakeDrive(args.latency, quota_per_second=args.quota), depth=2, fanout=2,
+                          files_per_folder=max(1, args.requests // 3))
+    file_ids = [f for f in drive.files if f.startswith("md")][:args.requests]
+
+    run_direct(drive, file_ids, args.threads)
+    time.sleep(1.0)  # cho cửa sổ quota của Drive giả trôi qua
+    run_scheduled(drive, file_ids, args.threads, args.rate, args.burst, args.interactive)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#bench_suite.py
+"""
+Bộ benchmark chạy offline trên Drive giả (benchmarks/fake_drive.py): cây thư mục tổng hợp có note
+markdown, ảnh PNG/JPEG và video MP4 thật, độ trễ mạng giả lập. Đo các đường nóng của app:
+liệt kê đệ quy, dựng cây, tải nội dung (từng file / song song / cache đĩa), collect(),
+extract_yamls(), dò kích thước ảnh/video (Range probe so với tải cả file qua kho tải về).
+
+Mỗi kịch bản báo: thời gian, số lần gọi Drive API, số request HTTP, số byte đã tải,
+bộ nhớ đỉnh (tracemalloc) và số lần gọi theo từng span của instrumentation.
+
+Chạy từ thư mục gốc repo:
+    python -m benchmarks.bench_suite --depth 3 --fanout 3 --latency 0.01
+    python -m benchmarks.bench_suite --json baseline.json
+    python -m benchmarks.bench_suite --compare baseline.json --tolerance 0.25   # exit 1 nếu chậm đi
+"""
+
+import os
+import tempfile
+
+# Cache đĩa (nội dung, preview, trạng thái đồng bộ) vào thư mục tạm, không đụng ~/.cache của máy
+os.environ.setdefault("DRIVE2HTML_CACHE_DIR", tempfile.mkdtemp(prefix="drive2html-bench-"))
+
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+
+from benchmarks.fake_drive import FakeDrive, generate_corpus
+from drive_module import auth, drive_api, drive_ops, media_size
+from drive_module.compact_tree import CompactTree
+from drive_module.instrumentation import get_recorder
+from drive_module.prefetch import DEFAULT_MAX_IN_FLIGHT, ContentPrefetcher
+from drive_module.scheduler import configure_scheduler
+from drive_module.search_index import get_search_index
+
+ROOT_ID = "root"
+# Dưới các ngưỡng này coi là nhiễu khi so với baseline
+MIN_SECONDS_DELTA = 0.005
+MIN_PEAK_KB_DELTA = 64
+COUNTER_FIELDS = ("api_calls", "http_requests", "bytes")
+
+
+class Context:
+    """Trạng thái dùng chung giữa các kịch bản (chạy theo thứ tự, kịch bản sau dùng kết quả kịch bản trước)."""
+
+    def __init__(self, drive, sample):
+        self.drive = drive
+        self.session = drive.http_session()
+        self.sample = sample
+        self.items = []
+        self.tree = {}
+        self.compact_tree = None
+        self.contents = {}
+
+    def notes(self):
+        return {i["id"]: i["modifiedTime"] for i in self.items if i["mimeType"] == "text/markdown"}
+
+    def media(self, prefix):
+        return [i["id"] for i in self.items if i["mimeType"].startswith(prefix)]
+
+
+# --- kịch bản ---
+
+AUTH_TIMEOUT = 10
+
+
+def bench_auth_real_credentials(ctx):
+    """
+    Tạo Drive service qua đường credentials thật (secrets.toml → service account → build_from_document)
+    với khóa RSA sinh tạm, không gọi mạng. Đường này bị deadlock thì báo lỗi thay vì treo.
+    """
+    import threading
+    import toml
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode("ascii")
+    secrets_path = os.path.join(tempfile.mkdtemp(prefix="drive2html-auth-"), "secrets.toml")
+    with open(secrets_path, "w", encoding="utf-8") as f:
+        toml.dump({"gcp_service_account": {
+            "type": "service_account", "project_id": "bench", "private_key_id": "bench",
+            "private_key": pem, "client_email": "bench@bench.iam.gserviceaccount.com",
+            "client_id": "0", "token_uri": "https://oauth2.googleapis.com/token",
+        }}, f)
+
+    saved = auth.LOCAL_SECRETS_PATH, auth._local_secrets, auth._credentials, auth._service_factory
+    auth.LOCAL_SECRETS_PATH, auth._local_secrets, auth._credentials = secrets_path, None, None
+    auth.set_service_factory(None)
+    result = []
+    try:
+        # Thread riêng: nếu lock tự chặn chính nó thì thread treo, còn benchmark vẫn báo lỗi được
+        worker = threading.Thread(target=lambda: result.append(auth.get_drive_service()), daemon=True)
+        worker.start()
+        worker.join(AUTH_TIMEOUT)
+        if worker.is_alive():
+            raise RuntimeError(f"get_drive_service() treo quá {AUTH_TIMEOUT}s (deadlock khi đọc credentials?)")
+    finally:
+        auth.LOCAL_SECRETS_PATH, auth._local_secrets, auth._credentials = saved[:3]
+        auth.set_service_factory(saved[3])
+    return len(result)
+
+def bench_list_recursive(ctx):
+    ctx.items = drive_api.list_folder_contents_recursive(ROOT_ID)
+    return len(ctx.items)
+
+
+def bench_build_tree(ctx):
+    ctx.tree = drive_api.build_tree(ctx.items)
+    return len(ctx.tree)
+
+
+def bench_build_compact_tree(ctx):
+    ctx.compact_tree = CompactTree(ctx.items, ROOT_ID)
+    return len(ctx.compact_tree.ids)
+
+
+def bench_get_file_content(ctx):
+    file_ids = list(ctx.notes())[:ctx.sample]
+    for file_id in file_ids:
+        drive_api.get_file_content(file_id)
+    return len(file_ids)
+
+
+def bench_fetch_contents_cold(ctx):
+    ctx.contents, downloaded = drive_api.fetch_contents(ctx.notes())
+    return downloaded
+
+
+def bench_fetch_contents_warm(ctx):
+    contents, downloaded = drive_api.fetch_contents(ctx.notes())
+    return len(contents) - downloaded
+
+
+def bench_collect(ctx):
+    contents = drive_ops.collect(ROOT_ID, ctx.tree, None)[0]
+    return len(contents)
+
+
+def bench_collect_compact(ctx):
+    contents = drive_ops.collect(ROOT_ID, ctx.compact_tree, None)[0]
+    return len(contents)
+
+
+def bench_extract_yamls(ctx):
+    merged = drive_ops.extract_yamls(iter(ctx.contents.values()))
+    return len(merged)
+
+
+def bench_search_sync_tree(ctx):
+    return get_search_index().sync_tree(ROOT_ID, ctx.compact_tree)
+
+
+def bench_search_query(ctx):
+    # Note đã được lập chỉ mục lúc fetch_contents tải về
+    index = get_search_index()
+    folder = ctx.compact_tree.ids[ctx.compact_tree.folder_indexes(ctx.compact_tree.root)[0]]
+    queries = ["lorem", "tags:tags", "category:toán", "todo:~mục 1", f"tags:links folder:{folder}", "ipsum dòng*"]
+    return sum(len(index.search(q, limit=1000)) for q in queries)
+
+
+def bench_file_size_probe(ctx):
+    images, videos = ctx.media("image/"), ctx.media("video/")
+    for file_id in images:
+        media_size.get_file_size(file_id, False, session=ctx.session)
+    for file_id in videos:
+        media_size.get_file_size(file_id, True, session=ctx.session)
+    return len(images) + len(videos)
+
+
+def bench_file_size_full(ctx):
+    # Đường cũ khi không dò được header: tải cả file (video cần cv2 nên chỉ đo ảnh)
+    images = ctx.media("image/")[:ctx.sample]
+    for file_id in images:
+        media_size.get_image_size_from_drive(file_id, session=ctx.session)
+    return len(images)
+
+
+def bench_file_size_full_warm(ctx):
+    # File đã nằm trong kho tải về: chỉ còn lần tra md5Checksum
+    return bench_file_size_full(ctx)
+
+
+SCENARIOS = [
+    ("auth_real_credentials", bench_auth_real_credentials),
+    ("list_recursive", bench_list_recursive),
+    ("build_tree", bench_build_tree),
+    ("build_compact_tree", bench_build_compact_tree),
+    ("get_file_content", bench_get_file_content),
+    ("fetch_contents_cold", bench_fetch_contents_cold),
+    ("fetch_contents_warm", bench_fetch_contents_warm),
+    ("collect", bench_collect),
+    ("collect_compact", bench_collect_compact),
+    ("extract_yamls", bench_extract_yamls),
+    ("search_sync_tree", bench_search_sync_tree),
+    ("search_query", bench_search_query),
+    ("file_size_probe", bench_file_size_probe),
+    ("file_size_full", bench_file_size_full),
+    ("file_size_full_warm", bench_file_size_full_warm),
+]
+
+
+# --- chạy và báo cáo ---
+
+def run_scenario(ctx, name, func, memory=True):
+    drive = ctx.drive
+    recorder = get_recorder()
+    drive.reset_counters()
+    recorder.start_trace(name)
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    items = func(ctx)
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "seconds": round(elapsed, 6),
+        **{k: v for k, v in drive.counters().items() if k in COUNTER_FIELDS},
+        "peak_kb": round(peak / 1024, 1),
+        "items": items,
+        "ops": {t["op"]: t["calls"] for t in recorder.trace_summary()},
+    }
+
+
+def setup(args):
+    drive = generate_corpus(
+        FakeDrive(args.latency, http_latency=args.http_latency),
+        ROOT_ID,
+        depth=args.depth,
+        fanout=args.fanout,
+        notes_per_folder=args.notes,
+        images_per_folder=args.images,
+        videos_per_folder=args.videos,
+        body_lines=args.body_lines,
+        seed=args.seed,
+    )
+    # Drive giả thay cho service/credentials thật; không giới hạn tốc độ để chỉ đo phần của app
+    auth.set_service_factory(drive.service)
+    configure_scheduler({name: (1e9, 10 ** 9) for name in ("metadata", "media", "download")})
+    drive_api._prefetchers[(DEFAULT_MAX_IN_FLIGHT, None)] = ContentPrefetcher(
+        None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, session=drive.http_session()
+    )
+    # collect() dùng st.session_state; chạy ngoài `streamlit run` thì tắt cảnh báo bare mode
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    return Context(drive, args.sample)
+
+
+def print_report(results):
+    print(f"{'kịch bản':<22} {'giây':>9} {'API':>6} {'HTTP':>6} {'KB tải':>10} {'KB đỉnh':>10} {'items':>7}")
+    for name, r in results.items():
+        print(f"{name:<22} {r['seconds']:>9.4f} {r['api_calls']:>6} {r['http_requests']:>6} "
+              f"{r['bytes'] / 1024:>10.1f} {r['peak_kb']:>10.1f} {r['items']:>7}")
+
+
+def compare(results, baseline, tolerance):
+    """In chênh lệch so với baseline, trả về danh sách (kịch bản, chỉ số) bị chậm/tốn hơn quá tolerance."""
+    regressions = []
+    print(f"\nSo với baseline (tolerance {tolerance:.0%}):")
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"  {name:<22} (không có trong baseline)")
+            continue
+        notes = []
+        checks = [("seconds", MIN_SECONDS_DELTA), ("peak_kb", MIN_PEAK_KB_DELTA)]
+        checks += [(field, 0) for field in COUNTER_FIELDS]
+        for field, min_delta in checks:
+            old, new = base.get(field, 0), r[field]
+            if field == "peak_kb" and not (old and new):
+                continue  # một trong hai lần chạy tắt đo bộ nhớ
+            if new > old * (1 + tolerance) and new - old > min_delta:
+                regressions.append((name, field))
+                notes.append(f"{field} {old} → {new}")
+        ratio = r["seconds"] / base["seconds"] if base.get("seconds") else float("inf")
+        status = "CHẬM HƠN: " + ", ".join(notes) if notes else "ok"
+        print(f"  {name:<22} x{ratio:>6.2f}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--notes", type=int, default=10, help="Số note .md mỗi folder")
+    parser.add_argument("--images", type=int, default=2, help="Số ảnh mỗi folder")
+    parser.add_argument("--videos", type=int, default=1, help="Số video mỗi folder")
+    parser.add_argument("--body-lines", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005, help="Độ trễ mỗi lần gọi Drive API (giây)")
+    parser.add_argument("--http-latency", type=float, default=None, help="Độ trễ mỗi request HTTP (mặc định = --latency)")
+    parser.add_argument("--sample", type=int, default=20, help="Số file cho các kịch bản tuần tự")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="Chỉ in/so sánh các kịch bản này (vẫn chạy các bước chuẩn bị)")
+    parser.add_argument("--no-memory", action="store_true", help="Tắt tracemalloc (thời gian chính xác hơn)")
+    parser.add_argument("--json", metavar="FILE", help="Ghi kết quả ra file JSON (làm baseline)")
+    parser.add_argument("--compare", metavar="FILE", help="So với baseline JSON, exit 1 nếu chậm đi")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    ctx = setup(args)
+    config = {k: v for k, v in vars(args).items() if k not in ("json", "compare", "only")}
+    print(f"Drive giả: {len(ctx.drive.files)} item, {sum(map(len, ctx.drive.blobs.values())) / 1024 / 1024:.1f} MB nội dung")
+
+    results = {}
+    for name, func in SCENARIOS:
+        result = run_scenario(ctx, name, func, memory=not args.no_memory)
+        if not args.only or name in args.only:
+            results[name] = result
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("⚠️ Cấu hình khác baseline, so sánh chỉ mang tính tham khảo")
+        if compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
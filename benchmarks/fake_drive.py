@@ -0,0 +1,409 @@
+#fake_drive.py
+"""
+Drive service giả lập trong bộ nhớ để đo hiệu năng mà không cần credentials hay mạng.
+Mỗi lần execute() ngủ `latency` giây để mô phỏng round trip tới Google.
+quota_per_second: vượt quá số lần gọi này trong 1 giây → HttpError 403 userRateLimitExceeded như Drive thật.
+
+Nội dung file (markdown, ảnh, video) nằm trong drive.blobs, đọc được qua:
+- service().files().get_media() + MediaIoBaseDownload (như get_file_content)
+- drive.http_session(): giống requests.Session (HTTP Range, link uc?export=download và ?alt=media)
+drive.inject_drops(n, after_bytes): n response HTTP tới bị đứt kết nối giữa chừng (thử tải tiếp).
+"""
+
+import collections
+import hashlib
+import io
+import json
+import random
+import re
+import struct
+import threading
+import time
+
+import httplib2
+import requests
+from googleapiclient.errors import HttpError
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+MEDIA_URL = "https://www.googleapis.com/drive/v3/files/{file_id}?alt=media"
+
+_PARENT_RE = re.compile(r"'([^']+)' in parents")
+_URL_ID_RE = re.compile(r"(?:[?&]id=|/files/)([^?&/]+)")
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class FakeDrive:
+    """Kho file giả: id -> metadata dict (giống response của Drive API)."""
+
+    def __init__(self, latency=0.0, quota_per_second=None, http_latency=None, range_support=True):
+        self.latency = latency
+        self.quota_per_second = quota_per_second
+        self.http_latency = latency if http_latency is None else http_latency
+        self.range_support = range_support
+        self.files = {}
+        self.blobs = {}
+        self.calls = 0          # lần gọi Drive API (execute, get_media chunk)
+        self.http_requests = 0  # request HTTP thẳng qua http_session()
+        self.bytes_served = 0
+        self.rejected = 0
+        self.drops = 0          # số response HTTP còn phải làm đứt giữa chừng
+        self.drop_after = 0
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    def add(self, item, data=None):
+        """Thêm file; data (bytes) là nội dung, kèm size/md5Checksum như Drive trả về."""
+        if data is not None:
+            self.blobs[item["id"]] = data
+            item.setdefault("size", str(len(data)))
+            item.setdefault("md5Checksum", hashlib.md5(data).hexdigest())
+        self.files[item["id"]] = item
+        return item
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = self.http_requests = self.bytes_served = self.rejected = 0
+
+    def counters(self):
+        return {"api_calls": self.calls, "http_requests": self.http_requests,
+                "bytes": self.bytes_served, "rejected": self.rejected}
+
+    def read_range(self, file_id, range_header):
+        """(status, content, total) cho một request tải nội dung, theo header Range nếu có."""
+        data = self.blobs.get(file_id)
+        if data is None:
+            return 404, b"", 0
+        total = len(data)
+        match = _RANGE_RE.match(range_header or "") if self.range_support else None
+        if not match:
+            return 200, data, total
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else total - 1, total - 1)
+        if start >= total:
+            return 416, b"", total
+        return 206, data[start:end + 1], total
+
+    def http_session(self):
+        return FakeHttpSession(self)
+
+    def inject_drops(self, count, after_bytes):
+        """count response HTTP tới chỉ gửi after_bytes byte rồi ném requests.ConnectionError."""
+        with self._lock:
+            self.drops = count
+            self.drop_after = after_bytes
+
+    def take_drop(self):
+        with self._lock:
+            if not self.drops:
+                return None
+            self.drops -= 1
+            return self.drop_after
+
+    def record_http(self, nbytes):
+        with self._lock:
+            self.http_requests += 1
+            self.bytes_served += nbytes
+        if self.http_latency:
+            time.sleep(self.http_latency)
+
+    def record_call(self, nbytes=0):
+        with self._lock:
+            self.calls += 1
+            self.bytes_served += nbytes
+            if self.quota_per_second:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.quota_per_second:
+                    self.rejected += 1
+                    raise rate_limit_error()
+                self._recent.append(now)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def service(self):
+        return FakeDriveService(self)
+
+
+def rate_limit_error():
+    body = {"error": {"code": 403, "errors": [{"reason": "userRateLimitExceeded"}]}}
+    return HttpError(httplib2.Response({"status": 403}), json.dumps(body).encode("utf-8"))
+
+
+class FakeRequest:
+    def __init__(self, drive, func):
+        self._drive = drive
+        self._func = func
+
+    def execute(self):
+        self._drive.record_call()
+        return self._func()
+
+
+class FakeFiles:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, q="", fields=None, pageSize=100, pageToken=None, **kwargs):
+        def run():
+            parents = set(_PARENT_RE.findall(q))
+            matched = [
+                f for f in self._drive.files.values()
+                if parents.intersection(f.get("parents", []))
+                and not ("trashed = false" in q and f.get("trashed"))
+            ]
+            start = int(pageToken or 0)
+            page = matched[start:start + pageSize]
+            result = {"files": page}
+            if start + pageSize < len(matched):
+                result["nextPageToken"] = str(start + pageSize)
+            return result
+        return FakeRequest(self._drive, run)
+
+    def get(self, fileId, fields=None, **kwargs):
+        return FakeRequest(self._drive, lambda: dict(self._drive.files[fileId]))
+
+    def get_media(self, fileId, **kwargs):
+        return FakeMediaRequest(self._drive, fileId)
+
+
+class FakeMediaRequest:
+    """Đủ thuộc tính (uri, headers, http) để MediaIoBaseDownload tải theo từng chunk Range."""
+
+    def __init__(self, drive, file_id):
+        self.uri = MEDIA_URL.format(file_id=file_id)
+        self.headers = {}
+        self.http = FakeHttp(drive)
+
+
+class FakeHttp:
+    """Thay httplib2.Http: request() trả (Response, content) từ drive.blobs, tôn trọng Range."""
+
+    def __init__(self, drive):
+        self._drive = drive
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        status, content, total = self._drive.read_range(_url_file_id(uri), headers.get("range"))
+        self._drive.record_call(len(content))
+        resp = {"status": status, "content-length": str(len(content))}
+        if status == 206:
+            start = int(_RANGE_RE.match(headers["range"]).group(1))
+            resp["content-range"] = f"bytes {start}-{start + len(content) - 1}/{total}"
+        elif status == 416:
+            resp["content-range"] = f"bytes */{total}"
+        return httplib2.Response(resp), content
+
+
+class FakeHttpSession:
+    """Giống requests.Session.get(): Range, stream, dùng được trong with; đếm request và byte."""
+
+    def __init__(self, drive):
+        self._drive = drive
+
+    def get(self, url, headers=None, stream=False, timeout=None, **kwargs):
+        range_header = (headers or {}).get("Range")
+        status, content, total = self._drive.read_range(_url_file_id(url), range_header)
+        drop_after = self._drive.take_drop()
+        self._drive.record_http(len(content) if drop_after is None else min(len(content), drop_after))
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response.raw = io.BytesIO(content) if drop_after is None else DroppingStream(content, drop_after)
+        response.headers["Content-Length"] = str(len(content))
+        if status == 206:
+            start = int(_RANGE_RE.match(range_header).group(1))
+            response.headers["Content-Range"] = f"bytes {start}-{start + len(content) - 1}/{total}"
+        elif status == 416:
+            response.headers["Content-Range"] = f"bytes */{total}"
+        return response
+
+    def close(self):
+        pass
+
+
+class DroppingStream(io.BytesIO):
+    """Body bị đứt kết nối sau `after` byte, như mạng chập chờn khi tải file lớn."""
+
+    def __init__(self, content, after):
+        super().__init__(content)
+        self.after = after
+
+    def read(self, size=-1):
+        if self.tell() >= self.after:
+            raise requests.ConnectionError("Kết nối bị đóng giữa chừng (giả lập)")
+        limit = self.after - self.tell()
+        return super().read(limit if size is None or size < 0 else min(size, limit))
+
+
+def _url_file_id(url):
+    match = _URL_ID_RE.search(url)
+    return match.group(1) if match else None
+
+
+class FakeChanges:
+    """Changes feed rỗng: Drive giả không đổi giữa các lần đồng bộ."""
+
+    def __init__(self, drive):
+        self._drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(self._drive, lambda: {"startPageToken": "1"})
+
+    def list(self, pageToken=None, **kwargs):
+        return FakeRequest(self._drive, lambda: {"changes": [], "newStartPageToken": pageToken})
+
+
+class FakeDriveService:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def files(self):
+        return FakeFiles(self._drive)
+
+    def changes(self):
+        return FakeChanges(self._drive)
+
+
+def generate_tree(drive, root_id="root", depth=3, fanout=4, files_per_folder=5):
+    """Sinh cây thư mục tổng hợp: mỗi folder có `fanout` folder con và `files_per_folder` file .md."""
+    counter = [0]
+
+    def new_id(prefix):
+        counter[0] += 1
+        return f"{prefix}{counter[0]}"
+
+    def fill(parent_id, level):
+        for _ in range(files_per_folder):
+            fid = new_id("md")
+            drive.add({
+                "id": fid,
+                "name": f"{fid}.md",
+                "mimeType": "text/markdown",
+                "parents": [parent_id],
+                "modifiedTime": "2024-01-01T00:00:00.000Z",
+            })
+        if level >= depth:
+            return
+        for _ in range(fanout):
+            sub_id = new_id("folder")
+            drive.add({
+                "id": sub_id,
+                "name": sub_id,
+                "mimeType": FOLDER_MIME,
+                "parents": [parent_id],
+                "modifiedTime": "2024-01-01T00:00:00.000Z",
+            })
+            fill(sub_id, level + 1)
+
+    fill(root_id, 1)
+    return drive
+
+
+# --- Nội dung tổng hợp ---
+
+SECTIONS = ["tags", "links", "related", "sources", "todo"]
+CATEGORIES = ["toán", "lý", "hóa", "sinh", "văn", "sử"]
+
+
+def make_note(rng, body_lines=20):
+    """Note markdown có front matter YAML (list, dict lồng nhau) và các section `## tên:` chứa bullet."""
+    lines = [
+        "---",
+        f"title: Ghi chú {rng.randint(0, 10 ** 6)}",
+        f"category: {rng.choice(CATEGORIES)}",
+        f"tags: [{', '.join(rng.sample(SECTIONS, 2))}]",
+        "meta:",
+        f"  level: {rng.randint(1, 5)}",
+        f"  authors: [a{rng.randint(0, 20)}, a{rng.randint(0, 20)}]",
+        "---",
+        "",
+    ]
+    for name in SECTIONS:
+        lines.append(f"## {name}:")
+        lines.extend(f"- mục {rng.randint(0, 999)}" for _ in range(rng.randint(1, 8)))
+        lines.extend(f"Lorem ipsum dolor sit amet, dòng {i}." for i in range(body_lines // len(SECTIONS)))
+    return "\n".join(lines) + "\n"
+
+
+def make_image(width, height, fmt="PNG"):
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 160, 200)).save(buf, fmt)
+    return buf.getvalue()
+
+
+def _box(box_type, body):
+    return struct.pack(">I4s", 8 + len(body), box_type) + body
+
+
+def make_mp4(width, height, frames=300, mdat_bytes=256 * 1024, moov_at_end=True):
+    """
+    MP4 tối thiểu mà media_probe đọc được: ftyp + mdat (đệm) + moov/trak
+    (tkhd chứa width/height, hdlr 'vide', stts chứa số frame). moov_at_end như file quay từ điện thoại.
+    """
+    ftyp = _box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2mp41")
+    tkhd = _box(b"tkhd", bytes(76) + struct.pack(">II", width << 16, height << 16))
+    hdlr = _box(b"hdlr", bytes(8) + b"vide" + bytes(12) + b"\0")
+    stts = _box(b"stts", bytes(4) + struct.pack(">III", 1, frames, 512))
+    mdia = _box(b"mdia", hdlr + _box(b"minf", _box(b"stbl", stts)))
+    moov = _box(b"moov", _box(b"trak", tkhd + mdia))
+    mdat = _box(b"mdat", bytes(mdat_bytes))
+    return ftyp + (mdat + moov if moov_at_end else moov + mdat)
+
+
+def generate_corpus(drive, root_id="root", depth=3, fanout=3, notes_per_folder=10, images_per_folder=2,
+                    videos_per_folder=1, body_lines=20, image_size=(1280, 720), video_mdat=256 * 1024,
+                    media_metadata=False, seed=0):
+    """
+    Cây thư mục tổng hợp có nội dung thật: note .md (front matter + bullet), ảnh PNG/JPEG và video MP4.
+    media_metadata=True → item ảnh kèm imageMediaMetadata như khi Drive đã xử lý xong.
+    Cùng seed → cùng cây, cùng nội dung (để so sánh giữa các lần chạy).
+    """
+    rng = random.Random(seed)
+    counter = [0]
+    width, height = image_size
+    images = {"png": make_image(width, height, "PNG"), "jpg": make_image(width, height, "JPEG")}
+    video = make_mp4(width, height, mdat_bytes=video_mdat)
+
+    def new_id(prefix):
+        counter[0] += 1
+        return f"{prefix}{counter[0]}"
+
+    def add_file(parent_id, prefix, ext, mime, data, extra=None):
+        fid = new_id(prefix)
+        drive.add({
+            "id": fid,
+            "name": f"{fid}.{ext}",
+            "mimeType": mime,
+            "parents": [parent_id],
+            "modifiedTime": f"2024-01-01T00:00:{counter[0] % 60:02d}.000Z",
+            **(extra or {}),
+        }, data)
+
+    def fill(parent_id, level):
+        for _ in range(notes_per_folder):
+            add_file(parent_id, "md", "md", "text/markdown", make_note(rng, body_lines).encode("utf-8"))
+        for i in range(images_per_folder):
+            ext = "png" if i % 2 == 0 else "jpg"
+            mime = "image/png" if ext == "png" else "image/jpeg"
+            extra = {"imageMediaMetadata": {"width": width, "height": height}} if media_metadata else None
+            add_file(parent_id, "img", ext, mime, images[ext], extra)
+        for _ in range(videos_per_folder):
+            add_file(parent_id, "vid", "mp4", "video/mp4", video)
+        if level >= depth:
+            return
+        for _ in range(fanout):
+            sub_id = new_id("folder")
+            drive.add({
+                "id": sub_id,
+                "name": sub_id,
+                "mimeType": FOLDER_MIME,
+                "parents": [parent_id],
+                "modifiedTime": "2024-01-01T00:00:00.000Z",
+            })
+            fill(sub_id, level + 1)
+
+    fill(root_id, 1)
+    return drive
@@ -1,33 +1,56 @@
 #auth.py
 
 import os
+import threading
 import toml  # pip install toml nếu chưa có
-import streamlit as st
+import httplib2
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+# Đường dẫn đến file secrets.toml (cùng thư mục với auth.py)
+LOCAL_SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "secrets.toml")
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive"]
+
+# RLock: get_credentials() giữ lock khi gọi _load_credentials() → load_local_secrets() lấy lại lock
+_lock = threading.RLock()
+_local_secrets = None
+_credentials = None
+_discovery_doc = None
+_service_factory = None
+_thread_local = threading.local()
+
+
+def load_local_secrets():
+    """Đọc drive_module/secrets.toml đúng một lần cho cả process ({} nếu không có file)."""
+    global _local_secrets
+    if _local_secrets is None:
+        with _lock:
+            if _local_secrets is None:
+                config = {}
+                if os.path.exists(LOCAL_SECRETS_PATH):
+                    try:
+                        config = toml.load(LOCAL_SECRETS_PATH)
+                    except Exception as e:
+                        raise RuntimeError(f"Lỗi khi đọc local secrets.toml: {e}")
+                _local_secrets = config
+    return _local_secrets
+
+
 def load_secret_value(section: str, key: str):
     """
     Trả về giá trị từ một mục bất kỳ trong secrets.toml (ưu tiên local, fallback st.secrets).
     Ví dụ: load_secret_value("gcp_service_account", "private_key")
     """
-    import toml
+    # 1. Ưu tiên đọc từ local secrets.toml (đã cache)
+    section_data = load_local_secrets().get(section)
+    if section_data and key in section_data:
+        return section_data[key]
 
-    # Đường dẫn đến file secrets.toml (cùng thư mục với auth.py)
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    local_secrets_path = os.path.join(current_dir, "secrets.toml")
-
-    # 1. Ưu tiên đọc từ local secrets.toml
-    if os.path.exists(local_secrets_path):
-        try:
-            config = toml.load(local_secrets_path)
-            section_data = config.get(section)
-            if section_data and key in section_data:
-                return section_data[key]
-        except Exception as e:
-            raise RuntimeError(f"Lỗi khi đọc local secrets.toml: {e}")
-
-    # 2. Nếu không có thì thử từ st.secrets
+    # 2. Nếu không có thì thử từ st.secrets (chỉ import Streamlit khi thật sự cần)
     try:
+        import streamlit as st
         section_data = st.secrets[section]
         if key in section_data:
             return section_data[key]
@@ -38,31 +61,68 @@ def load_secret_value(section: str, key: str):
     raise KeyError(f"Không tìm thấy [{section}][{key}] trong cả local secrets.toml và st.secrets.")
 
 
-def get_drive_service():
-    credentials = None
-
+def _load_credentials():
     # 1. Ưu tiên: Đọc secrets từ drive_module/secrets.toml
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    local_secrets_path = os.path.join(current_dir, "secrets.toml")
-
-    if os.path.exists(local_secrets_path):
+    creds_dict = load_local_secrets().get("gcp_service_account")
+    if creds_dict:
         try:
-            config = toml.load(local_secrets_path)
-            creds_dict = config.get("gcp_service_account")
-            if creds_dict:
-                credentials = service_account.Credentials.from_service_account_info(creds_dict)
+            return service_account.Credentials.from_service_account_info(creds_dict, scopes=DRIVE_SCOPES)
         except Exception as e:
             raise RuntimeError(f"Lỗi khi đọc local secrets.toml: {e}")
 
     # 2. Nếu không có local secrets → thử Streamlit secrets
-    if credentials is None:
-        try:
-            creds_dict = dict(st.secrets["gcp_service_account"])
-            credentials = service_account.Credentials.from_service_account_info(creds_dict)
-        except Exception as e:
-            raise RuntimeError(
-                "Không tìm thấy credentials trong local secrets.toml hoặc st.secrets.\n"
-                f"Chi tiết: {e}"
-            )
+    try:
+        import streamlit as st
+        creds_dict = dict(st.secrets["gcp_service_account"])
+        return service_account.Credentials.from_service_account_info(creds_dict, scopes=DRIVE_SCOPES)
+    except Exception as e:
+        raise RuntimeError(
+            "Không tìm thấy credentials trong local secrets.toml hoặc st.secrets.\n"
+            f"Chi tiết: {e}"
+        )
+
+
+def get_credentials():
+    """Credentials service account, tạo một lần và dùng chung cho cả process."""
+    global _credentials
+    if _credentials is None:
+        with _lock:
+            if _credentials is None:
+                _credentials = _load_credentials()
+    return _credentials
+
+
+def _get_discovery_doc():
+    # Discovery document tĩnh đi kèm googleapiclient → không phải tải qua mạng
+    global _discovery_doc
+    if _discovery_doc is None:
+        _discovery_doc = get_static_doc("drive", "v3")
+    return _discovery_doc
+
 
-    return build("drive", "v3", credentials=credentials)
+def set_service_factory(factory):
+    """
+    Thay cách tạo Drive service (vd. Drive giả trong benchmarks/), None để quay về service thật.
+    Mỗi thread gọi factory() một lần như với service thật.
+    """
+    global _service_factory
+    _service_factory = factory
+    _thread_local.__dict__.clear()
+
+
+def get_drive_service():
+    """
+    Drive service của thread hiện tại, tạo lười ở lần gọi đầu tiên.
+    httplib2 không thread-safe nên mỗi thread (session Streamlit, worker pool)
+    có transport AuthorizedHttp riêng; secrets, credentials và discovery doc thì dùng chung.
+    """
+    service = getattr(_thread_local, "service", None)
+    if service is None or getattr(_thread_local, "factory", None) is not _service_factory:
+        if _service_factory is not None:
+            service = _service_factory()
+        else:
+            http = AuthorizedHttp(get_credentials(), http=httplib2.Http())
+            service = build_from_document(_get_discovery_doc(), http=http)
+        _thread_local.service = service
+        _thread_local.factory = _service_factory
+    return service
@@ -0,0 +1,55 @@
+#batch.py
+
+from .scheduler import METADATA, NORMAL, get_scheduler, is_retryable_error
+
+# Drive cho phép tối đa 100 request con trong một batch HTTP
+MAX_BATCH_SIZE = 100
+
+
+def execute_batched(service, make_requests, batch_size=MAX_BATCH_SIZE, priority=NORMAL):
+    """
+    Gộp nhiều request Drive vào các batch HTTP (mỗi batch tối đa batch_size request con).
+
+    make_requests: dict key -> hàm nhận service và trả về HttpRequest (chưa execute).
+    Trả về (results, errors): dict key -> response / exception.
+    Mỗi batch đi qua scheduler và tốn số token bằng số request con (Drive tính quota theo request con).
+    Request con lỗi tạm thời (429/5xx, 403 rate limit) làm lần gửi đó báo lỗi cho scheduler,
+    scheduler backoff rồi gửi lại batch chỉ gồm các request con chưa xong; hết lượt thử lại thì
+    lỗi cuối của từng request con nằm trong errors.
+    """
+    results = {}
+    errors = {}
+    keys = list(make_requests)
+
+    for start in range(0, len(keys), batch_size):
+        pending = keys[start:start + batch_size]
+        retry = {}
+
+        def send():
+            retry.clear()
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    results[request_id] = response
+                elif is_retryable_error(exception):
+                    retry[request_id] = exception
+                else:
+                    errors[request_id] = exception
+
+            batch = service.new_batch_http_request(callback=callback)
+            for key in pending:
+                batch.add(make_requests[key](service), request_id=key)
+            batch.execute()
+            pending[:] = list(retry)
+            if retry:
+                # Lỗi tạm thời của request con → scheduler thử lại (và tạm dừng làn nếu bị rate limit)
+                raise next(iter(retry.values()))
+
+        try:
+            get_scheduler().call(send, METADATA, priority, cost=len(pending))
+        except Exception as e:
+            if not retry or e not in retry.values():
+                raise
+            errors.update(retry)
+
+    return results, errors
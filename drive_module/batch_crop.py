@@ -0,0 +1,167 @@
+#batch_crop.py
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from PIL import Image
+
+from .content_cache import DEFAULT_CACHE_DIR
+from .downloads import get_download_manager
+from .image_crop import compute_crop_box, convert_for_format
+from .instrumentation import bind_trace
+from .scheduler import NORMAL
+
+# ZIP được giữ trong RAM tới chừng này byte rồi chuyển sang file tạm trên đĩa
+ZIP_SPOOL_BYTES = 64 * 1024 * 1024
+FORMAT_EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+# ZIP đã tạo nằm ở đây tới khi bị thay hoặc quá tuổi (session_state chỉ giữ đường dẫn)
+EXPORT_DIR = os.path.join(DEFAULT_CACHE_DIR, "exports")
+EXPORT_MAX_AGE = 24 * 3600
+
+
+def crop_image_bytes(data, aspect_ratio, center=None, fmt="PNG"):
+    """
+    Chạy trong process con: cắt khung lớn nhất đúng tỉ lệ của ảnh (bytes) rồi encode.
+    center: tâm (x, y) đã lưu trên ảnh gốc; None thì lấy tâm ảnh.
+    Không gọi Drive: ảnh được tải ở process chính, qua scheduler chung.
+    """
+    with Image.open(BytesIO(data)) as img:
+        width, height = img.size
+        cx, cy = center if center else (width / 2, height / 2)
+        box = compute_crop_box(width, height, aspect_ratio, (cx, cy, 0, 0), auto=True)
+        cropped = convert_for_format(img.crop(box), fmt)
+        out = BytesIO()
+        cropped.save(out, format=fmt)
+    return out.getvalue()
+
+
+def _download_original(media):
+    # MediaFile có sẵn md5/size/modifiedTime từ listing; tuple (name, file_id) thì tra metadata khi tải
+    md5, byte_size = getattr(media, "md5_checksum", None), getattr(media, "byte_size", None)
+    return get_download_manager().read_bytes(media[1], md5, byte_size, priority=NORMAL,
+                                             modified_time=getattr(media, "modified_time", None))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_crop_pool():
+    """
+    Process pool dùng chung cho cả process (os.cpu_count() process), tạo bằng "spawn":
+    fork từ server Streamlit nhiều thread có thể mang theo khóa đang bị giữ (scheduler,
+    cache...) sang process con và treo. Pool bị hỏng (process con chết) thì tạo lại.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or getattr(_pool, "_broken", False):
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def save_archive(archive, prefix="crop_"):
+    """Chép ZIP (file-like) ra EXPORT_DIR theo từng khối, xóa các ZIP cũ quá tuổi. Trả về đường dẫn."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    now = time.time()
+    for entry in os.scandir(EXPORT_DIR):
+        try:
+            if now - entry.stat().st_mtime > EXPORT_MAX_AGE:
+                os.remove(entry.path)
+        except OSError:
+            pass
+    fd, path = tempfile.mkstemp(dir=EXPORT_DIR, prefix=prefix, suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(archive, f)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def _unique_name(name, used):
+    base, ext = os.path.splitext(name)
+    candidate = name
+    i = 1
+    while candidate in used:
+        candidate = f"{base} ({i}){ext}"
+        i += 1
+    used.add(candidate)
+    return candidate
+
+
+def build_crop_zip(media_files, aspect_ratio, centers=None, fmt="PNG",
+                   max_workers=None, progress=None):
+    """
+    Cắt hàng loạt ảnh (MediaFile hoặc tuple (name, file_id)) và ghi dần vào ZIP.
+
+    - Ảnh gốc được tải ở process này (qua scheduler và kho tải về), process pool chung chỉ cắt + encode
+    - Số ảnh đang tải/xử lý cùng lúc không vượt quá 2 * max_workers → bộ nhớ bị chặn trên
+    - progress(done, total, name, error) được gọi sau mỗi ảnh (error là None nếu thành công)
+    - Trả về (file ZIP đã seek về đầu, danh sách (name, error) của ảnh lỗi)
+    """
+    centers = centers or {}
+    ext = FORMAT_EXTENSIONS[fmt]
+    media_files = list(media_files)
+    total = len(media_files)
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_workers * 2
+
+    archive = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES)
+    failures = []
+    used_names = set()
+    done = 0
+
+    pool = get_crop_pool()
+    download = bind_trace(_download_original)
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_STORED) as zf, \
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crop-download") as downloads:
+        queue = iter(media_files)
+        pending = {}  # future -> (tên ảnh, file_id, đang ở bước tải hay không)
+
+        def submit_next():
+            media = next(queue, None)
+            if media is None:
+                return False
+            pending[downloads.submit(download, media)] = (media[0], media[1], True)
+            return True
+
+        while len(pending) < max_pending and submit_next():
+            pass
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, file_id, downloading = pending.pop(future)
+                error = future.exception()
+                if downloading and error is None:
+                    # Tải xong → chuyển bytes sang process pool để cắt
+                    args = (crop_image_bytes, future.result(), aspect_ratio, centers.get(file_id), fmt)
+                    try:
+                        crop = pool.submit(*args)
+                    except BrokenProcessPool:
+                        # Process con chết (vd. hết RAM) → pool mới cho phần còn lại
+                        pool = get_crop_pool()
+                        crop = pool.submit(*args)
+                    pending[crop] = (name, file_id, False)
+                    continue
+                if error is None:
+                    # Ảnh đã nén sẵn (PNG/JPEG/WEBP) → lưu thẳng, không nén ZIP lần nữa
+                    zf.writestr(_unique_name(f"{os.path.splitext(name)[0]}.{ext}", used_names), future.result())
+                else:
+                    failures.append((name, error))
+                done += 1
+                if progress:
+                    progress(done, total, name, error)
+                submit_next()
+
+    archive.seek(0)
+    return archive, failures
@@ -0,0 +1,161 @@
+#cli.py
+
+# Chạy không cần Streamlit (cron/CI):
+#   python -m drive_module.cli snippets <folder_id|url> [<folder_id|url> ...] --format html|markdown|links|json
+#   python -m drive_module.cli export <folder_id|url> --out site/ [--workers N] [--force]
+#   python -m drive_module.cli search 'tags:python folder:<id> từ khóa' [--root <folder_id|url> --refresh]
+# Thêm --trace trace.jsonl / --prometheus metrics.prom (trước tên lệnh) để ghi số liệu hiệu năng.
+
+import argparse
+import json
+import sys
+
+from .drive_api import extract_folder_id_from_url, get_images_in_folder
+from .instrumentation import get_recorder
+from .search_index import DEFAULT_LIMIT, get_search_index, parse_query
+from .snippets import DEFAULT_MAX_WORKERS, build_snippets, mul_link
+
+
+def resolve_folder_id(value):
+    """Chấp nhận cả folder ID lẫn URL thư mục Drive."""
+    return extract_folder_id_from_url(value) or value
+
+
+def folder_snippets(folder, is_video=False, max_workers=DEFAULT_MAX_WORKERS):
+    """Snippet của mọi ảnh/video trong một thư mục, sắp theo tên như trên giao diện."""
+    images, videos = get_images_in_folder(resolve_folder_id(folder))
+    images.sort(key=lambda x: x[0])
+    videos.sort(key=lambda x: x[0])
+    return build_snippets(images, videos, is_video=is_video, max_workers=max_workers)
+
+
+def format_snippets(snippets, fmt):
+    if fmt == "links":
+        return mul_link(snippets)
+    key = "html" if fmt == "html" else "markdown"
+    return "\n".join(getattr(s, key) for s in snippets if not s.error)
+
+
+def cmd_snippets(args):
+    results = {}
+    for folder in args.folders:
+        results[folder] = folder_snippets(folder, is_video=args.video, max_workers=args.workers)
+
+    if args.format == "json":
+        data = {folder: [s._asdict() for s in snippets] for folder, snippets in results.items()}
+        if len(data) == 1:
+            data = next(iter(data.values()))
+        print(json.dumps(data, ensure_ascii=False, indent=2))
+    else:
+        for folder, snippets in results.items():
+            if len(results) > 1:
+                print(f"<!-- {folder} -->")
+            print(format_snippets(snippets, args.format))
+
+    failed = False
+    for snippets in results.values():
+        for s in snippets:
+            if s.error:
+                failed = True
+                print(f"❌ {s.name}: {s.error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def cmd_export(args):
+    from .site_export import export_site  # cần thêm thư viện Markdown, chỉ import khi dùng
+
+    result = export_site(
+        resolve_folder_id(args.folder),
+        args.out,
+        title=args.title,
+        max_workers=args.workers,
+        force=args.force
+    )
+    print(f"✅ {result.rendered} trang đã render, {result.skipped} trang giữ nguyên, "
+          f"{result.removed} trang đã xóa, {result.downloaded} file tải mới → {args.out}")
+    return 0
+
+
+def cmd_search(args):
+    index = get_search_index()
+    root = resolve_folder_id(args.root) if args.root else None
+    if args.refresh:
+        if not root:
+            print("❌ --refresh cần --root", file=sys.stderr)
+            return 2
+        from .compact_tree import build_compact_tree
+        from .drive_api import fetch_contents, list_folder_contents_recursive
+
+        index.sync_tree(root, build_compact_tree(list_folder_contents_recursive(root), root))
+        stale = index.stale(root)
+        if stale:
+            contents, _ = fetch_contents(stale)
+            index.index_many((file_id, stale[file_id], content) for file_id, content in contents.items())
+        print(f"🔄 {len(stale)} note đã cập nhật, {index.count()} note trong chỉ mục", file=sys.stderr)
+
+    query = parse_query(" ".join(args.query))
+    folder = resolve_folder_id(query.folder) if query.folder else root
+    hits = index.search(query, folder=folder, limit=args.limit)
+
+    if args.format == "json":
+        print(json.dumps([h._asdict() for h in hits], ensure_ascii=False, indent=2))
+    else:
+        for h in hits:
+            print(f"{h.path or h.file_id}  ({h.file_id})")
+            if h.snippet:
+                print(f"    {h.snippet}")
+    return 0 if hits else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m drive_module.cli")
+    parser.add_argument("--trace", help="Ghi thêm trace của lần chạy vào file JSONL này")
+    parser.add_argument("--prometheus", help="Ghi số liệu tổng (định dạng Prometheus) ra file này")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("snippets", help="In link/HTML/markdown cho mọi ảnh và video trong thư mục")
+    p.add_argument("folders", nargs="+", help="Folder ID hoặc URL thư mục Drive")
+    p.add_argument("--format", choices=("html", "markdown", "links", "json"), default="links")
+    p.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                   help="Số file lấy kích thước song song")
+    p.add_argument("--video", action="store_true",
+                   help="Đo kích thước theo kiểu video khi phải tải cả file (Video Mode)")
+    p.set_defaults(func=cmd_snippets)
+
+    p = sub.add_parser("export", help="Xuất cả cây ghi chú thành site HTML tĩnh (tăng dần)")
+    p.add_argument("folder", help="Folder ID hoặc URL thư mục Drive gốc")
+    p.add_argument("--out", required=True, help="Thư mục đích")
+    p.add_argument("--title", help="Tên trang gốc (mặc định Drive2HTML)")
+    p.add_argument("--workers", type=int, default=None,
+                   help="Số process render song song (mặc định = số CPU)")
+    p.add_argument("--force", action="store_true", help="Render lại mọi trang, bỏ qua manifest")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("search", help="Tìm note trong chỉ mục cục bộ (nội dung, front matter, bullet)")
+    p.add_argument("query", nargs="+",
+                   help='Từ khóa và bộ lọc: tags:X folder:<id|url> name:abc section:~bullet "cụm từ"')
+    p.add_argument("--root", help="Folder gốc (ID/URL): giới hạn kết quả trong cây này")
+    p.add_argument("--refresh", action="store_true",
+                   help="Liệt kê lại cây --root và tải + lập chỉ mục các note mới/đã đổi trước khi tìm")
+    p.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    p.add_argument("--format", choices=("text", "json"), default="text")
+    p.set_defaults(func=cmd_search)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    recorder = get_recorder()
+    recorder.start_trace(args.command)
+    try:
+        return args.func(args)
+    finally:
+        if args.trace:
+            recorder.write_jsonl(args.trace)
+        if args.prometheus:
+            with open(args.prometheus, "w", encoding="utf-8") as f:
+                f.write(recorder.prometheus_text())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
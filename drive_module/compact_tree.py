@@ -0,0 +1,332 @@
+#compact_tree.py
+
+# Cây thư mục gọn cho cây lớn (100k+ item), thay cho dict-of-lists của build_tree:
+# - mỗi id được đánh số một lần (id -> vị trí), mọi liên kết cha/con là số nguyên trong array;
+#   id/tên/modifiedTime nằm trong các list song song, dùng lại chuỗi của item chứ không tạo chuỗi mới
+# - con của một folder là một đoạn liên tiếp trong mảng children (file trước, folder sau)
+# - tìm theo id và theo đường dẫn đều O(1), lên cha bằng parent pointer
+# - vẫn dùng được như tree cũ: tree[folder_id]["files" / "subfolders" / "name"]
+
+from array import array
+from collections.abc import Mapping
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+MARKDOWN_MIME = "text/markdown"
+
+# Mã loại item lưu trong array('b')
+FOLDER = 0
+MARKDOWN = 1
+IMAGE = 2
+VIDEO = 3
+OTHER = 4
+
+
+def _kind_of(mime_type):
+    if mime_type == FOLDER_MIME:
+        return FOLDER
+    if mime_type == MARKDOWN_MIME:
+        return MARKDOWN
+    if mime_type.startswith("image/"):
+        return IMAGE
+    if mime_type.startswith("video/"):
+        return VIDEO
+    return OTHER
+
+
+class Node:
+    """
+    View nhẹ (chỉ giữ tree + vị trí) của một item. Node folder còn đọc được như dict của
+    build_tree: node["name"], node["files"] (key "id|modifiedTime|name" của file .md), node["subfolders"].
+    Node root giữ đúng như build_tree: không có file, subfolders là mọi folder trong cây.
+    """
+
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def id(self):
+        return self.tree.ids[self.index]
+
+    @property
+    def name(self):
+        return self.tree.names[self.index]
+
+    @property
+    def modified_time(self):
+        return self.tree.modified[self.index]
+
+    @property
+    def kind(self):
+        return self.tree.kinds[self.index]
+
+    @property
+    def is_folder(self):
+        return self.tree.kinds[self.index] == FOLDER
+
+    @property
+    def key(self):
+        return self.tree.file_key(self.index)
+
+    @property
+    def path(self):
+        return self.tree.path(self.index)
+
+    @property
+    def parent(self):
+        parent = self.tree.parents[self.index]
+        return Node(self.tree, parent) if parent >= 0 else None
+
+    def children(self):
+        return [Node(self.tree, i) for i in self.tree.children_of(self.index)]
+
+    # --- tương thích dict của build_tree ---
+
+    def __getitem__(self, field):
+        tree = self.tree
+        is_root = self.index == tree.root
+        if field == "name":
+            return "ROOT" if is_root else self.name
+        if field == "files":
+            if is_root:
+                return []
+            return [tree.file_key(i) for i in tree.file_indexes(self.index) if tree.kinds[i] == MARKDOWN]
+        if field == "subfolders":
+            if is_root:
+                return tree.all_folders()
+            return [tree.ids[i] for i in tree.folder_indexes(self.index)]
+        raise KeyError(field)
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and other.tree is self.tree and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self):
+        return f"Node({self.id!r}, {self.name!r})"
+
+
+class CompactTree(Mapping):
+    """
+    Cây dựng một lần từ danh sách item của Drive (list hoặc generator, như build_tree).
+    Là Mapping folder_id -> Node theo thứ tự duyệt sâu từ root, nên FolderIndex, collect(),
+    iter_markdown_files() dùng trực tiếp được. Item không nối được về root bị bỏ qua.
+    """
+
+    def __init__(self, items, root_id=None):
+        ids = []
+        names = []
+        modified = []
+        kinds = []
+        parents = []
+        position = {}
+        file_children = {}    # vị trí folder -> vị trí các file con, theo thứ tự liệt kê
+        folder_children = {}  # vị trí folder -> vị trí các folder con
+        deferred = []         # (vị trí, id cha) khi cha chưa xuất hiện
+
+        def attach(i, parent):
+            if parent == i or kinds[parent] != FOLDER:
+                return False
+            parents[i] = parent
+            bucket = folder_children if kinds[i] == FOLDER else file_children
+            siblings = bucket.get(parent)
+            if siblings is None:
+                bucket[parent] = [i]
+            else:
+                siblings.append(i)
+            return True
+
+        for item in items:
+            item_id = item["id"]
+            if item_id in position:
+                continue
+            i = position[item_id] = len(ids)
+            ids.append(item_id)
+            names.append(item["name"])
+            modified.append(item.get("modifiedTime"))
+            kinds.append(_kind_of(item["mimeType"]))
+            parents.append(-1)
+            item_parents = item.get("parents")
+            if item_parents:
+                # Crawl duyệt theo tầng nên cha gần như luôn xuất hiện trước con
+                parent = position.get(item_parents[0], -1)
+                if parent >= 0:
+                    attach(i, parent)
+                else:
+                    deferred.append((i, item_parents[0]))
+
+        # Root không nằm trong danh sách item: lấy id cha đầu tiên chưa thấy (như build_tree)
+        if root_id is None:
+            root_id = next((p for _, p in deferred if p not in position), None)
+        if root_id is not None and root_id not in position:
+            position[root_id] = len(ids)
+            ids.append(root_id)
+            names.append("ROOT")
+            modified.append(None)
+            kinds.append(FOLDER)
+            parents.append(-1)
+
+        # Con gắn muộn → sắp lại theo thứ tự liệt kê
+        resort = set()
+        for i, parent_id in deferred:
+            parent = position.get(parent_id, -1)
+            if parent >= 0 and attach(i, parent):
+                resort.add(parent)
+        for parent in resort:
+            for bucket in (file_children, folder_children):
+                if parent in bucket:
+                    bucket[parent].sort()
+
+        # Trải phẳng: con của mỗi folder là đoạn [child_start, child_end) trong children,
+        # file ở [child_start, folder_start), folder con ở [folder_start, child_end)
+        n = len(ids)
+        child_start = array("i", bytes(4 * n))
+        folder_start = array("i", bytes(4 * n))
+        child_end = array("i", bytes(4 * n))
+        children = []
+        for folder in file_children.keys() | folder_children.keys():
+            child_start[folder] = len(children)
+            children.extend(file_children.get(folder, ()))
+            folder_start[folder] = len(children)
+            children.extend(folder_children.get(folder, ()))
+            child_end[folder] = len(children)
+
+        self.ids = ids
+        self.names = names
+        self.modified = modified
+        self.kinds = array("b", kinds)
+        self.parents = array("i", parents)
+        self.children = array("i", children)
+        self.child_start = child_start
+        self.folder_start = folder_start
+        self.child_end = child_end
+        self.root = position[root_id] if root_id is not None else -1
+        self._position = position
+        self._paths = None
+        self._folders = None
+
+    # --- tra cứu ---
+
+    def index_of(self, item_id):
+        """Vị trí của item theo id, -1 nếu không có."""
+        return self._position.get(item_id, -1)
+
+    def node(self, item_id):
+        i = self._position.get(item_id, -1)
+        return Node(self, i) if i >= 0 else None
+
+    def file_key(self, i):
+        """Key "id|modifiedTime|name" mà cache nội dung và FolderIndex đang dùng."""
+        return f"{self.ids[i]}|{self.modified[i]}|{self.names[i]}"
+
+    def index_of_key(self, key):
+        return self._position.get(key.split("|", 1)[0], -1)
+
+    def path(self, i):
+        """Đường dẫn "folder/sub/file.md" tính từ root (root là "")."""
+        parts = []
+        # giới hạn số bước: dữ liệu lỗi có vòng cha-con thì không lặp vô hạn
+        for _ in range(len(self.ids)):
+            if i < 0 or i == self.root:
+                break
+            parts.append(self.names[i])
+            i = self.parents[i]
+        return "/".join(reversed(parts))
+
+    def find(self, path):
+        """Vị trí của item theo đường dẫn từ root (tên trùng nhau: lấy item gặp trước), -1 nếu không có."""
+        if self._paths is None:
+            self._paths = {}
+            for i in self.walk(self.root, files=True):
+                self._paths.setdefault(self.path(i), i)
+        return self._paths.get(path.strip("/"), -1)
+
+    # --- con và duyệt cây ---
+
+    def children_of(self, i):
+        return self.children[self.child_start[i]:self.child_end[i]]
+
+    def file_indexes(self, i):
+        return self.children[self.child_start[i]:self.folder_start[i]]
+
+    def folder_indexes(self, i):
+        return self.children[self.folder_start[i]:self.child_end[i]]
+
+    def walk(self, i, files=False):
+        """Duyệt sâu cây con của i theo đúng thứ tự collect(): folder, file của nó, rồi từng folder con."""
+        stack = [i]
+        while stack:
+            current = stack.pop()
+            yield current
+            if files:
+                yield from self.file_indexes(current)
+            stack.extend(reversed(self.folder_indexes(current)))
+
+    def iter_files(self, folder_id, kind=MARKDOWN):
+        """Vị trí mọi file loại kind (None = mọi loại) trong folder và các folder con."""
+        start = self._position.get(folder_id, -1)
+        if start < 0:
+            return
+        kinds = self.kinds
+        for folder in self.walk(start):
+            for i in self.file_indexes(folder):
+                if kind is None or kinds[i] == kind:
+                    yield i
+
+    def iter_file_keys(self, folder_id):
+        """
+        Key "id|modifiedTime|name" của mọi file .md dưới folder (thay cho iter_markdown_files).
+        File nằm ngay ở root bị bỏ qua như build_tree.
+        """
+        root = self.root
+        for i in self.iter_files(folder_id):
+            if self.parents[i] != root and self.names[i].endswith(".md"):
+                yield self.file_key(i)
+
+    # --- Mapping folder_id -> Node (tương thích tree của build_tree) ---
+
+    def _folder_list(self):
+        if self._folders is None:
+            self._folders = [self.ids[i] for i in self.walk(self.root)] if self.root >= 0 else []
+        return self._folders
+
+    def all_folders(self):
+        """Mọi folder (trừ root) theo thứ tự liệt kê: subfolders của node ROOT trong build_tree."""
+        root = self.root
+        return [self.ids[i] for i in sorted(self.walk(root)) if i != root] if root >= 0 else []
+
+    def __getitem__(self, folder_id):
+        i = self._position.get(folder_id, -1)
+        if i < 0 or self.kinds[i] != FOLDER:
+            raise KeyError(folder_id)
+        return Node(self, i)
+
+    def __contains__(self, folder_id):
+        i = self._position.get(folder_id, -1)
+        return i >= 0 and self.kinds[i] == FOLDER
+
+    def __iter__(self):
+        return iter(self._folder_list())
+
+    def __len__(self):
+        return len(self._folder_list())
+
+    @property
+    def root_id(self):
+        return self.ids[self.root] if self.root >= 0 else None
+
+    def __repr__(self):
+        return f"CompactTree(root={self.root_id!r}, items={len(self.ids)})"
+
+
+def build_compact_tree(items, root_id=None):
+    return CompactTree(items, root_id)
@@ -0,0 +1,150 @@
+#content_cache.py
+
+import os
+import threading
+import time
+
+from .sqlite_store import Transaction, connect
+
+# Thư mục cache mặc định, dùng chung cho mọi session/process trên máy
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DRIVE2HTML_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "drive2html")
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Chỉ cập nhật last_access nếu lần truy cập trước cũ hơn chừng này giây (đỡ ghi khi đọc)
+TOUCH_INTERVAL = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contents (
+    file_id       TEXT NOT NULL,
+    modified_time TEXT NOT NULL,
+    data          BLOB NOT NULL,
+    size          INTEGER NOT NULL,
+    last_access   REAL NOT NULL,
+    PRIMARY KEY (file_id, modified_time)
+);
+CREATE INDEX IF NOT EXISTS contents_last_access ON contents (last_access);
+"""
+
+
+class ContentCache:
+    """
+    Cache nội dung file trên đĩa (SQLite), khóa là (file_id, modifiedTime).
+    - Dùng chung giữa các session Streamlit và các process (WAL + busy_timeout)
+    - Mỗi thread có connection riêng
+    - Khi tổng dung lượng vượt max_bytes thì xóa các bản ít được dùng gần đây nhất (LRU)
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        if path is None:
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+            path = os.path.join(DEFAULT_CACHE_DIR, "content.sqlite3")
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def _transaction(self):
+        return Transaction(self._conn())
+
+    def get(self, file_id, modified_time):
+        """Trả về nội dung (str) hoặc None nếu chưa có bản đúng modifiedTime."""
+        return self.get_many([(file_id, modified_time)]).get(file_id)
+
+    def get_many(self, keys):
+        """keys: iterable (file_id, modified_time). Trả về dict file_id -> nội dung cho các khóa có trong cache."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        stale = []
+        # Đọc không cần khóa ghi (WAL cho phép đọc song song với ghi)
+        conn = self._conn()
+        for file_id, modified_time in keys:
+            row = conn.execute(
+                "SELECT data, last_access FROM contents WHERE file_id = ? AND modified_time = ?",
+                (file_id, modified_time)
+            ).fetchone()
+            if row is None:
+                continue
+            found[file_id] = row[0].decode("utf-8")
+            if now - row[1] > TOUCH_INTERVAL:
+                stale.append((now, file_id, modified_time))
+        if stale:
+            with self._transaction() as conn:
+                conn.executemany(
+                    "UPDATE contents SET last_access = ? WHERE file_id = ? AND modified_time = ?",
+                    stale
+                )
+        return found
+
+    def put(self, file_id, modified_time, content):
+        self.put_many([(file_id, modified_time, content)])
+
+    def put_many(self, entries):
+        """
+        entries: iterable (file_id, modified_time, content). Bản cũ hơn của cùng file bị thay;
+        bản mới hơn đã có trong cache thì giữ nguyên (prefetch chậm trả về nội dung cũ không ghi đè).
+        modifiedTime của Drive là RFC 3339 cùng định dạng nên so sánh chuỗi là so sánh thời gian.
+        """
+        now = time.time()
+        rows = []
+        for file_id, modified_time, content in entries:
+            data = content.encode("utf-8")
+            rows.append((file_id, modified_time, data, len(data), now))
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM contents WHERE file_id = ? AND modified_time < ?",
+                [(r[0], r[1]) for r in rows]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO contents (file_id, modified_time, data, size, last_access) "
+                "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS "
+                "(SELECT 1 FROM contents WHERE file_id = ? AND modified_time > ?)",
+                [r + (r[0], r[1]) for r in rows]
+            )
+            self._evict(conn)
+
+    def invalidate(self, file_ids):
+        """Xóa mọi bản của các file_id (khi file bị xóa/trash hoặc đổi nội dung)."""
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM contents WHERE file_id = ?", [(fid,) for fid in file_ids])
+
+    def total_bytes(self):
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM contents").fetchone()[0]
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM contents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for file_id, modified_time, size in conn.execute(
+            "SELECT file_id, modified_time, size FROM contents ORDER BY last_access, rowid"
+        ):
+            victims.append((file_id, modified_time))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        conn.executemany("DELETE FROM contents WHERE file_id = ? AND modified_time = ?", victims)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_content_cache():
+    """ContentCache dùng chung cho cả process."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ContentCache()
+        return _default_cache
@@ -0,0 +1,108 @@
+#crawler.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .instrumentation import bind_trace, span
+from .scheduler import get_scheduler
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+ITEM_FIELDS = "nextPageToken, files(id, name, mimeType, parents, modifiedTime)"
+
+# Giới hạn độ dài chuỗi q cho mỗi lần files().list (Drive từ chối query quá dài)
+MAX_QUERY_LENGTH = 4000
+DEFAULT_MAX_WORKERS = 8
+
+
+def build_parents_query(folder_ids):
+    """Ghép nhiều folder vào một query: ('a' in parents or 'b' in parents) and trashed = false."""
+    parents = " or ".join(f"'{fid}' in parents" for fid in folder_ids)
+    return f"({parents}) and trashed = false"
+
+
+def chunk_folder_ids(folder_ids, max_query_length=MAX_QUERY_LENGTH):
+    """Chia danh sách folder thành các nhóm sao cho query của mỗi nhóm không vượt max_query_length."""
+    overhead = len(build_parents_query([]))
+    chunk = []
+    length = overhead
+    for fid in folder_ids:
+        part = len(f"'{fid}' in parents") + (len(" or ") if chunk else 0)
+        if chunk and length + part > max_query_length:
+            yield chunk
+            chunk = []
+            length = overhead
+            part = len(f"'{fid}' in parents")
+        chunk.append(fid)
+        length += part
+    if chunk:
+        yield chunk
+
+
+class FolderCrawler:
+    """
+    Duyệt cây thư mục theo chiều rộng (BFS): mỗi tầng được gộp thành vài query
+    "'a' in parents or 'b' in parents ..." và chạy song song trên thread pool.
+
+    service_factory() tạo Drive service; mỗi worker thread gọi một lần và giữ riêng,
+    vì client googleapiclient không thread-safe.
+    """
+
+    def __init__(self, service_factory, max_workers=DEFAULT_MAX_WORKERS,
+                 max_query_length=MAX_QUERY_LENGTH, page_size=1000):
+        self.service_factory = service_factory
+        self.max_workers = max_workers
+        self.max_query_length = max_query_length
+        self.page_size = page_size
+        self._local = threading.local()
+
+    def _service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self._local.service = self.service_factory()
+        return service
+
+    def _list_children(self, folder_ids):
+        """Lấy toàn bộ item con (đủ mọi trang) của một nhóm folder."""
+        query = build_parents_query(folder_ids)
+        items = []
+        page_token = None
+        while True:
+            with span("drive.crawl_list"):
+                results = get_scheduler().execute(self._service().files().list(
+                    q=query,
+                    fields=ITEM_FIELDS,
+                    pageSize=self.page_size,
+                    pageToken=page_token
+                ))
+            items.extend(results.get("files", []))
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return items
+
+    def crawl(self, root_id):
+        """Trả về danh sách phẳng mọi item trong cây (giống list_folder_contents_recursive)."""
+        all_items = []
+        visited = {root_id}
+        level = [root_id]
+
+        list_children = bind_trace(self._list_children)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while level:
+                chunks = list(chunk_folder_ids(level, self.max_query_length))
+                next_level = []
+                # map giữ đúng thứ tự các nhóm → kết quả ổn định giữa các lần chạy
+                for items in pool.map(list_children, chunks):
+                    for item in items:
+                        all_items.append(item)
+                        if item.get("mimeType") == FOLDER_MIME and item["id"] not in visited:
+                            # folder được share vào nhiều chỗ chỉ duyệt một lần
+                            visited.add(item["id"])
+                            next_level.append(item["id"])
+                level = next_level
+
+        return all_items
+
+
+def crawl_folder_tree(service_factory, root_id, max_workers=DEFAULT_MAX_WORKERS,
+                      max_query_length=MAX_QUERY_LENGTH):
+    return FolderCrawler(service_factory, max_workers, max_query_length).crawl(root_id)
@@ -0,0 +1,369 @@
+#downloads.py
+
+# Tải nguyên file lớn (video, ảnh gốc) khi không đọc được kích thước/nội dung bằng cách khác:
+# - tải theo từng đoạn Range lớn (chunk_size), mỗi đoạn là một request qua scheduler
+# - đứt kết nối giữa chừng → tải tiếp từ byte đã có thay vì tải lại từ đầu
+# - so md5Checksum / size với metadata của Drive trước khi dùng
+# - nhiều thread cùng xin một file → chỉ một lần tải, các thread khác chờ kết quả
+# - file nằm trong kho tạm có giới hạn dung lượng + tuổi, tự dọn (không còn NamedTemporaryFile bị bỏ quên)
+
+import atexit
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import httplib2
+import requests
+from google.auth.exceptions import GoogleAuthError
+from googleapiclient.errors import HttpError
+
+from .content_cache import DEFAULT_CACHE_DIR
+from .instrumentation import hit, miss, span
+from .scheduler import DOWNLOAD, INTERACTIVE, METADATA, get_scheduler
+
+DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc?export=download&id={file_id}"
+# Mỗi request Range lấy chừng này byte (ghi đè bằng DRIVE2HTML_DOWNLOAD_CHUNK_MB)
+DEFAULT_CHUNK_SIZE = int(float(os.environ.get("DRIVE2HTML_DOWNLOAD_CHUNK_MB", "8")) * 1024 * 1024)
+STREAM_BUFFER = 256 * 1024
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# File trong kho quá tuổi này (tính từ lần dùng cuối) bị xóa
+DEFAULT_MAX_AGE = 6 * 3600
+DEFAULT_MAX_RESUMES = 5
+DEFAULT_TIMEOUT = 60
+PART_SUFFIX = ".part"
+
+# Không đọc được metadata: lỗi API, lỗi refresh/thiếu credentials, lỗi mạng (OSError gồm cả requests/socket)
+METADATA_ERRORS = (HttpError, GoogleAuthError, httplib2.HttpLib2Error, OSError, RuntimeError, KeyError)
+# Lỗi giữa chừng của luồng tải → tải tiếp bằng Range
+RESUMABLE_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ChecksumError(DownloadError):
+    pass
+
+
+def fetch_media_metadata(file_id):
+    """
+    (md5Checksum, size, modifiedTime) từ Drive API; (None, None, None) nếu không đọc được
+    (không có quyền, credentials, mạng).
+    """
+    from .auth import get_drive_service
+
+    try:
+        meta = get_scheduler().execute(
+            get_drive_service().files().get(fileId=file_id, fields="md5Checksum, size, modifiedTime"),
+            METADATA, INTERACTIVE
+        )
+    except METADATA_ERRORS:
+        return None, None, None
+    size = meta.get("size")
+    return meta.get("md5Checksum"), int(size) if size is not None else None, meta.get("modifiedTime")
+
+
+class DownloadManager:
+    """
+    Kho file tải về dùng chung trong process. fetch() trả về đường dẫn file đã tải đủ và đã kiểm tra;
+    dùng checkout() (context manager) để file không bị dọn khi đang đọc.
+
+    - metadata(file_id) → (md5, size, modifiedTime) dùng khi caller không truyền sẵn md5; None = không kiểm tra
+    - session: HTTP session thay cho requests (vd. Drive giả trong benchmarks/)
+    """
+
+    def __init__(self, store_dir=None, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE,
+                 chunk_size=DEFAULT_CHUNK_SIZE, max_resumes=DEFAULT_MAX_RESUMES,
+                 metadata=fetch_media_metadata, session=None, url_template=DRIVE_DOWNLOAD_URL):
+        self.store_dir = store_dir or os.path.join(DEFAULT_CACHE_DIR, "downloads")
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self.max_resumes = max_resumes
+        self.metadata = metadata
+        self.session = session
+        self.url_template = url_template
+        self._lock = threading.Lock()
+        self._inflight = {}   # đường dẫn đích -> Future
+        self._pins = {}       # đường dẫn -> số người đang dùng
+        self.stats = {"downloads": 0, "store_hits": 0, "deduped": 0, "resumes": 0,
+                      "bytes": 0, "checksum_failures": 0, "evicted": 0}
+        self.cleanup()
+
+    def _path(self, file_id, md5, size=None, modified_time=None):
+        if md5:
+            return os.path.join(self.store_dir, f"{file_id}-{md5}")
+        # Không có md5 (file Google, không đọc được metadata): key theo phiên bản để file đổi trên Drive
+        # không bị phục vụ bản cũ từ kho
+        version = "" if size is None and modified_time is None else \
+            "-" + hashlib.md5(f"{modified_time}|{size}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.store_dir, f"{file_id}-unverified{version}")
+
+    def _part_path(self, path):
+        # Mỗi process một file .part riêng: nhiều process (batch crop) không ghi đè lên nhau
+        return f"{path}.{os.getpid()}{PART_SUFFIX}"
+
+    # --- tải ---
+
+    def fetch(self, file_id, md5=None, size=None, priority=INTERACTIVE, session=None,
+              modified_time=None, pin=False):
+        """
+        Đường dẫn file đã tải đủ. md5/size/modified_time lấy từ metadata() nếu không truyền md5.
+        pin=True: file được ghim ngay dưới lock (không có khoảng hở cho evict()), người gọi phải _unpin().
+        """
+        if md5 is None and self.metadata is not None:
+            md5, meta_size, meta_modified = self.metadata(file_id)
+            size = size if size is not None else meta_size
+            modified_time = modified_time or meta_modified
+        path = self._path(file_id, md5, size, modified_time)
+
+        waited = False
+        while True:
+            with self._lock:
+                if os.path.exists(path):
+                    if not waited:
+                        self.stats["store_hits"] += 1
+                    if pin:
+                        self._pin(path)
+                    _touch(path)
+                    hit("download_store")
+                    return path
+                future = self._inflight.get(path)
+                owner = future is None
+                if owner:
+                    future = self._inflight[path] = Future()
+                elif not waited:
+                    self.stats["deduped"] += 1
+            if owner:
+                break
+            # Chờ thread đang tải rồi kiểm tra lại dưới lock: file có thể đã bị dọn trước khi kịp ghim
+            future.result()
+            waited = True
+
+        miss("download_store")
+        try:
+            self._download(file_id, path, md5, size, priority, session or self.session)
+            future.set_result(path)
+        except BaseException as e:
+            future.set_exception(e)
+            with self._lock:
+                self._inflight.pop(path, None)
+            raise
+        with self._lock:
+            self._inflight.pop(path, None)
+            if pin:
+                self._pin(path)
+        # File vừa tải không bị dọn ngay cả khi lớn hơn max_bytes
+        self.evict(keep=(path,))
+        return path
+
+    def _pin(self, path):
+        # Gọi khi đang giữ self._lock
+        self._pins[path] = self._pins.get(path, 0) + 1
+
+    def _unpin(self, path):
+        with self._lock:
+            self._pins[path] -= 1
+            if not self._pins[path]:
+                del self._pins[path]
+
+    @contextmanager
+    def checkout(self, file_id, md5=None, size=None, priority=INTERACTIVE, session=None, modified_time=None):
+        """with manager.checkout(file_id) as path: ... — file không bị dọn khi còn trong khối with."""
+        path = self.fetch(file_id, md5, size, priority, session, modified_time, pin=True)
+        try:
+            yield path
+        finally:
+            self._unpin(path)
+
+    def read_bytes(self, file_id, md5=None, size=None, priority=INTERACTIVE, session=None, modified_time=None):
+        with self.checkout(file_id, md5, size, priority, session, modified_time) as path:
+            with open(path, "rb") as f:
+                return f.read()
+
+    def _download(self, file_id, path, md5, size, priority, session):
+        url = self.url_template.format(file_id=file_id)
+        part = self._part_path(path)
+        # Một lần tải lại từ đầu nếu checksum sai (file đổi giữa chừng, .part cũ hỏng)
+        for attempt in range(2):
+            digest = _hash_file(part) if os.path.exists(part) else hashlib.md5()
+            with span("download.fetch") as s, open(part, "ab") as out:
+                total, digest = self._stream(url, out, digest, size, priority, session, s)
+            with self._lock:
+                self.stats["downloads"] += 1
+
+            actual_size = os.path.getsize(part)
+            if size is not None and actual_size != size:
+                error = f"{file_id}: tải được {actual_size} byte, Drive báo {size}"
+            elif total is not None and actual_size != total:
+                error = f"{file_id}: tải được {actual_size} byte, server báo {total}"
+            elif md5 is not None and digest.hexdigest() != md5:
+                error = f"{file_id}: md5 {digest.hexdigest()} khác md5Checksum {md5}"
+            else:
+                os.replace(part, path)
+                return
+            with self._lock:
+                self.stats["checksum_failures"] += 1
+            os.remove(part)
+        raise ChecksumError(error)
+
+    def _stream(self, url, out, digest, size, priority, session, s):
+        """Ghi tiếp vào out từ vị trí hiện tại tới hết file. Trả về (tổng dung lượng server báo nếu biết, md5)."""
+        offset = out.tell()
+        total = size
+        resumes = 0
+        while total is None or offset < total:
+            end = offset + self.chunk_size - 1
+            if total is not None:
+                end = min(end, total - 1)
+            headers = {"Range": f"bytes={offset}-{end}"}
+            try:
+                with get_scheduler().get(url, DOWNLOAD, priority, session=session, headers=headers,
+                                         stream=True, timeout=DEFAULT_TIMEOUT) as r:
+                    if r.status_code == 416:
+                        return offset, digest   # đã có đủ (file rỗng hoặc .part đã đủ byte)
+                    r.raise_for_status()
+                    if r.status_code == 206:
+                        size_str = r.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+                        if size_str.isdigit():
+                            total = int(size_str)
+                    else:
+                        # Server bỏ qua Range: trả cả file từ đầu
+                        if offset:
+                            out.seek(0)
+                            out.truncate()
+                            digest = hashlib.md5()
+                            offset = 0
+                        length = r.headers.get("Content-Length", "")
+                        total = int(length) if length.isdigit() else None
+                    got = 0
+                    for block in r.iter_content(chunk_size=STREAM_BUFFER):
+                        out.write(block)
+                        digest.update(block)
+                        got += len(block)
+                        offset += len(block)
+                        s.add_bytes(len(block))
+                    with self._lock:
+                        self.stats["bytes"] += got
+                    if r.status_code != 206:
+                        # Cả file đã về trong một lần
+                        return (total if total is not None else offset), digest
+                    if not got:
+                        raise DownloadError(f"Server trả đoạn rỗng ở byte {offset}")
+            except RESUMABLE_ERRORS:
+                resumes += 1
+                if resumes > self.max_resumes:
+                    raise
+                with self._lock:
+                    self.stats["resumes"] += 1
+                out.flush()
+                offset = out.tell()
+        return total, digest
+
+    # --- dọn kho ---
+
+    def evict(self, keep=()):
+        """
+        Xóa file quá tuổi, rồi file dùng lâu nhất cho tới khi kho <= max_bytes
+        (bỏ qua file đang dùng và các đường dẫn trong keep).
+        """
+        now = time.time()
+        entries = []
+        with self._lock:
+            pinned = set(self._pins) | set(self._inflight) | set(keep)
+        for entry in os.scandir(self.store_dir):
+            if not entry.is_file() or entry.name.endswith(PART_SUFFIX):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue  # thread khác vừa os.replace/evict file này
+            entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for mtime, nbytes, path in sorted(entries):
+            if path in pinned:
+                continue
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            if _remove(path):
+                total -= nbytes
+                removed += 1
+        with self._lock:
+            self.stats["evicted"] += removed
+        return removed
+
+    def cleanup(self, parts_only=False):
+        """Xóa file .part bỏ dở (của process đã chết hoặc quá tuổi) rồi dọn kho theo giới hạn."""
+        now = time.time()
+        own_suffix = f".{os.getpid()}{PART_SUFFIX}"
+        for entry in os.scandir(self.store_dir):
+            if not entry.name.endswith(PART_SUFFIX):
+                continue
+            with self._lock:
+                writing = any(entry.path.startswith(p) for p in self._inflight)
+            if writing:
+                continue
+            if entry.name.endswith(own_suffix) or now - _mtime(entry, now) > self.max_age:
+                _remove(entry.path)
+        if not parts_only:
+            self.evict()
+
+    def total_bytes(self):
+        total = 0
+        for entry in os.scandir(self.store_dir):
+            try:
+                if entry.is_file():
+                    total += entry.stat().st_size
+            except FileNotFoundError:
+                continue
+        return total
+
+
+def _mtime(entry, default):
+    # File có thể bị xóa giữa scandir và stat
+    try:
+        return entry.stat().st_mtime
+    except FileNotFoundError:
+        return default
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def _hash_file(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(STREAM_BUFFER), b""):
+            digest.update(block)
+    return digest
+
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+def get_download_manager():
+    """DownloadManager dùng chung cho cả process; file .part của process được dọn khi thoát."""
+    global _default_manager
+    with _default_lock:
+        if _default_manager is None:
+            _default_manager = DownloadManager()
+            atexit.register(_default_manager.cleanup, parts_only=True)
+        return _default_manager
@@ -0,0 +1,270 @@
+#drive_api.py
+# Truy cập Drive thuần (liệt kê, dựng cây, đọc nội dung), không phụ thuộc Streamlit
+# để dùng được cả trong CLI/cron lẫn trong app.
+
+import io
+import re
+from typing import NamedTuple, Optional
+
+from googleapiclient.http import MediaIoBaseDownload
+
+from .auth import get_drive_service, get_credentials
+from .prefetch import ContentPrefetcher, DEFAULT_MAX_IN_FLIGHT
+from .crawler import crawl_folder_tree, DEFAULT_MAX_WORKERS
+from .compact_tree import CompactTree
+from .content_cache import get_content_cache
+from .instrumentation import hit, miss, span
+from .search_index import index_contents
+from .scheduler import MEDIA, NORMAL, get_scheduler
+
+# Trường metadata ảnh/video mà Drive đã tính sẵn, lấy kèm khi liệt kê thư mục
+MEDIA_METADATA_FIELDS = (
+    "imageMediaMetadata(width, height), "
+    "videoMediaMetadata(width, height, durationMillis)"
+)
+
+
+class MediaFile(NamedTuple):
+    """
+    Một file ảnh/video trong thư mục. Vẫn dùng được như tuple (name, file_id) cũ.
+    width/height/duration_ms là None nếu Drive chưa xử lý xong metadata.
+    md5_checksum/byte_size dùng để kiểm tra khi phải tải cả file (downloads.py).
+    """
+    name: str
+    id: str
+    mime_type: str
+    modified_time: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    duration_ms: Optional[int] = None
+    md5_checksum: Optional[str] = None
+    byte_size: Optional[int] = None
+
+    @classmethod
+    def from_item(cls, item):
+        meta = item.get("imageMediaMetadata") or item.get("videoMediaMetadata") or {}
+        duration = meta.get("durationMillis")
+        size = item.get("size")
+        return cls(
+            name=item["name"],
+            id=item["id"],
+            mime_type=item["mimeType"],
+            modified_time=item.get("modifiedTime"),
+            width=meta.get("width"),
+            height=meta.get("height"),
+            duration_ms=int(duration) if duration is not None else None,
+            md5_checksum=item.get("md5Checksum"),
+            byte_size=int(size) if size is not None else None,
+        )
+
+    @property
+    def has_size(self):
+        return bool(self.width and self.height)
+
+def iter_media_in_folder(folder_id):
+    """
+    Generator: trả về từng MediaFile (ảnh hoặc video) ngay khi trang kết quả về tới,
+    không cần đợi liệt kê hết thư mục.
+    """
+    for f in iter_folder_contents(folder_id, with_media=True):
+        if f["mimeType"].startswith(("image/", "video/")):
+            yield MediaFile.from_item(f)
+
+def get_images_in_folder(folder_id):
+    """
+    Trả về danh sách các file ảnh và video trong thư mục, mỗi phần tử là MediaFile
+    (vẫn unpack được như tuple (name, file_id, ...)), kèm kích thước Drive đã biết.
+    Các ảnh có MIME type bắt đầu bằng 'image/'.
+    """
+    image_files = []
+    video_files = []
+    for media in iter_media_in_folder(folder_id):
+        if media.mime_type.startswith("image/"):
+            image_files.append(media)
+        else:
+            video_files.append(media)
+    return image_files, video_files
+
+def get_file_content(file_id, priority=NORMAL):
+    """Đọc nội dung file từ Google Drive (dạng văn bản)."""
+    request = get_drive_service().files().get_media(fileId=file_id)
+    fh = io.BytesIO()
+    downloader = MediaIoBaseDownload(fh, request)
+
+    with span("drive.get_content") as s:
+        done = False
+        while not done:
+            status, done = get_scheduler().call(downloader.next_chunk, MEDIA, priority)
+        s.add_bytes(fh.tell())
+
+    return fh.getvalue().decode("utf-8")
+
+def load_file_content(file_id, modified_time):
+    """Đọc nội dung file, ưu tiên cache trên đĩa (dùng chung mọi session), chỉ tải khi file đã đổi."""
+    cache = get_content_cache()
+    content = cache.get(file_id, modified_time)
+    if content is None:
+        miss("content_cache")
+        content = get_file_content(file_id)
+        cache.put(file_id, modified_time, content)
+    else:
+        hit("content_cache")
+    index_contents([(file_id, modified_time, content)])
+    return content
+
+
+_prefetchers = {}
+
+def get_prefetcher(max_in_flight=DEFAULT_MAX_IN_FLIGHT, requests_per_second=None):
+    """Một ContentPrefetcher (và connection pool) dùng chung cho cả process với mỗi cấu hình."""
+    key = (max_in_flight, requests_per_second)
+    if key not in _prefetchers:
+        _prefetchers[key] = ContentPrefetcher(
+            get_credentials(),
+            max_in_flight=max_in_flight,
+            requests_per_second=requests_per_second
+        )
+    return _prefetchers[key]
+
+def fetch_contents(wanted, max_in_flight=DEFAULT_MAX_IN_FLIGHT, requests_per_second=None):
+    """
+    Nội dung nhiều file một lượt: wanted là dict file_id -> modifiedTime.
+    Lấy từ cache đĩa trước, phần còn thiếu tải song song rồi ghi lại vào cache.
+    Trả về (dict file_id -> nội dung, số file thực sự phải tải).
+    """
+    disk_cache = get_content_cache()
+    contents = disk_cache.get_many(wanted.items())
+    to_download = {
+        file_id: modified_time
+        for file_id, modified_time in wanted.items()
+        if file_id not in contents
+    }
+    hit("content_cache", len(contents))
+    miss("content_cache", len(to_download))
+    if to_download:
+        prefetcher = get_prefetcher(max_in_flight, requests_per_second)
+        downloaded = prefetcher.fetch_many(to_download)
+        disk_cache.put_many(
+            (file_id, to_download[file_id], content) for file_id, content in downloaded.items()
+        )
+        contents.update(downloaded)
+    # Chỉ mục tìm kiếm bỏ qua những file đã có đúng modifiedTime, nên gọi cho cả phần lấy từ cache
+    index_contents((file_id, wanted[file_id], content) for file_id, content in contents.items())
+    return contents, len(to_download)
+
+def extract_folder_id_from_url(url: str) -> str:
+    """Trích xuất folder ID từ URL Google Drive."""
+    match = re.search(r"/folders/([a-zA-Z0-9_-]+)", url)
+    if not match:
+        return None
+    return match.group(1)
+
+def iter_folder_contents(folder_id, with_media=False, page_size=1000):
+    """
+    Generator: liệt kê file/folder con, tự theo nextPageToken để không bị cắt ở trang đầu.
+    Mỗi trang được yield ngay khi về tới.
+    """
+    query = f"'{folder_id}' in parents and trashed = false"
+    fields = "nextPageToken, files(id, name, mimeType, parents, modifiedTime)"
+    if with_media:
+        # Lấy luôn width/height để khỏi phải tải từng file về đo, md5/size để kiểm tra khi phải tải
+        fields = f"nextPageToken, files(id, name, mimeType, parents, modifiedTime, md5Checksum, size, {MEDIA_METADATA_FIELDS})"
+
+    page_token = None
+    while True:
+        with span("drive.list"):
+            results = get_scheduler().execute(get_drive_service().files().list(
+                q=query,
+                fields=fields,
+                pageSize=page_size,
+                pageToken=page_token
+            ))
+        yield from results.get("files", [])
+
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+
+def list_folder_contents(folder_id, parent = None, with_media=False):
+
+    # Lấy danh sách file/folder con (đủ mọi trang)
+    return list(iter_folder_contents(folder_id, with_media=with_media))
+
+
+
+def iter_folder_contents_recursive(folder_id):
+    """Generator: duyệt đệ quy, yield item ngay khi trang chứa nó về tới."""
+    for item in iter_folder_contents(folder_id):
+        yield item  # luôn trả chính item đó
+
+        # Nếu item là folder => duyệt tiếp nội dung
+        if item.get("mimeType") == "application/vnd.google-apps.folder":
+            yield from iter_folder_contents_recursive(item["id"])
+
+def list_folder_contents_recursive(folder_id, max_workers=DEFAULT_MAX_WORKERS):
+
+    # Lấy toàn bộ item trong cây thư mục: BFS, mỗi tầng gộp query và chạy song song
+    return crawl_folder_tree(get_drive_service, folder_id, max_workers=max_workers)
+
+def build_tree(items):
+    """
+    Dựng cây thư mục từ danh sách (hoặc generator) item, chỉ duyệt một lần
+    nên có thể truyền thẳng iter_folder_contents_recursive(...).
+    """
+    tree = {}
+    # Folder cha chưa xuất hiện (hoặc không nằm trong items → là root)
+    pending = {}
+
+    for item in items:
+        is_folder = item["mimeType"] == "application/vnd.google-apps.folder"
+        if is_folder:
+            node = pending.pop(item["id"], {"files": [], "subfolders": []})
+            tree[item["id"]] = {
+                "name": item["name"],
+                "files": node["files"],
+                "subfolders": node["subfolders"]
+            }
+
+        # Gắn file và subfolder vào đúng folder cha
+        parents = item.get("parents", [])
+        if not parents:
+            continue
+        parent_id = parents[0]
+        parent = tree.get(parent_id)
+        if parent is None:
+            parent = pending.setdefault(parent_id, {"files": [], "subfolders": []})
+
+        if is_folder:
+            parent["subfolders"].append(item["id"])
+        elif item["mimeType"] == "text/markdown":
+            parent["files"].append(item["id"] + "|" + item["modifiedTime"] + "|" + item["name"])
+
+    root_id = list(pending)[0]
+    tree[root_id] = {
+        "name": "ROOT",
+        "files": [],
+        "subfolders": list(tree.keys())
+    }
+    return tree
+
+
+
+
+def iter_markdown_files(folder, tree):
+    """Duyệt mọi file .md ("id|modifiedTime|name") trong folder và các folder con."""
+    if isinstance(tree, CompactTree):
+        yield from tree.iter_file_keys(folder)
+        return
+    stack = [folder]
+    seen = set()
+    while stack:
+        folder_id = stack.pop()
+        # node ROOT liệt kê mọi folder làm subfolder → tránh duyệt lặp
+        if folder_id in seen:
+            continue
+        seen.add(folder_id)
+        node = tree[folder_id]
+        for file in node.get("files", []):
+            if file.endswith(".md"):
+                yield file
+        stack.extend(node["subfolders"])
@@ -1,18 +1,75 @@
 #drive_ops.py
 
 import streamlit as st
+import copy
+import os
 import re
+import threading
 from .auth import get_drive_service
-from googleapiclient.http import MediaIoBaseDownload
-from googleapiclient.http import MediaIoBaseUpload
-import io
+from .prefetch import DEFAULT_MAX_IN_FLIGHT
+from .content_cache import get_content_cache
+from .tree_sync import TreeSync
+from .batch import execute_batched
+from .scheduler import INTERACTIVE, get_scheduler
+from .instrumentation import get_recorder, hit, miss, span
+from .md_index import parse_note
+from .yaml_merge import YamlMerger, merge_into
+from .folder_index import FolderIndex
+from .compact_tree import build_compact_tree
+from . import search_index
+from .drive_api import (
+    build_tree,
+    extract_folder_id_from_url,
+    fetch_contents,
+    get_file_content,
+    get_images_in_folder,
+    iter_markdown_files,
+    list_folder_contents,
+    list_folder_contents_recursive,
+    load_file_content,
+)
 import yaml
 
+__all__ = [
+    # Hàm trước đây nằm trong drive_ops, nay ở drive_api: giữ tên cũ cho Drive_HTML.py và code ngoài
+    "build_tree",
+    "extract_folder_id_from_url",
+    "get_file_content",
+    "get_images_in_folder",
+    "list_folder_contents",
+    "list_folder_contents_recursive",
+    # drive_ops
+    "append_history",
+    "collect",
+    "content_cache_key",
+    "deep_update",
+    "extract_bullet_items_from_section",
+    "extract_yaml",
+    "extract_yamls",
+    "folder_yaml",
+    "get_file_id_from_link",
+    "get_file_metadata",
+    "get_files_metadata",
+    "get_folder_index",
+    "get_or_cache_data",
+    "get_parsed_note",
+    "history_description",
+    "is_cached",
+    "load_folder_tree",
+    "metrics_panel",
+    "prefetch_contents",
+    "refresh_search_index",
+    "search_panel",
+    "select_working_folder",
+    "set_cached_data",
+    "sync_folder_items",
+]
+
 def get_file_metadata(file_id):
-    return drive_service.files().get(
+    return get_scheduler().execute(get_drive_service().files().get(
         fileId=file_id,
         fields="id, name, mimeType, description, createdTime"
-    ).execute()
+    ), priority=INTERACTIVE)
 def history_description(file_id: str, data_str: str):
     """
     Ghi lịch sử vào phần mô tả (description) của 1 file Drive.
@@ -20,10 +77,10 @@ def history_description(file_id: str, data_str: str):
     """
     # --- Lấy mô tả hiện tại ---
     try:
-        metadata = drive_service.files().get(
+        metadata = get_scheduler().execute(get_drive_service().files().get(
             fileId=file_id,
             fields="description"
-        ).execute()
+        ), priority=INTERACTIVE)
         old_desc = metadata.get("description", "") or ""
     except Exception:
         old_desc = ""
@@ -36,13 +93,55 @@ def history_description(file_id: str, data_str: str):
         new_desc = data_str
 
     # --- Cập nhật mô tả ---
-    drive_service.files().update(
+    get_scheduler().execute(get_drive_service().files().update(
         fileId=file_id,
         body={"description": data_str}
-    ).execute()
+    ), priority=INTERACTIVE)
 
     return data_str
 
+def get_files_metadata(file_ids, fields="id, name, mimeType, description, createdTime"):
+    """
+    Bản bulk của get_file_metadata: gộp tối đa 100 files().get vào một batch HTTP.
+    Trả về (metadata, errors): dict file_id -> metadata / exception của file lỗi.
+    """
+    requests_by_id = {
+        file_id: (lambda service, file_id=file_id: service.files().get(fileId=file_id, fields=fields))
+        for file_id in file_ids
+    }
+    return execute_batched(get_drive_service(), requests_by_id)
+
+def append_history(ids_to_text):
+    """
+    Bản bulk của history_description: append text vào description của nhiều file,
+    đọc mô tả cũ và ghi mô tả mới đều theo batch (2 lượt batch HTTP cho tối đa 100 file).
+    Trả về (updated, errors): dict file_id -> description mới / exception của file lỗi
+    (gồm cả file không đọc được mô tả cũ, những file này không bị ghi).
+    """
+    old_meta, read_errors = get_files_metadata(ids_to_text, fields="description")
+
+    new_descs = {}
+    for file_id, data_str in ids_to_text.items():
+        # Không đọc được mô tả cũ thì không ghi: ghi data_str một mình sẽ xóa mất lịch sử cũ
+        if file_id not in old_meta:
+            continue
+        new_desc = (old_meta[file_id].get("description", "") or "").strip()
+        new_descs[file_id] = new_desc + "\n" + data_str if new_desc else data_str
+
+    requests_by_id = {
+        file_id: (lambda service, file_id=file_id: service.files().update(
+            fileId=file_id,
+            body={"description": new_descs[file_id]},
+            fields="id"
+        ))
+        for file_id in new_descs
+    }
+    results, errors = execute_batched(get_drive_service(), requests_by_id)
+    updated = {file_id: new_descs[file_id] for file_id in results}
+    # File đọc lỗi không được ghi, trả lỗi đọc về cho caller
+    errors.update(read_errors)
+    return updated, errors
+
 
 
 def get_file_id_from_link(url):
@@ -53,34 +152,26 @@ def get_file_id_from_link(url):
     except ValueError:
         return None
 
-def get_images_in_folder(folder_id):
-    """
-    Trả về danh sách các file ảnh trong thư mục, mỗi phần tử là tuple (name, file_id).
-    Các ảnh có MIME type bắt đầu bằng 'image/'.
-    """
-    all_files = list_folder_contents(folder_id)
-    image_files = [
-        (f["name"], f["id"])
-        for f in all_files
-        if f["mimeType"].startswith("image/")
-    ]
-    video_files = [
-        (f["name"], f["id"])
-        for f in all_files
-        if f["mimeType"].startswith("video/")
-    ]
-    return image_files, video_files
-
 def get_or_cache_data(key, loader_func, dependencies=None):
     dep_key = f"{key}__deps"
     if key in st.session_state and dep_key in st.session_state:
         if st.session_state[dep_key] == dependencies:
+            hit("session_cache")
             return st.session_state[key]
+    miss("session_cache")
     data = loader_func()
     st.session_state[key] = data
     st.session_state[dep_key] = dependencies
     return data
 
+def is_cached(key, dependencies=None):
+    dep_key = f"{key}__deps"
+    return key in st.session_state and st.session_state.get(dep_key) == dependencies
+
+def set_cached_data(key, data, dependencies=None):
+    st.session_state[key] = data
+    st.session_state[f"{key}__deps"] = dependencies
+
 
 def extract_bullet_items_from_section(content, section_name):
 
@@ -107,60 +198,47 @@ def extract_yaml(content):
         return {}
 
     try:
-        data = yaml.safe_load(match.group(1))
+        with span("yaml.extract") as s:
+            s.add_bytes(len(match.group(1)))
+            data = yaml.safe_load(match.group(1))
         return data or {}
     except yaml.YAMLError as e:
         st.error(f"⚠️ Lỗi khi phân tích YAML: {e}")
         return {}
 
+def get_parsed_note(file, content):
+    """
+    Front matter + map section → bullet của file "id|modifiedTime|name", phân tích một lượt
+    và nhớ theo (file_id, modifiedTime). Thay cho việc gọi extract_yaml /
+    extract_bullet_items_from_section lặp lại trên cùng nội dung.
+    """
+    file_id, modified_time = file.split("|")[:2]
+    parsed = parse_note(file_id, modified_time, content)
+    if parsed.yaml_error:
+        st.error(f"⚠️ Lỗi khi phân tích YAML: {parsed.yaml_error}")
+    return parsed
+
 def deep_update(d, u):
-    """Merge dict u vào dict d, giữ tất cả key, merge dict và list sâu"""
-    for k, v in u.items():
-        if k in d:
-            if isinstance(d[k], dict) and isinstance(v, dict):
-                deep_update(d[k], v)
-            elif isinstance(d[k], list) and isinstance(v, list):
-                d[k].extend(x for x in v if x not in d[k])  # append nhưng tránh trùng
-            else:
-                d[k] = v  # ghi đè nếu không cùng type
-        else:
-            d[k] = v
-    return d
+    """Merge dict u vào dict d, giữ tất cả key, merge dict và list sâu (tránh trùng bằng tập hash)"""
+    return merge_into(d, u)
 
 
 def extract_yamls(datas):
     """
     Trích xuất YAML từ nhiều file và merge lại thành một dict duy nhất.
     Nếu cùng key, dữ liệu sẽ được gộp vào thay vì ghi đè.
+    datas có thể là iterator: mỗi file được phân tích rồi merge ngay, không giữ lại.
     """
     merged = {}
+    indexes = {}  # tập đã thấy của từng list, dùng chung cho cả lượt merge
     for raw_data in datas:
         data = extract_yaml(raw_data)
         if data:
-            deep_update(merged, data)
+            merge_into(merged, data, indexes)
     return merged
 
 
 
-def get_file_content(file_id):
-    """Đọc nội dung file từ Google Drive (dạng văn bản)."""
-    request = drive_service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-
-    return fh.getvalue().decode("utf-8")
-
-def extract_folder_id_from_url(url: str) -> str:
-    """Trích xuất folder ID từ URL Google Drive."""
-    match = re.search(r"/folders/([a-zA-Z0-9_-]+)", url)
-    if not match:
-        return None
-    return match.group(1)
-
 def select_working_folder():
     """Hiển thị ô nhập URL thư mục ở sidebar và trả về folder ID."""
     with st.sidebar:
@@ -173,96 +251,221 @@ def select_working_folder():
 
     return folder_id
 
-def list_folder_contents(folder_id, parent = None):
-
-    # Lấy danh sách file/folder con
-    query = f"'{folder_id}' in parents and trashed = false"
-    fields = "files(id, name, mimeType, parents, modifiedTime)"
-    results = drive_service.files().list(q=query, fields=fields).execute()
-    files = results.get("files", [])
-
-    return files
-
-
-
-def list_folder_contents_recursive(folder_id):
-
-    # Lấy các item trực tiếp trong folder hiện tại
-    items = list_folder_contents(folder_id, 1)
-
-    all_items = []
-    for item in items:
-        all_items.append(item)  # luôn thêm chính item đó vào danh sách
-
-        # Nếu item là folder => gọi đệ quy để lấy tiếp nội dung
-        if item.get("mimeType") == "application/vnd.google-apps.folder":
-            sub_items = list_folder_contents_recursive(item["id"])
-            all_items.extend(sub_items)
-
-    return all_items
-
-def build_tree(items):
-    tree = {}
-
-    # Khởi tạo tất cả folder
-    for item in items:
-        if item["mimeType"] == "application/vnd.google-apps.folder":
-            tree[item["id"]] = {
-                "name": item["name"],
-                "files": [],
-                "subfolders": []
-            }
-    root = set()
-    # Gắn file và subfolder vào đúng folder cha
-    for item in items:
-        parents = item.get("parents", [])
-        if not parents:
-            continue
-        parent_id = parents[0]
-        if parent_id not in tree:
-            root.add(parent_id)
-            continue
-
-        if item["mimeType"] == "application/vnd.google-apps.folder":
-            tree[parent_id]["subfolders"].append(item["id"])
-        elif item["mimeType"] == "text/markdown":
-            tree[parent_id]["files"].append(item["id"] + "|" + item["modifiedTime"] + "|" + item["name"])
-    root_id = list(root)[0]
-    tree[root_id] = {
-        "name": "ROOT",
-        "files": [],
-        "subfolders": list(tree.keys())
-    }
-    return tree
+# TreeSync, CompactTree, YamlMerger theo folder dùng chung cho mọi session Streamlit (mỗi session một thread):
+# _shared_lock chỉ giữ khi tạo, mỗi folder có lock riêng khi đồng bộ/merge
+_shared_lock = threading.Lock()
+_folder_locks = {}
+_tree_syncs = {}
 
+def _folder_lock(folder_id):
+    with _shared_lock:
+        lock = _folder_locks.get(folder_id)
+        if lock is None:
+            lock = _folder_locks[folder_id] = threading.RLock()
+        return lock
 
+def sync_folder_items(folder_id):
+    """
+    Danh sách item của cả cây thư mục, đồng bộ tăng dần bằng Drive Changes API:
+    lần đầu liệt kê toàn bộ, các lần sau chỉ đọc changes feed (thường 1-2 lần gọi API).
+    """
+    with _folder_lock(folder_id):
+        if folder_id not in _tree_syncs:
+            _tree_syncs[folder_id] = TreeSync(
+                get_drive_service,
+                folder_id,
+                crawl=list_folder_contents_recursive,
+                on_invalidate=get_content_cache().invalidate
+            )
+        return _tree_syncs[folder_id].sync()
 
+_folder_trees = {}
 
-def collect(folder, tree, checkbox, memo=None, folder_all_files=None):
+def load_folder_tree(folder_id):
+    """
+    CompactTree của cả cây thư mục (đồng bộ như sync_folder_items). Cây chỉ dựng lại khi snapshot
+    đổi, nên các lần rerun không có thay đổi trả về đúng object cũ và FolderIndex bỏ qua luôn.
+    """
+    # Cả đồng bộ lẫn dựng cây dưới lock của folder: snapshot, version và cây luôn khớp nhau
+    with _folder_lock(folder_id):
+        items = sync_folder_items(folder_id)
+        version = _tree_syncs[folder_id].version
+        cached = _folder_trees.get(folder_id)
+        if cached is None or cached[0] != version:
+            cached = _folder_trees[folder_id] = (version, build_compact_tree(items, folder_id))
+            if search_index.ENABLED:
+                search_index.get_search_index().sync_tree(folder_id, cached[1])
+        return cached[1]
+
+def refresh_search_index(folder_id):
+    """Đồng bộ cây rồi tải + lập chỉ mục các note mới/đã đổi dưới folder. Trả về số note đã cập nhật."""
+    load_folder_tree(folder_id)
+    index = search_index.get_search_index()
+    stale = index.stale(folder_id)
+    if stale:
+        contents, _ = fetch_contents(stale)
+        index.index_many((file_id, stale[file_id], content) for file_id, content in contents.items())
+    return len(stale)
+
+def search_panel(folder_id):
+    """Ô tìm ghi chú ở sidebar, chỉ đọc chỉ mục cục bộ (không tải gì trừ khi bấm cập nhật)."""
+    if not search_index.ENABLED:
+        return
+    index = search_index.get_search_index()
+    with st.sidebar.expander("🔎 Tìm ghi chú"):
+        query = st.text_input("Từ khóa / bộ lọc", key="search_query",
+                              placeholder='tags:python folder:<id> category:"khoa học" todo:~docs')
+        if folder_id and st.button("Cập nhật chỉ mục", key="search_refresh"):
+            with st.spinner("Đang đồng bộ cây và tải các note đã đổi..."):
+                updated = refresh_search_index(folder_id)
+            st.caption(f"Đã cập nhật {updated} note.")
+        st.caption(f"{index.count()} note trong chỉ mục.")
+        if not query:
+            return
+        parsed = search_index.parse_query(query)
+        folder = folder_id
+        if parsed.folder:
+            folder = extract_folder_id_from_url(parsed.folder) or parsed.folder
+        hits = index.search(parsed, folder=folder)
+        st.caption(f"{len(hits)} kết quả")
+        for h in hits:
+            st.markdown(f"**{h.path or h.file_id}**  \n{h.snippet}")
+
+def content_cache_key(file):
+    file_id, modified_time = file.split("|")[:2]
+    return f"folder_contents_{file}", {"sorted_compo_id": modified_time}, file_id
+
+
+def prefetch_contents(folder, tree, max_in_flight=DEFAULT_MAX_IN_FLIGHT, requests_per_second=None):
+    """
+    Gom mọi file .md chưa có trong cache dưới folder, lấy từ cache đĩa nếu có,
+    phần còn lại tải song song một lượt; sau đó collect() chỉ còn đọc từ bộ nhớ.
+    Trả về số file thực sự phải tải.
+    """
+    missing = {}
+    for file in iter_markdown_files(folder, tree):
+        key, deps, file_id = content_cache_key(file)
+        if not is_cached(key, deps):
+            missing[key] = (file_id, deps)
+    if not missing:
+        return 0
+
+    # Cache trên đĩa trước, chỉ tải những file thực sự đã đổi
+    contents, downloaded = fetch_contents(
+        {file_id: deps["sorted_compo_id"] for file_id, deps in missing.values()},
+        max_in_flight, requests_per_second
+    )
+
+    for key, (file_id, deps) in missing.items():
+        set_cached_data(key, contents[file_id], deps)
+    return downloaded
+
+def get_folder_index(tree):
+    """FolderIndex của session, giữ qua các lần rerun và chỉ cập nhật phần cây đã đổi."""
+    if "folder_index" not in st.session_state:
+        st.session_state["folder_index"] = FolderIndex()
+    index = st.session_state["folder_index"]
+    index.sync(tree)
+    return index
+
+def collect(folder, tree, checkbox, memo=None, folder_all_files=None, prefetch=True):
+    """
+    Trả về (contents, memo, all_files, folder_all_files) như trước, nhưng các danh sách là
+    FolderView của FolderIndex: không copy nội dung lên từng cấp, và rerun với cùng tree
+    không duyệt lại cây. tree là dict của build_tree hoặc CompactTree (load_folder_tree).
+    FolderView chỉ đọc (không append/sort tại chỗ): cần sửa thì list(view) trước.
+    """
     if memo is None:
         memo = {}
         folder_all_files = {}
-        
-    contents = []
-    all_files = []
-    for file in tree[folder].get("files", []):
-        if file.endswith(".md"):          # chỉ xử lý file kết thúc bằng .md
+
+    index = get_folder_index(tree)
+    missing = index.missing_contents(folder)
+    if missing:
+        if prefetch:
+            # Tải song song trước toàn bộ file còn thiếu, bên dưới chỉ đọc cache
+            prefetch_contents(folder, tree)
+        for file in missing:
             fikle_attribute = file.split("|")
             file_content = get_or_cache_data(
                 key=f"folder_contents_{file}",
-                loader_func=lambda: get_file_content(fikle_attribute[0]),
+                loader_func=lambda: load_file_content(fikle_attribute[0], fikle_attribute[1]),
                 dependencies={"sorted_compo_id": fikle_attribute[1]}
             )
-            all_files.append(file)
-            contents.append(file_content)
+            index.set_content(file, file_content)
 
-    for sub in tree[folder]["subfolders"]:
-        sub_contents, memo, fol, folder_all_files = collect(sub, tree, checkbox, memo, folder_all_files)
-        contents.extend(sub_contents)
-        all_files.extend(fol)
+    for sub in index.subtree_folders(folder):
+        memo[sub] = index.contents(sub)
+        folder_all_files[sub] = index.file_keys(sub)
+    return memo[folder], memo, folder_all_files[folder], folder_all_files
 
-    memo[folder] = contents
-    folder_all_files[folder] = all_files
-    return contents, memo, all_files, folder_all_files
+_yaml_mergers = {}
 
-drive_service = get_drive_service()
\ No newline at end of file
+def folder_yaml(folder, tree):
+    """
+    Front matter đã merge của mọi file dưới folder, nhớ tới khi cây con của folder thay đổi.
+    Khi cây con đổi, YamlMerger của folder chỉ phân tích lại file mới/đổi modifiedTime;
+    file mới thêm vào cuối chỉ merge thêm phần của nó. Không sửa dict trả về.
+    """
+    index = get_folder_index(tree)
+    with _shared_lock:
+        merger = _yaml_mergers.setdefault(folder, YamlMerger())
+
+    def compute(contents):
+        entries = []
+        for file, content in zip(index.file_keys(folder), contents):
+            file_id, modified_time = file.split("|")[:2]
+            entries.append((file_id, modified_time,
+                            lambda file=file, content=content: get_parsed_note(file, content).front_matter))
+        # Merger dùng chung giữa các session: sync dưới lock của folder, trả bản sao vì lần merge
+        # tăng dần sau (của session khác) sửa tại chỗ kết quả của merger
+        with _folder_lock(folder):
+            return copy.deepcopy(merger.sync(entries))
+
+    return index.aggregate(folder, "yaml", compute)
+
+
+def metrics_panel(show=True, top=15):
+    """
+    Gọi ở cuối mỗi lần rerun: ghi trace của lần chạy ra DRIVE2HTML_TRACE_FILE (JSONL, nếu có đặt)
+    và nếu show thì hiện ở sidebar các thao tác chậm nhất, tỉ lệ cache hit, nút tải JSONL/Prometheus.
+    """
+    recorder = get_recorder()
+    trace_file = os.environ.get("DRIVE2HTML_TRACE_FILE")
+    if trace_file:
+        recorder.write_jsonl(trace_file)
+    if not show:
+        return
+
+    with st.sidebar.expander("📊 Hiệu năng lần chạy này", expanded=True):
+        per_op = recorder.trace_summary()
+        if not per_op:
+            st.caption("Chưa có thao tác nào được đo.")
+            return
+        st.markdown("**Theo thao tác**")
+        st.dataframe([
+            {"thao tác": t["op"], "lần": t["calls"], "giây": round(t["seconds"], 3),
+             "KB": round(t["bytes"] / 1024, 1), "lỗi": t["errors"]}
+            for t in per_op
+        ], hide_index=True)
+
+        st.markdown(f"**{top} lần chậm nhất**")
+        st.dataframe([
+            {"thao tác": e["op"], "ms": round(e["seconds"] * 1000, 1), "KB": round(e["bytes"] / 1024, 1),
+             "bắt đầu (s)": round(e["start"], 3), "thread": e["thread"]}
+            for e in recorder.slowest(top)
+        ], hide_index=True)
+
+        caches = recorder.summary()["caches"]
+        if caches:
+            st.markdown("**Cache (từ lúc khởi động)**")
+            st.dataframe([
+                {"cache": name, "hit": c["hits"], "miss": c["misses"],
+                 "tỉ lệ hit": f"{c['hits'] / max(1, c['hits'] + c['misses']):.0%}"}
+                for name, c in caches.items()
+            ], hide_index=True)
+
+        st.download_button("Tải trace (JSONL)", recorder.to_jsonl(), file_name=f"trace_{recorder.trace_id}.jsonl",
+                           mime="application/jsonl")
+        st.download_button("Tải metrics (Prometheus)", recorder.prometheus_text(), file_name="drive2html.prom",
+                           mime="text/plain")
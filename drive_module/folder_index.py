@@ -0,0 +1,208 @@
+#folder_index.py
+
+from collections.abc import Sequence
+
+
+class FolderView(Sequence):
+    """
+    Danh sách (chỉ đọc) các file của một folder kèm mọi folder con, theo đúng thứ tự collect().
+    Không sao chép gì: chỉ giữ các đoạn [start, end) trỏ vào thứ tự phẳng của FolderIndex.
+    """
+
+    __slots__ = ("_index", "_spans", "_with_contents")
+
+    def __init__(self, index, spans, with_contents):
+        self._index = index
+        self._spans = spans
+        self._with_contents = with_contents
+
+    def _value(self, position):
+        key = self._index._order[position]
+        return self._index._contents.get(key) if self._with_contents else key
+
+    def __len__(self):
+        return sum(end - start for start, end in self._spans)
+
+    def __iter__(self):
+        for start, end in self._spans:
+            for position in range(start, end):
+                yield self._value(position)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self)[i]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("FolderView index out of range")
+        for start, end in self._spans:
+            if i < end - start:
+                return self._value(start + i)
+            i -= end - start
+        raise IndexError("FolderView index out of range")
+
+    def __repr__(self):
+        return f"FolderView({list(self)!r})"
+
+
+def _merge_spans(spans):
+    merged = []
+    for start, end in spans:
+        if start == end:
+            continue
+        if merged and merged[-1][1] == start:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+class FolderIndex:
+    """
+    Chỉ mục tổng hợp theo folder, giữ qua các lần rerun của Streamlit.
+
+    - Mọi file .md được xếp vào một thứ tự phẳng (duyệt sâu: file của folder rồi tới folder con),
+      nên tập file của một cây con là một (hoặc vài) đoạn liên tiếp → FolderView không copy list
+    - Nội dung file được giữ theo tham chiếu (key "id|modifiedTime|name" -> str)
+    - aggregate(folder, name, compute) nhớ kết quả tính trên FolderView; khi một folder đổi,
+      chỉ các kết quả của folder đó và các folder tổ tiên (đường lên root) bị xóa
+    """
+
+    def __init__(self):
+        self.tree = None
+        self._nodes = {}       # folder -> (file keys .md, subfolders)
+        self._parents = {}     # folder -> tập folder cha
+        self._order = []       # thứ tự phẳng các file key
+        self._own_start = {}   # folder -> vị trí file đầu tiên của chính folder trong _order
+        self._spans = {}       # folder -> các đoạn [start, end) của cả cây con
+        self._contents = {}    # file key -> nội dung
+        self._aggregates = {}  # folder -> {name: value}
+
+    # --- đồng bộ với cây từ build_tree ---
+
+    def sync(self, tree):
+        """Cập nhật theo tree mới, trả về tập folder có aggregate bị xóa. Cùng object tree thì bỏ qua."""
+        if tree is self.tree:
+            return set()
+
+        nodes = {
+            folder: (
+                tuple(f for f in node.get("files", []) if f.endswith(".md")),
+                tuple(node.get("subfolders", []))
+            )
+            for folder, node in tree.items()
+        }
+        changed = {f for f, sig in nodes.items() if self._nodes.get(f) != sig}
+        changed |= self._nodes.keys() - nodes.keys()
+
+        # Tổ tiên theo cây cũ (folder bị chuyển/xóa) và theo cây mới đều phải xóa aggregate
+        dirty = self._ancestors(changed)
+        structural = any(
+            f not in nodes or f not in self._nodes
+            or nodes[f][1] != self._nodes[f][1]
+            or len(nodes[f][0]) != len(self._nodes[f][0])
+            for f in changed
+        )
+        old_nodes = self._nodes
+        self._nodes = nodes
+        if structural:
+            self._build_parents()
+        dirty |= self._ancestors(changed)
+
+        for folder in dirty:
+            self._aggregates.pop(folder, None)
+
+        if structural:
+            self._layout()
+        else:
+            # Chỉ đổi key (modifiedTime) của file, số lượng giữ nguyên → ghi đè tại chỗ
+            for folder in changed:
+                start = self._own_start[folder]
+                self._order[start:start + len(nodes[folder][0])] = nodes[folder][0]
+
+        live = set(self._order)
+        for folder in changed:
+            for key in old_nodes.get(folder, ((), ()))[0]:
+                if key not in live:
+                    self._contents.pop(key, None)
+
+        self.tree = tree
+        return dirty
+
+    def _build_parents(self):
+        parents = {folder: set() for folder in self._nodes}
+        for folder, (_, subfolders) in self._nodes.items():
+            for sub in subfolders:
+                if sub in parents:
+                    parents[sub].add(folder)
+        self._parents = parents
+
+    def _ancestors(self, folders):
+        seen = set()
+        stack = list(folders)
+        while stack:
+            folder = stack.pop()
+            if folder in seen:
+                continue
+            seen.add(folder)
+            stack.extend(self._parents.get(folder, ()))
+        return seen
+
+    def _layout(self):
+        self._order = []
+        self._own_start = {}
+        self._spans = {}
+        for folder in self._nodes:
+            self._visit(folder, set())
+
+    def _visit(self, folder, in_progress):
+        if folder in self._spans:
+            return self._spans[folder]
+        if folder in in_progress:
+            return ()
+        in_progress.add(folder)
+
+        files, subfolders = self._nodes[folder]
+        start = len(self._order)
+        self._own_start[folder] = start
+        self._order.extend(files)
+        spans = [(start, len(self._order))]
+        for sub in subfolders:
+            if sub in self._nodes:
+                spans.extend(self._visit(sub, in_progress))
+
+        self._spans[folder] = _merge_spans(spans)
+        return self._spans[folder]
+
+    # --- truy vấn ---
+
+    def file_keys(self, folder):
+        return FolderView(self, self._spans.get(folder, ()), with_contents=False)
+
+    def contents(self, folder):
+        return FolderView(self, self._spans.get(folder, ()), with_contents=True)
+
+    def subtree_folders(self, folder):
+        """folder và mọi folder con cháu, mỗi folder một lần."""
+        seen = set()
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            if current in seen or current not in self._nodes:
+                continue
+            seen.add(current)
+            yield current
+            stack.extend(reversed(self._nodes[current][1]))
+
+    def missing_contents(self, folder):
+        return [key for key in self.file_keys(folder) if key not in self._contents]
+
+    def set_content(self, key, content):
+        self._contents[key] = content
+
+    def aggregate(self, folder, name, compute):
+        """Kết quả compute(FolderView nội dung) được nhớ tới khi cây con của folder thay đổi."""
+        cache = self._aggregates.setdefault(folder, {})
+        if name not in cache:
+            cache[name] = compute(self.contents(folder))
+        return cache[name]
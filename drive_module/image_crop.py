@@ -0,0 +1,139 @@
+#image_crop.py
+
+from io import BytesIO
+
+from PIL import Image
+
+# Cạnh dài tối đa của ảnh proxy dùng cho st_cropper
+PROXY_MAX_SIDE = 1600
+
+ASPECT_RATIOS = {
+    "1:1": (1, 1),
+    "16:9": (16, 9),
+    "4:3": (4, 3),
+    "3:4": (3, 4),
+    "2:3": (2, 3),
+    "9:16": (9, 16),
+    "3:2": (3, 2),
+    "1:1.4": (10, 14)
+}
+
+
+def get_largest_crop_fit(img_width, img_height, aspect_ratio):
+    """
+    Tìm khung crop lớn nhất với tỉ lệ aspect_ratio (w/h),
+    sao cho không vượt ra ngoài ảnh và ít nhất 1 chiều đạt max (rộng hoặc cao).
+    Trả về: crop_width, crop_height, (min_cx, max_cx, min_cy, max_cy)
+    """
+    a, b = aspect_ratio
+    crop_width_by_height = int(img_height * a / b)
+
+    if crop_width_by_height <= img_width:
+        # Chiều cao chiếm tối đa
+        crop_width = crop_width_by_height
+        crop_height = img_height
+    else:
+        # Chiều rộng chiếm tối đa
+        crop_width = img_width
+        crop_height = int(img_width * b / a)
+
+    # Giới hạn tâm khung để khung không vượt biên
+    min_cx = crop_width // 2
+    max_cx = img_width - crop_width // 2
+    min_cy = crop_height // 2
+    max_cy = img_height - crop_height // 2
+
+    center_range = (min_cx, max_cx, min_cy, max_cy)
+
+    return crop_width, crop_height, center_range
+
+def get_crop_center(rect):
+    left = rect[0]
+    top = rect[1]
+    width = rect[2]
+    height = rect[3]
+
+    center_x = left + width / 2
+    center_y = top + height / 2
+
+    return center_x, center_y
+
+
+def make_proxy(data, max_side=PROXY_MAX_SIDE):
+    """
+    Ảnh thu nhỏ (từ bytes) để crop tương tác. Trả về (proxy, scale, (width, height) gốc)
+    với scale = kích thước gốc / proxy. JPEG được decode thẳng ở độ phân giải thấp (draft)
+    nên không bung toàn bộ điểm ảnh.
+    """
+    img = Image.open(BytesIO(data))
+    full_size = img.size
+    if max(full_size) <= max_side:
+        img.load()
+        return img, 1.0, full_size
+    if img.format == "JPEG":
+        img.draft("RGB", (max_side, max_side))
+    img.thumbnail((max_side, max_side))
+    return img, full_size[0] / img.width, full_size
+
+
+def rect_to_full(rect, scale):
+    """Đổi (left, top, width, height) trên proxy sang tọa độ ảnh gốc."""
+    return tuple(int(round(v * scale)) for v in rect)
+
+
+def compute_crop_box(img_width, img_height, aspect_ratio, rect, auto=True):
+    """
+    Khung cắt (left, top, right, bottom) trên ảnh img_width x img_height.
+    auto: khung lớn nhất đúng tỉ lệ, tâm đặt theo tâm của rect (get_largest_crop_fit/get_crop_center);
+    ngược lại dùng nguyên rect. Khung luôn được kẹp trong ảnh.
+    """
+    if auto:
+        crop_width, crop_height, center_range = get_largest_crop_fit(img_width, img_height, aspect_ratio)
+        center = get_crop_center(rect)
+
+        clamped_x = max(center_range[0], min(center[0], center_range[1]))
+        clamped_y = max(center_range[2], min(center[1], center_range[3]))
+        left = int(clamped_x - crop_width / 2)
+        top = int(clamped_y - crop_height / 2)
+        width, height = crop_width, crop_height
+    else:
+        left, top, width, height = rect
+
+    left = max(0, min(left, img_width))
+    top = max(0, min(top, img_height))
+    return left, top, min(left + width, img_width), min(top + height, img_height)
+
+
+def scale_box(box, scale):
+    """Đổi khung cắt trên ảnh gốc sang tọa độ proxy (để xem trước)."""
+    return tuple(int(v / scale) for v in box)
+
+
+# Mode mà từng định dạng ghi được; mode khác (CMYK, YCbCr, I;16, F...) đổi sang RGB/RGBA trước khi lưu
+SAVE_MODES = {
+    "PNG": {"1", "L", "LA", "P", "RGB", "RGBA"},
+    "JPEG": {"L", "RGB"},
+    "WEBP": {"RGB", "RGBA"},
+}
+
+
+def convert_for_format(img, fmt):
+    """Ảnh ở mode fmt ghi được (giữ kênh alpha nếu định dạng hỗ trợ)."""
+    if img.mode in SAVE_MODES.get(fmt, {img.mode}):
+        return img
+    has_alpha = img.mode in ("RGBA", "LA", "PA", "RGBa", "La") or "transparency" in img.info
+    if img.mode.startswith("I") or img.mode == "F":
+        # Ảnh 16/32 bit: co về 8 bit trước (convert("RGB") cắt cụt giá trị > 255)
+        img = img.point(lambda v: v / 256).convert("L")
+        if img.mode in SAVE_MODES.get(fmt, ()):
+            return img
+    return img.convert("RGBA" if has_alpha and fmt != "JPEG" else "RGB")
+
+
+def crop_and_encode(data, box, fmt="PNG"):
+    """Decode ảnh gốc một lần, cắt đúng khung rồi encode (không qua mảng numpy trung gian)."""
+    with Image.open(BytesIO(data)) as img:
+        cropped = convert_for_format(img.crop(box), fmt)
+        out = BytesIO()
+        cropped.save(out, format=fmt)
+    return out.getvalue()
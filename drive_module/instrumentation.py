@@ -0,0 +1,291 @@
+#instrumentation.py
+
+# Đo thời gian / số byte / cache hit-miss trên các đường nóng (liệt kê, tải nội dung, dò kích thước,
+# phân tích YAML, cache). Chi phí mỗi lần đo chỉ là 2 lần perf_counter + một lần khóa,
+# nên để bật cả khi chạy thật; DRIVE2HTML_METRICS=0 để tắt hẳn.
+#
+# - span(op): context manager đo một thao tác, span.add_bytes(n) để cộng số byte
+# - hit(name) / miss(name): đếm cache hit/miss
+# - start_trace() mỗi lần rerun; trace(), slowest(), write_jsonl(), prometheus_text() để xuất
+#
+# Số liệu tổng là của cả process. Trace thì theo ngữ cảnh (contextvars): mỗi lần rerun của mỗi
+# session có trace riêng, session khác và thread nền không xóa hay trộn vào. Việc chạy trên thread
+# pool thay cho lần rerun thì bọc bằng bind_trace(fn) để được tính vào trace của lần rerun đó.
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+ENABLED = os.environ.get("DRIVE2HTML_METRICS", "1") != "0"
+# Số sự kiện tối đa giữ cho trace hiện tại (cũ nhất bị bỏ)
+MAX_EVENTS = 10000
+PROMETHEUS_PREFIX = "drive2html"
+
+
+class Span:
+    """Context manager đo một thao tác; ghi vào recorder khi thoát (kể cả khi có exception)."""
+    __slots__ = ("recorder", "op", "bytes", "start")
+
+    def __init__(self, recorder, op):
+        self.recorder = recorder
+        self.op = op
+        self.bytes = 0
+
+    def add_bytes(self, n):
+        self.bytes += n
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.record(self.op, time.perf_counter() - self.start, self.bytes, exc_type is not None)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def add_bytes(self, n):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """Sự kiện của một lần chạy (một rerun của một session, một lệnh CLI, một kịch bản benchmark)."""
+    __slots__ = ("id", "label", "start", "wall", "events")
+
+    def __init__(self, label=None, max_events=MAX_EVENTS):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.start = time.perf_counter()
+        self.wall = time.time()
+        self.events = deque(maxlen=max_events)
+
+
+# Trace của ngữ cảnh đang chạy; None = không thuộc trace nào (chỉ tính vào số liệu tổng)
+_current_trace = contextvars.ContextVar("drive2html_trace", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def bind_trace(fn):
+    """Bọc fn để khi chạy ở thread khác (thread pool) vẫn ghi vào trace của nơi gọi bind_trace."""
+    trace = _current_trace.get()
+
+    def run(*args, **kwargs):
+        token = _current_trace.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_trace.reset(token)
+
+    return run
+
+
+class Recorder:
+    """Bộ gom số liệu của process: tổng theo thao tác (từ lúc khởi động) + sự kiện của trace hiện tại."""
+
+    def __init__(self, enabled=ENABLED, max_events=MAX_EVENTS):
+        self.enabled = enabled
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._stats = {}      # op -> [calls, seconds, max_seconds, bytes, errors]
+        self._counters = {}   # name -> [hits, misses]
+
+    # --- ghi ---
+
+    def record(self, op, seconds, nbytes=0, error=False):
+        with self._lock:
+            stats = self._stats.get(op)
+            if stats is None:
+                stats = self._stats[op] = [0, 0.0, 0.0, 0, 0]
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+            stats[3] += nbytes
+            stats[4] += error
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.events.append((op, time.perf_counter() - trace.start - seconds, seconds,
+                                     nbytes, error, threading.current_thread().name))
+
+    def span(self, op):
+        return Span(self, op) if self.enabled else _NULL_SPAN
+
+    def count(self, name, hits=0, misses=0):
+        if not self.enabled:
+            return
+        with self._lock:
+            counter = self._counters.get(name)
+            if counter is None:
+                counter = self._counters[name] = [0, 0]
+            counter[0] += hits
+            counter[1] += misses
+
+    def hit(self, name, n=1):
+        self.count(name, hits=n)
+
+    def miss(self, name, n=1):
+        self.count(name, misses=n)
+
+    # --- trace theo từng lần rerun ---
+
+    def start_trace(self, label=None):
+        """Bắt đầu trace mới cho ngữ cảnh đang chạy (thread / rerun này), không đụng trace của nơi khác."""
+        trace = Trace(label, self.max_events)
+        _current_trace.set(trace)
+        return trace.id
+
+    @property
+    def trace_id(self):
+        trace = _current_trace.get()
+        return trace.id if trace is not None else None
+
+    @property
+    def trace_label(self):
+        trace = _current_trace.get()
+        return trace.label if trace is not None else None
+
+    def trace(self):
+        """Sự kiện của trace hiện tại: list dict (op, start, seconds, bytes, error, thread)."""
+        trace = _current_trace.get()
+        if trace is None:
+            return []
+        with self._lock:
+            events = list(trace.events)
+        return [
+            {"op": op, "start": start, "seconds": seconds, "bytes": nbytes, "error": bool(error), "thread": thread}
+            for op, start, seconds, nbytes, error, thread in events
+        ]
+
+    def slowest(self, n=10):
+        return sorted(self.trace(), key=lambda e: e["seconds"], reverse=True)[:n]
+
+    def summary(self):
+        """Số liệu tổng theo thao tác và theo cache, từ lúc process khởi động."""
+        with self._lock:
+            ops = {
+                op: {"calls": c, "seconds": s, "max_seconds": m, "bytes": b, "errors": e}
+                for op, (c, s, m, b, e) in self._stats.items()
+            }
+            caches = {name: {"hits": h, "misses": m} for name, (h, m) in self._counters.items()}
+        return {"ops": ops, "caches": caches}
+
+    def trace_summary(self):
+        """Gộp sự kiện của trace hiện tại theo thao tác (calls, seconds, bytes), chậm nhất trước."""
+        totals = {}
+        for e in self.trace():
+            t = totals.setdefault(e["op"], {"op": e["op"], "calls": 0, "seconds": 0.0, "bytes": 0, "errors": 0})
+            t["calls"] += 1
+            t["seconds"] += e["seconds"]
+            t["bytes"] += e["bytes"]
+            t["errors"] += e["error"]
+        return sorted(totals.values(), key=lambda t: t["seconds"], reverse=True)
+
+    def reset(self):
+        trace = _current_trace.get()
+        with self._lock:
+            self._stats.clear()
+            self._counters.clear()
+            if trace is not None:
+                trace.events.clear()
+
+    # --- xuất ---
+
+    def to_jsonl(self):
+        """Trace hiện tại dạng JSONL: mỗi dòng một sự kiện, kèm trace_id/label và thời điểm tuyệt đối."""
+        trace = _current_trace.get()
+        if trace is None:
+            return ""
+        header = {"trace_id": trace.id, "label": trace.label}
+        lines = []
+        for e in self.trace():
+            e.update(header)
+            e["ts"] = trace.wall + e["start"]
+            lines.append(json.dumps(e, ensure_ascii=False))
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def write_jsonl(self, path):
+        data = self.to_jsonl()
+        if data:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(data)
+
+    def prometheus_text(self, include_scheduler=True):
+        """Số liệu tổng ở định dạng text của Prometheus (kèm số liệu của RequestScheduler nếu đã dùng)."""
+        summary = self.summary()
+        out = []
+
+        def metric(name, kind, help_text, samples):
+            if not samples:
+                return
+            out.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            out.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                out.append(f"{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}")
+
+        ops = summary["ops"]
+        metric("op_calls_total", "counter", "Số lần gọi thao tác",
+               [({"op": op}, s["calls"]) for op, s in ops.items()])
+        metric("op_seconds_total", "counter", "Tổng thời gian thao tác (giây)",
+               [({"op": op}, f"{s['seconds']:.6f}") for op, s in ops.items()])
+        metric("op_max_seconds", "gauge", "Lần chậm nhất của thao tác (giây)",
+               [({"op": op}, f"{s['max_seconds']:.6f}") for op, s in ops.items()])
+        metric("op_bytes_total", "counter", "Tổng số byte thao tác đã đọc/tải",
+               [({"op": op}, s["bytes"]) for op, s in ops.items()])
+        metric("op_errors_total", "counter", "Số lần thao tác lỗi",
+               [({"op": op}, s["errors"]) for op, s in ops.items()])
+
+        caches = summary["caches"]
+        metric("cache_hits_total", "counter", "Cache hit",
+               [({"cache": name}, c["hits"]) for name, c in caches.items()])
+        metric("cache_misses_total", "counter", "Cache miss",
+               [({"cache": name}, c["misses"]) for name, c in caches.items()])
+
+        if include_scheduler:
+            from . import scheduler
+            if scheduler._default_scheduler is not None:
+                lanes = scheduler._default_scheduler.metrics()
+                metric("scheduler_queue_depth", "gauge", "Số request đang chờ token",
+                       [({"api": api}, m["queue_depth"]) for api, m in lanes.items()])
+                metric("scheduler_requests_total", "counter", "Số request đã được cấp token",
+                       [({"api": api}, m["requests"]) for api, m in lanes.items()])
+                metric("scheduler_throttle_seconds_total", "counter", "Tổng thời gian chờ token (giây)",
+                       [({"api": api}, f"{m['throttle_seconds']:.6f}") for api, m in lanes.items()])
+                metric("scheduler_retries_total", "counter", "Số lần thử lại",
+                       [({"api": api}, m["retries"]) for api, m in lanes.items()])
+                metric("scheduler_rate_limited_total", "counter", "Số lần bị Drive rate limit",
+                       [({"api": api}, m["rate_limited"]) for api, m in lanes.items()])
+        return "\n".join(out) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_recorder = Recorder()
+
+def get_recorder():
+    return _recorder
+
+span = _recorder.span
+hit = _recorder.hit
+miss = _recorder.miss
+start_trace = _recorder.start_trace
@@ -0,0 +1,126 @@
+#md_index.py
+
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import yaml
+
+from .instrumentation import hit, miss, span
+
+# Số note đã phân tích được giữ trong bộ nhớ
+DEFAULT_MAX_ENTRIES = 20000
+
+
+class ParsedNote(NamedTuple):
+    """Kết quả phân tích một file markdown: front matter + map `## section:` → các dòng bullet."""
+    front_matter: dict
+    sections: dict
+    has_front_matter: bool = False
+    yaml_error: Optional[str] = None
+
+    def bullets(self, section_name):
+        return self.sections.get(section_name.strip().lower(), [])
+
+
+def _find_front_matter(content):
+    """
+    Cùng ngữ nghĩa với regex r'^---\\s*(.*?)\\s*---' (MULTILINE | DOTALL) của extract_yaml:
+    dòng đầu tiên bắt đầu bằng '---' mở, lần xuất hiện '---' kế tiếp đóng.
+    """
+    if content.startswith("---"):
+        start = 0
+    else:
+        start = content.find("\n---")
+        if start < 0:
+            return None
+        start += 1
+    end = content.find("---", start + 3)
+    if end < 0:
+        return None
+    return content[start + 3:end].strip()
+
+
+def _section_name(line):
+    """
+    (tên section viết thường, phần còn lại sau dấu ':') nếu dòng bắt đầu (sau khoảng trắng)
+    bằng '## name: ...', ngược lại (None, line). '##' giữa dòng (vd. trong bullet) không mở section.
+    """
+    stripped = line.lstrip()
+    if not stripped.startswith("##"):
+        return None, line
+    name, sep, rest = stripped.lstrip("#").partition(":")
+    name = name.strip()
+    if not sep or not name:
+        return None, line
+    return name.lower(), rest
+
+
+def parse_markdown(content):
+    """
+    Quét tài liệu một lượt, tách front matter và mọi section `## name:` kèm bullet của nó.
+    Một section kết thúc ở dòng kế tiếp bắt đầu bằng '## ' (như extract_bullet_items_from_section).
+    Khác regex cũ ở một chỗ: section rỗng nằm ngay trước heading '## ' khác thì vẫn rỗng,
+    không "nuốt" luôn section phía sau.
+    """
+    yaml_text = _find_front_matter(content)
+    front_matter = {}
+    yaml_error = None
+    if yaml_text is not None:
+        try:
+            front_matter = yaml.safe_load(yaml_text) or {}
+        except yaml.YAMLError as e:
+            yaml_error = str(e)
+
+    sections = {}
+    open_sections = []
+    for line in content.splitlines():
+        if line[:2] == "##" and line[2:3].isspace():
+            open_sections = []
+        name, rest = _section_name(line)
+        if name is not None and name not in sections:
+            sections[name] = []
+            open_sections.append(sections[name])
+            # phần sau dấu ':' trên cùng dòng heading cũng thuộc section
+            line = rest
+        stripped = line.strip()
+        if stripped.startswith("-"):
+            for bullets in open_sections:
+                bullets.append(stripped)
+
+    return ParsedNote(front_matter, sections, yaml_text is not None, yaml_error)
+
+
+class NoteIndex:
+    """Cache ParsedNote theo (file_id, modifiedTime): tra front matter/section lần sau là O(1)."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_id, modified_time, content):
+        key = (file_id, modified_time)
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                hit("note_index")
+                return parsed
+
+        miss("note_index")
+        with span("md.parse") as s:
+            parsed = parse_markdown(content)
+            s.add_bytes(len(content))
+        with self._lock:
+            self._entries[key] = parsed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return parsed
+
+
+_default_index = NoteIndex()
+
+def parse_note(file_id, modified_time, content):
+    """ParsedNote của file, dùng index chung của process."""
+    return _default_index.get(file_id, modified_time, content)
@@ -0,0 +1,366 @@
+#media_probe.py
+
+import struct
+import requests
+
+from .instrumentation import span
+from .scheduler import DOWNLOAD, INTERACTIVE, get_scheduler
+
+DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc?export=download&id={file_id}"
+
+# Mỗi lần đọc Range tối thiểu bao nhiêu byte (đủ cho header PNG/GIF/WebP và đa số JPEG)
+CHUNK_SIZE = 64 * 1024
+# Tổng số byte tối đa được đọc khi dò header, quá mức này thì bỏ cuộc và tải toàn bộ
+MAX_PROBE_BYTES = 8 * 1024 * 1024
+
+# Các marker SOFn của JPEG (trừ DHT=C4, JPG=C8, DAC=CC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Các box top-level thường gặp ở đầu file MP4/MOV
+MP4_TOP_LEVEL_BOXES = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+
+
+class ProbeError(Exception):
+    """Không đọc được kích thước từ header (định dạng lạ, header hỏng hoặc vượt giới hạn byte)."""
+
+
+class RangeReader:
+    """
+    Đọc file theo từng đoạn byte và cache lại các đoạn đã tải.
+    fetch(start, end) trả về (data, total_size) với data là các byte trong [start, end]
+    (end tính cả, có thể ngắn hơn nếu hết file), total_size là tổng kích thước file hoặc None.
+    """
+
+    def __init__(self, fetch, chunk_size=CHUNK_SIZE, max_bytes=MAX_PROBE_BYTES):
+        self.fetch = fetch
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.bytes_transferred = 0
+        self.size = None
+        self._segments = []  # list các (offset, bytes) đã tải
+
+    def read(self, offset, length):
+        end = offset + length
+        for start, data in self._segments:
+            seg_end = start + len(data)
+            if start <= offset and (end <= seg_end or seg_end == self.size):
+                return data[offset - start:end - start]
+
+        if self.size is not None and offset >= self.size:
+            return b""
+
+        want = max(length, self.chunk_size)
+        if self.bytes_transferred + want > self.max_bytes:
+            want = length
+        if self.bytes_transferred + want > self.max_bytes:
+            raise ProbeError(f"Vượt giới hạn {self.max_bytes} byte khi dò header")
+
+        data, total = self.fetch(offset, offset + want - 1)
+        self.bytes_transferred += len(data)
+        if total is not None:
+            self.size = total
+        self._segments.append((offset, data))
+        return data[:length]
+
+
+def http_range_fetcher(url, session=None, timeout=30, priority=INTERACTIVE):
+    """
+    Tạo hàm fetch(start, end) dùng HTTP Range cho RangeReader.
+    Nếu server bỏ qua Range (trả 200) thì chỉ đọc phần đầu rồi đóng kết nối,
+    còn khi cần đọc từ giữa file thì báo ProbeError để quay về cách tải toàn bộ.
+    """
+    def fetch(start, end):
+        headers = {"Range": f"bytes={start}-{end}"}
+        with get_scheduler().get(url, DOWNLOAD, priority, session=session,
+                                 headers=headers, stream=True, timeout=timeout) as r:
+            if r.status_code == 416:
+                return b"", None
+            r.raise_for_status()
+
+            total = None
+            if r.status_code == 206:
+                content_range = r.headers.get("Content-Range", "")
+                size_str = content_range.rsplit("/", 1)[-1]
+                if size_str.isdigit():
+                    total = int(size_str)
+            else:
+                if start > 0:
+                    raise ProbeError("Server không hỗ trợ HTTP Range")
+                length = r.headers.get("Content-Length", "")
+                if length.isdigit():
+                    total = int(length)
+
+            need = end - start + 1
+            buf = bytearray()
+            for chunk in r.iter_content(chunk_size=min(need, 64 * 1024)):
+                buf.extend(chunk)
+                if len(buf) >= need:
+                    break
+            return bytes(buf[:need]), total
+
+    return fetch
+
+
+def _probe_png(reader):
+    head = reader.read(0, 24)
+    if len(head) < 24 or head[12:16] != b"IHDR":
+        raise ProbeError("PNG thiếu IHDR")
+    width, height = struct.unpack(">II", head[16:24])
+    return width, height, 1
+
+
+def _skip_gif_sub_blocks(reader, offset):
+    """Trả về vị trí ngay sau chuỗi sub-block (mỗi block: 1 byte độ dài + dữ liệu, kết thúc bằng 0)."""
+    while True:
+        size = reader.read(offset, 1)
+        if not size:
+            raise ProbeError("GIF bị cắt")
+        offset += 1 + size[0]
+        if size[0] == 0:
+            return offset
+
+
+def _probe_gif(reader, count_frames=True):
+    head = reader.read(0, 13)
+    if len(head) < 13:
+        raise ProbeError("GIF header quá ngắn")
+    width, height = struct.unpack("<HH", head[6:10])
+    if not count_frames:
+        return width, height, 1
+
+    # Đếm image descriptor (0x2C) để phân biệt GIF động như cv2 trước đây
+    offset = 13
+    if head[10] & 0x80:
+        offset += 3 << ((head[10] & 0x07) + 1)
+    frames = 0
+    while True:
+        block = reader.read(offset, 10)
+        if not block or block[0] == 0x3B:
+            break
+        if block[0] == 0x21:
+            if len(block) < 2:
+                raise ProbeError("GIF extension bị cắt")
+            offset = _skip_gif_sub_blocks(reader, offset + 2)
+        elif block[0] == 0x2C:
+            if len(block) < 10:
+                raise ProbeError("GIF image descriptor bị cắt")
+            frames += 1
+            offset += 10
+            if block[9] & 0x80:
+                offset += 3 << ((block[9] & 0x07) + 1)
+            # 1 byte LZW minimum code size rồi tới dữ liệu ảnh
+            offset = _skip_gif_sub_blocks(reader, offset + 1)
+        else:
+            raise ProbeError(f"GIF block lạ: {block[0]:#x}")
+    return width, height, max(frames, 1)
+
+
+def _count_webp_frames(reader):
+    """Số chunk ANMF trong WebP động (duyệt header chunk RIFF, bỏ qua dữ liệu bằng Range)."""
+    frames = 0
+    offset = 12
+    while True:
+        head = reader.read(offset, 8)
+        if len(head) < 8:
+            break
+        chunk, size = head[:4], int.from_bytes(head[4:8], "little")
+        if chunk == b"ANMF":
+            frames += 1
+        offset += 8 + size + (size & 1)
+    return max(frames, 1)
+
+
+def _probe_webp(reader, count_frames=True):
+    head = reader.read(0, 30)
+    if len(head) < 30:
+        raise ProbeError("WebP header quá ngắn")
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        # frame tag 3 byte + start code 9d 01 2a, sau đó là width/height 14 bit
+        if head[23:26] != b"\x9d\x01\x2a":
+            raise ProbeError("WebP VP8 sai start code")
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF, 1
+    if chunk == b"VP8L":
+        if head[20] != 0x2F:
+            raise ProbeError("WebP VP8L sai signature")
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        # cờ animation (bit 1) → đếm khung
+        frames = _count_webp_frames(reader) if count_frames and head[20] & 0x02 else 1
+        return width, height, frames
+    raise ProbeError(f"WebP chunk không hỗ trợ: {chunk!r}")
+
+
+def _probe_jpeg(reader):
+    offset = 2
+    while True:
+        head = reader.read(offset, 4)
+        if len(head) < 2 or head[0] != 0xFF:
+            raise ProbeError("JPEG marker không hợp lệ")
+        marker = head[1]
+        if marker == 0xFF:
+            # byte đệm 0xFF giữa các marker
+            offset += 1
+            continue
+        if marker in (0x01,) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            raise ProbeError("JPEG không có SOF trước dữ liệu ảnh")
+        if len(head) < 4:
+            raise ProbeError("JPEG header bị cắt")
+        seg_len = struct.unpack(">H", head[2:4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            sof = reader.read(offset + 4, 5)
+            if len(sof) < 5:
+                raise ProbeError("JPEG SOF bị cắt")
+            height, width = struct.unpack(">HH", sof[1:5])
+            return width, height, 1
+        # bỏ qua segment (APPn, DQT, DHT...) mà không cần tải nội dung của nó
+        offset += 2 + seg_len
+
+
+def _iter_boxes(data, start=0, end=None):
+    """Duyệt các box MP4 con trong một đoạn bytes đã tải sẵn: trả về (type, body_start, body_end)."""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[offset:offset + 8])
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                break
+            size = struct.unpack(">Q", data[offset + 8:offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            break
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _find_box(data, start, end, box_type):
+    for typ, body_start, body_end in _iter_boxes(data, start, end):
+        if typ == box_type:
+            return body_start, body_end
+    return None
+
+
+def _parse_trak(data, start, end):
+    """Trả về (handler_type, width, height, frame_count) của một track."""
+    width = height = 0
+    handler = None
+    frames = 0
+
+    tkhd = _find_box(data, start, end, b"tkhd")
+    if tkhd:
+        # width/height (16.16 fixed) luôn nằm ở 8 byte cuối của tkhd, cả version 0 lẫn 1
+        t_end = tkhd[1]
+        if t_end - tkhd[0] >= 8:
+            w_fixed, h_fixed = struct.unpack(">II", data[t_end - 8:t_end])
+            width, height = w_fixed >> 16, h_fixed >> 16
+
+    mdia = _find_box(data, start, end, b"mdia")
+    if mdia:
+        hdlr = _find_box(data, mdia[0], mdia[1], b"hdlr")
+        if hdlr and hdlr[1] - hdlr[0] >= 12:
+            handler = data[hdlr[0] + 8:hdlr[0] + 12]
+        minf = _find_box(data, mdia[0], mdia[1], b"minf")
+        stbl = minf and _find_box(data, minf[0], minf[1], b"stbl")
+        stts = stbl and _find_box(data, stbl[0], stbl[1], b"stts")
+        if stts and stts[1] - stts[0] >= 8:
+            count = struct.unpack(">I", data[stts[0] + 4:stts[0] + 8])[0]
+            pos = stts[0] + 8
+            for _ in range(count):
+                if pos + 8 > stts[1]:
+                    break
+                frames += struct.unpack(">I", data[pos:pos + 4])[0]
+                pos += 8
+
+    return handler, width, height, frames
+
+
+def _parse_moov(moov):
+    fallback = None
+    for typ, start, end in _iter_boxes(moov):
+        if typ != b"trak":
+            continue
+        handler, width, height, frames = _parse_trak(moov, start, end)
+        if handler == b"vide" and width and height:
+            return width, height, frames
+        if fallback is None and width and height:
+            fallback = (width, height, frames)
+    if fallback:
+        return fallback
+    raise ProbeError("moov không có track video")
+
+
+def _probe_mp4(reader):
+    offset = 0
+    while True:
+        head = reader.read(offset, 16)
+        if len(head) < 8:
+            raise ProbeError("Không tìm thấy box moov")
+        size, box_type = struct.unpack(">I4s", head[:8])
+        header = 8
+        if size == 1:
+            if len(head) < 16:
+                raise ProbeError("Box MP4 bị cắt")
+            size = struct.unpack(">Q", head[8:16])[0]
+            header = 16
+        elif size == 0:
+            if box_type != b"moov" or reader.size is None:
+                raise ProbeError("Không tìm thấy box moov")
+            size = reader.size - offset
+        if size < header:
+            raise ProbeError("Box MP4 không hợp lệ")
+
+        if box_type == b"moov":
+            moov = reader.read(offset + header, size - header)
+            if len(moov) < size - header:
+                raise ProbeError("moov bị cắt")
+            return _parse_moov(moov)
+
+        # nhảy qua box (kể cả mdat rất lớn) bằng Range, moov ở cuối file vẫn đọc được
+        offset += size
+
+
+def probe_media_size(reader, count_frames=True):
+    """
+    Đọc (width, height, frame_count) chỉ từ phần header của file.
+    Ảnh tĩnh có frame_count = 1; GIF/WebP động trả về số khung. Báo ProbeError nếu không nhận ra định dạng.
+    count_frames=False (ngoài Video Mode): dừng sau header GIF / chunk VP8X, mọi ảnh tính là 1 khung
+    thay vì duyệt cả file để đếm khung.
+    """
+    head = reader.read(0, 16)
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _probe_png(reader)
+    if head.startswith(b"\xff\xd8"):
+        return _probe_jpeg(reader)
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return _probe_gif(reader, count_frames)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _probe_webp(reader, count_frames)
+    if head[4:8] in MP4_TOP_LEVEL_BOXES:
+        return _probe_mp4(reader)
+    raise ProbeError("Định dạng không được hỗ trợ")
+
+
+def probe_drive_media(file_id: str, session=None, priority=INTERACTIVE, count_frames=True):
+    """
+    Dò kích thước ảnh/video trên Drive chỉ bằng các đoạn Range đầu file.
+    Trả về (width, height, frame_count), hoặc None nếu header không đọc được.
+    """
+    url = DRIVE_DOWNLOAD_URL.format(file_id=file_id)
+    reader = RangeReader(http_range_fetcher(url, session=session, priority=priority))
+    with span("media.probe") as s:
+        try:
+            return probe_media_size(reader, count_frames)
+        except (ProbeError, requests.RequestException, struct.error):
+            return None
+        finally:
+            s.add_bytes(reader.bytes_transferred)
@@ -0,0 +1,57 @@
+#media_size.py
+
+from . import media_probe
+from .downloads import get_download_manager
+
+
+def get_video_size_from_drive(file_id: str, session=None, md5=None, byte_size=None, modified_time=None):
+    import cv2  # chỉ cần khi phải tải cả video
+
+    # File nằm trong kho tải về (tự dọn), không bị xóa khi cv2 còn đang đọc
+    with get_download_manager().checkout(file_id, md5, byte_size, session=session,
+                                         modified_time=modified_time) as path:
+        cap = cv2.VideoCapture(path)
+        width  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+    return width, height, frame_count
+
+
+def get_image_size_from_drive(file_id: str, session=None, md5=None, byte_size=None, modified_time=None):
+    from PIL import Image
+
+    with get_download_manager().checkout(file_id, md5, byte_size, session=session,
+                                         modified_time=modified_time) as path:
+        with Image.open(path) as img:
+            return img.width, img.height, 1
+
+
+# Ảnh có thể có nhiều khung: listing của Drive không cho biết số khung
+ANIMATED_IMAGE_MIME_TYPES = {"image/gif", "image/webp"}
+
+
+def get_media_size(media, is_video: bool, session=None):
+    # Drive đã trả width/height trong listing → không cần gọi mạng
+    # (Video Mode cần số khung thật của GIF/WebP để loại ảnh động)
+    animated = is_video and media.mime_type in ANIMATED_IMAGE_MIME_TYPES
+    if media.has_size and media.mime_type.startswith("image/") and not animated:
+        return media.width, media.height, 1
+    return get_file_size(media.id, is_video, session=session, md5=media.md5_checksum,
+                         byte_size=media.byte_size, modified_time=media.modified_time)
+
+
+def get_file_size(file_id: str, is_video: bool, session=None, md5=None, byte_size=None, modified_time=None):
+    # Ưu tiên đọc kích thước từ header (chỉ tải vài KB bằng HTTP Range)
+    # Ngoài Video Mode mọi ảnh tính là 1 khung (như khi đọc bằng PIL) → không duyệt GIF/WebP để đếm khung
+    size = media_probe.probe_drive_media(file_id, session=session, count_frames=is_video)
+    if size is not None:
+        return size
+
+    # Header không đọc được → tải toàn bộ (một lần, có kiểm tra md5, giữ trong kho tải về)
+    if is_video:
+        return get_video_size_from_drive(file_id, session=session, md5=md5, byte_size=byte_size,
+                                         modified_time=modified_time)
+    else:
+        return get_image_size_from_drive(file_id, session=session, md5=md5, byte_size=byte_size,
+                                         modified_time=modified_time)
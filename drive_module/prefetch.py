@@ -0,0 +1,78 @@
+#prefetch.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.auth.credentials import with_scopes_if_required
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+
+from .instrumentation import bind_trace, span
+from .scheduler import BACKGROUND, MEDIA, get_scheduler
+
+DRIVE_MEDIA_URL = "https://www.googleapis.com/drive/v3/files/{file_id}?alt=media"
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive"]
+
+DEFAULT_MAX_IN_FLIGHT = 8
+
+
+def create_session(credentials, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """AuthorizedSession dùng chung một connection pool (keep-alive) đủ cho max_in_flight request."""
+    session = AuthorizedSession(with_scopes_if_required(credentials, DRIVE_SCOPES))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+    session.mount("https://", adapter)
+    return session
+
+
+class ContentPrefetcher:
+    """
+    Tải song song nội dung văn bản của nhiều file Drive.
+    - max_in_flight: số request chạy đồng thời tối đa (cũng là kích thước connection pool)
+    - requests_per_second: giới hạn thông lượng riêng của prefetcher, None = không giới hạn
+      (ngoài token bucket chung của scheduler)
+    - request đi qua scheduler ở làn priority (mặc định BACKGROUND) → nhường ảnh đang xem;
+      429/5xx (và 403 rateLimitExceeded) do scheduler thử lại với backoff + jitter
+    - session: HTTP session có sẵn (vd. Drive giả trong benchmarks/) thay cho AuthorizedSession
+    """
+
+    def __init__(self, credentials, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 requests_per_second=None, max_retries=5, priority=BACKGROUND, session=None):
+        self.session = session or create_session(credentials, max_in_flight)
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.priority = priority
+        self._min_interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = 0.0
+        self._slot_lock = threading.Lock()
+
+    def _wait_for_slot(self):
+        if not self._min_interval:
+            return
+        with self._slot_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def fetch_text(self, file_id):
+        url = DRIVE_MEDIA_URL.format(file_id=file_id)
+
+        def request():
+            self._wait_for_slot()
+            return self.session.get(url)
+
+        with span("drive.prefetch") as s:
+            response = get_scheduler().call(request, MEDIA, self.priority, max_retries=self.max_retries)
+            response.raise_for_status()
+            s.add_bytes(len(response.content))
+        return response.content.decode("utf-8")
+
+    def fetch_many(self, file_ids):
+        """Trả về dict file_id -> nội dung. Lỗi của một file làm hỏng cả lượt (như get_file_content)."""
+        file_ids = list(dict.fromkeys(file_ids))
+        if not file_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            return dict(zip(file_ids, pool.map(bind_trace(self.fetch_text), file_ids)))
@@ -0,0 +1,234 @@
+#preview_cache.py
+
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+from .content_cache import DEFAULT_CACHE_DIR
+from .instrumentation import hit, miss, span
+from .scheduler import BACKGROUND, DOWNLOAD, get_scheduler
+
+DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc?export=download&id={file_id}"
+# Cạnh dài của ảnh xem trước trong lưới 3 cột
+DEFAULT_PREVIEW_SIZE = 480
+DEFAULT_MAX_WORKERS = 4
+# Giới hạn thư mục ảnh xem trước: quá dung lượng thì xóa ảnh dùng lâu nhất, quá tuổi thì xóa
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+# Dọn thư mục tối đa một lần mỗi chừng này giây; chỉ cập nhật mtime khi đọc nếu cũ hơn chừng này
+EVICT_INTERVAL = 60.0
+TOUCH_INTERVAL = 60.0
+FAILED_SUFFIX = ".failed"
+# Tải lỗi (mạng, timeout, 429 đã hết lượt thử lại): thử lại sau chừng này giây
+RETRY_FAILED_AFTER = 300.0
+
+
+def make_preview(data, size, fmt="WEBP", quality=80):
+    """
+    Thu nhỏ ảnh (bytes) về cạnh dài <= size và encode lại.
+    JPEG được decode thẳng ở độ phân giải thấp bằng draft(); sau đó reduce() theo hệ số nguyên
+    rồi thumbnail() để ra đúng kích thước.
+    """
+    img = Image.open(BytesIO(data))
+    if img.format == "JPEG":
+        img.draft("RGB", (size, size))
+    factor = max(img.width, img.height) // (size * 2)
+    if factor >= 2:
+        img = img.reduce(factor)
+    img.thumbnail((size, size))
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+    mode = "RGBA" if has_alpha and fmt != "JPEG" else "RGB"
+    if img.mode != mode:
+        img = img.convert(mode)
+
+    out = BytesIO()
+    img.save(out, format=fmt, quality=quality)
+    return out.getvalue()
+
+
+def download_bytes(file_id):
+    # Ảnh xem trước tạo nền → làn BACKGROUND, nhường các request đang hiển thị
+    r = get_scheduler().get(DRIVE_DOWNLOAD_URL.format(file_id=file_id), DOWNLOAD, BACKGROUND, timeout=60)
+    r.raise_for_status()
+    return r.content
+
+
+class PreviewCache:
+    """
+    Cache ảnh xem trước trên đĩa, khóa là (file_id, modifiedTime, size).
+    Ảnh thiếu được tạo trong thread pool nền; trang chỉ đọc file đã có sẵn.
+    Ảnh PIL không đọc được (HEIC, RAW...) được nhớ theo (file_id, modifiedTime) và đánh dấu trên đĩa,
+    không tải lại cho tới khi file đổi; tải lỗi thì chỉ tạm bỏ qua RETRY_FAILED_AFTER giây.
+    """
+
+    def __init__(self, cache_dir=None, max_workers=DEFAULT_MAX_WORKERS, fmt="WEBP", fetch=download_bytes,
+                 max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.cache_dir = cache_dir or os.path.join(DEFAULT_CACHE_DIR, "previews")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.fmt = fmt
+        self.fetch = fetch
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="preview")
+        self._pending = {}
+        self._failed = set()      # (file_id, modified_time) không decode được
+        self._retry_after = {}    # (file_id, modified_time) -> thời điểm được thử tải lại
+        self._last_evict = 0.0
+        # RLock: callback của future đã xong có thể chạy ngay trong request() khi đang giữ khóa
+        self._lock = threading.RLock()
+        self.evict()
+
+    def path_for(self, file_id, modified_time, size):
+        digest = hashlib.sha1(f"{file_id}|{modified_time}|{size}".encode("utf-8")).hexdigest()
+        ext = "webp" if self.fmt == "WEBP" else "jpg"
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.{ext}")
+
+    def _failed_path(self, file_id, modified_time):
+        digest = hashlib.sha1(f"{file_id}|{modified_time}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + FAILED_SUFFIX)
+
+    def get(self, file_id, modified_time, size=DEFAULT_PREVIEW_SIZE):
+        """Đường dẫn ảnh xem trước nếu đã có, ngược lại None."""
+        path = self.path_for(file_id, modified_time, size)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        # mtime là lần dùng gần nhất (để dọn theo LRU)
+        if time.time() - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return path
+
+    def has_failed(self, file_id, modified_time):
+        key = (file_id, modified_time)
+        if key in self._failed:
+            return True
+        retry_at = self._retry_after.get(key)
+        if retry_at is not None:
+            if time.time() < retry_at:
+                return True
+            with self._lock:
+                self._retry_after.pop(key, None)
+        return os.path.exists(self._failed_path(file_id, modified_time))
+
+    def request(self, file_id, modified_time, size=DEFAULT_PREVIEW_SIZE):
+        """
+        Xếp việc tạo ảnh xem trước vào pool nền (không trùng lặp), trả về Future,
+        hoặc None nếu đã có, không decode được, hay vừa tải lỗi với đúng modifiedTime này.
+        """
+        if self.get(file_id, modified_time, size) or self.has_failed(file_id, modified_time):
+            return None
+        key = (file_id, modified_time, size)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(self._generate, file_id, modified_time, size)
+                self._pending[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+            return future
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _generate(self, file_id, modified_time, size):
+        path = self.path_for(file_id, modified_time, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with span("preview.generate") as s:
+                original = self.fetch(file_id)
+                s.add_bytes(len(original))
+                try:
+                    data = make_preview(original, size, fmt=self.fmt)
+                except (OSError, ValueError, Image.DecompressionBombError):
+                    # Định dạng PIL không đọc được: lần sau (kể cả sau khi khởi động lại) không tải lại
+                    with self._lock:
+                        self._failed.add((file_id, modified_time))
+                    failed_path = self._failed_path(file_id, modified_time)
+                    os.makedirs(os.path.dirname(failed_path), exist_ok=True)
+                    open(failed_path, "wb").close()
+                    raise
+            # Ghi file tạm rồi đổi tên để trang không bao giờ đọc phải file dở dang
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception:
+            # Lỗi tải/ghi có thể chỉ tạm thời: không nhớ vĩnh viễn, chỉ tránh tải lại ở mỗi lần rerun
+            with self._lock:
+                if (file_id, modified_time) not in self._failed:
+                    self._retry_after[(file_id, modified_time)] = time.time() + RETRY_FAILED_AFTER
+            raise
+        self._maybe_evict()
+        return path
+
+    def _maybe_evict(self):
+        with self._lock:
+            if time.time() - self._last_evict < EVICT_INTERVAL:
+                return
+            self._last_evict = time.time()
+        self.evict()
+
+    def evict(self):
+        """Xóa ảnh quá tuổi và ảnh dùng lâu nhất cho tới khi thư mục <= max_bytes. Trả về số file đã xóa."""
+        now = time.time()
+        entries = []
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue  # evict/ghi đè khác vừa xóa hoặc đổi tên file
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for mtime, nbytes, path in sorted(entries):
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= nbytes
+            removed += 1
+        return removed
+
+    def data_uri(self, file_id, modified_time, size=DEFAULT_PREVIEW_SIZE):
+        """data: URI của ảnh xem trước để nhúng thẳng vào <img>, None nếu chưa có."""
+        path = self.get(file_id, modified_time, size)
+        if path is None:
+            miss("preview_cache")
+            return None
+        hit("preview_cache")
+        with open(path, "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("ascii")
+        mime = "image/webp" if self.fmt == "WEBP" else "image/jpeg"
+        return f"data:{mime};base64,{encoded}"
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_preview_cache():
+    """PreviewCache (và thread pool) dùng chung cho cả process."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = PreviewCache()
+        return _default_cache
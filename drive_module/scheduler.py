@@ -0,0 +1,290 @@
+#scheduler.py
+
+# Bộ điều phối request chung cho mọi lưu lượng tới Drive:
+# - token bucket riêng cho từng loại API (metadata / media / download)
+# - hàng đợi ưu tiên: request tương tác (ảnh đang xem) được cấp token trước prefetch chạy nền
+# - lỗi tạm thời (403 rate limit, 429, 5xx, mất kết nối) được thử lại với exponential backoff + jitter;
+#   khi bị rate limit cả loại API tạm dừng để các thread khác không dội thêm request
+# - metrics(): độ sâu hàng đợi, thời gian chờ token, số lần thử lại
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+import requests
+from googleapiclient.errors import HttpError
+
+# Loại API, mỗi loại một token bucket
+METADATA = "metadata"   # files.list/get/update, changes, batch (Drive API v3)
+MEDIA = "media"         # nội dung file qua API (alt=media, get_media)
+DOWNLOAD = "download"   # link công khai drive.google.com/uc?export=download, thumbnail
+
+# Làn ưu tiên: số nhỏ được phục vụ trước
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+
+# (request/giây, burst) mặc định; ghi đè bằng DRIVE2HTML_RATE_LIMITS="metadata=10:20,download=5:10"
+DEFAULT_LIMITS = {
+    METADATA: (10.0, 20),
+    MEDIA: (20.0, 40),
+    DOWNLOAD: (8.0, 16),
+}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 32.0
+
+
+def is_rate_limit_status(status, text=""):
+    if status == 429:
+        return True
+    # Drive báo vượt quota bằng 403 + reason rateLimitExceeded
+    return status == 403 and any(r in text for r in RATE_LIMIT_REASONS)
+
+
+def _error_text(exception):
+    # reason (rateLimitExceeded...) nằm trong body JSON, str(HttpError) không phải lúc nào cũng có
+    content = exception.content or b""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    return f"{exception} {content}"
+
+
+def is_retryable_error(exception):
+    """Exception tạm thời: HttpError 429/5xx/403 rate limit, hoặc lỗi kết nối/timeout."""
+    if isinstance(exception, HttpError):
+        status = exception.resp.status
+        return status in RETRY_STATUS or is_rate_limit_status(status, _error_text(exception))
+    return isinstance(exception, (requests.ConnectionError, requests.Timeout))
+
+
+def is_retryable_response(response):
+    """requests.Response có mã lỗi tạm thời (429/5xx, 403 rate limit)."""
+    status = response.status_code
+    if status in RETRY_STATUS:
+        return True
+    return status == 403 and is_rate_limit_status(status, response.text)
+
+
+def _is_rate_limited(exception=None, response=None):
+    if response is not None:
+        return is_rate_limit_status(response.status_code, response.text)
+    if isinstance(exception, HttpError):
+        return is_rate_limit_status(exception.resp.status, _error_text(exception))
+    return False
+
+
+def _retry_after(response):
+    """Giá trị Retry-After (giây) nếu server gửi, ngược lại None."""
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_limits(spec):
+    """'metadata=10:20,download=5' → {metadata: (10.0, 20), download: (5.0, 5)}."""
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.partition("=")
+        rate, _, burst = value.partition(":")
+        rate = float(rate)
+        limits[name.strip()] = (rate, int(burst) if burst else max(1, int(rate)))
+    return limits
+
+
+class TokenBucket:
+    """Token bucket: nạp `rate` token/giây, chứa tối đa `capacity`. Không tự khóa (Scheduler giữ khóa)."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def try_take(self, cost=1.0, now=None):
+        """Lấy cost token; trả về 0 nếu được, ngược lại số giây cần chờ."""
+        now = time.monotonic() if now is None else now
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Request đắt hơn cả bucket (batch lớn) vẫn đi được khi bucket đầy, rồi nợ lại
+        needed = min(cost, self.capacity)
+        if self.tokens >= needed:
+            self.tokens -= cost
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def pause(self, seconds, now=None):
+        now = time.monotonic() if now is None else now
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class _Lane:
+    __slots__ = ("bucket", "waiting", "stats")
+
+    def __init__(self, rate, burst):
+        self.bucket = TokenBucket(rate, burst)
+        self.waiting = []   # heap (priority, seq)
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "throttle_seconds": 0.0,
+            "max_queue_depth": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "errors": 0,
+        }
+
+
+class RequestScheduler:
+    """
+    Mọi request Drive đi qua call(): chờ token của loại API (theo thứ tự ưu tiên),
+    gọi fn, thử lại khi lỗi tạm thời. An toàn khi dùng từ nhiều thread.
+    """
+
+    def __init__(self, limits=None, max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF,
+                 max_backoff=MAX_BACKOFF):
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lanes = {name: _Lane(rate, burst) for name, (rate, burst) in limits.items()}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    def _lane(self, api_class):
+        try:
+            return self._lanes[api_class]
+        except KeyError:
+            raise ValueError(f"Loại API không hợp lệ: {api_class}")
+
+    def acquire(self, api_class=METADATA, priority=NORMAL, cost=1):
+        """Chờ tới lượt (theo priority, rồi theo thứ tự đến) và lấy cost token. Trả về số giây đã chờ."""
+        lane = self._lane(api_class)
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(lane.waiting, entry)
+            lane.stats["max_queue_depth"] = max(lane.stats["max_queue_depth"], len(lane.waiting))
+            while True:
+                if lane.waiting[0] == entry:
+                    wait = lane.bucket.try_take(cost)
+                    if not wait:
+                        heapq.heappop(lane.waiting)
+                        self._cond.notify_all()
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            waited = time.monotonic() - start
+            lane.stats["requests"] += 1
+            if waited > 0.001:
+                lane.stats["throttled"] += 1
+                lane.stats["throttle_seconds"] += waited
+        return waited
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        # Full jitter: ngẫu nhiên trong [0, backoff * 2^attempt], tôn trọng Retry-After nếu có
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    def _on_retry(self, lane, attempt, rate_limited, retry_after=None):
+        delay = self._backoff_delay(attempt, retry_after)
+        with self._cond:
+            lane.stats["retries"] += 1
+            if rate_limited:
+                # Bị rate limit → cả loại API nghỉ, không riêng thread này
+                lane.stats["rate_limited"] += 1
+                lane.bucket.pause(delay)
+                lane.bucket.tokens = 0.0
+            self._cond.notify_all()
+        time.sleep(delay)
+
+    def call(self, fn, api_class=METADATA, priority=NORMAL, cost=1, max_retries=None):
+        """
+        Gọi fn() khi có token. Nếu fn trả về requests.Response lỗi tạm thời hoặc raise lỗi tạm thời
+        thì thử lại (tối đa max_retries lần); lần cuối trả về/raise nguyên kết quả cho caller.
+        """
+        lane = self._lane(api_class)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            self.acquire(api_class, priority, cost)
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt < max_retries and is_retryable_error(e):
+                    self._on_retry(lane, attempt, _is_rate_limited(exception=e))
+                    continue
+                with self._cond:
+                    lane.stats["errors"] += 1
+                raise
+            if isinstance(result, requests.Response) and is_retryable_response(result):
+                if attempt < max_retries:
+                    rate_limited = _is_rate_limited(response=result)
+                    retry_after = _retry_after(result)
+                    result.close()
+                    self._on_retry(lane, attempt, rate_limited, retry_after)
+                    continue
+                with self._cond:
+                    lane.stats["errors"] += 1
+            return result
+
+    def execute(self, request, api_class=METADATA, priority=NORMAL, cost=1):
+        """HttpRequest của googleapiclient (hoặc BatchHttpRequest) → request.execute() qua scheduler."""
+        return self.call(request.execute, api_class, priority, cost)
+
+    def get(self, url, api_class=DOWNLOAD, priority=NORMAL, session=None, **kwargs):
+        """requests.get (hoặc session.get) qua scheduler; caller tự raise_for_status()."""
+        http = session or requests
+        return self.call(lambda: http.get(url, **kwargs), api_class, priority)
+
+    def queue_depth(self, api_class=None):
+        with self._cond:
+            if api_class is not None:
+                return len(self._lane(api_class).waiting)
+            return sum(len(lane.waiting) for lane in self._lanes.values())
+
+    def metrics(self):
+        """Ảnh chụp số liệu theo loại API (kèm queue_depth hiện tại và cấu hình bucket)."""
+        with self._cond:
+            return {
+                name: {
+                    **lane.stats,
+                    "queue_depth": len(lane.waiting),
+                    "rate": lane.bucket.rate,
+                    "burst": int(lane.bucket.capacity),
+                }
+                for name, lane in self._lanes.items()
+            }
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+def get_scheduler():
+    """RequestScheduler dùng chung cho cả process (giới hạn lấy từ DRIVE2HTML_RATE_LIMITS nếu có)."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler(parse_limits(os.environ.get("DRIVE2HTML_RATE_LIMITS", "")))
+        return _default_scheduler
+
+
+def configure_scheduler(limits=None, **kwargs):
+    """Thay scheduler dùng chung bằng cấu hình mới (gọi lúc khởi động, trước khi có request)."""
+    global _default_scheduler
+    with _default_lock:
+        _default_scheduler = RequestScheduler(limits, **kwargs)
+        return _default_scheduler
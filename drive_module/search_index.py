@@ -0,0 +1,396 @@
+#search_index.py
+
+# Chỉ mục tìm kiếm cục bộ (SQLite FTS5) cho các note markdown:
+# - nội dung, front matter (mỗi trường một dòng, list tách từng phần tử) và bullet của các section
+# - cập nhật dần mỗi khi nội dung được tải (index_many bỏ qua file đã có đúng modifiedTime)
+# - vị trí file trong cây (folder cha, đường dẫn) đồng bộ riêng từ tree bằng sync_tree,
+#   nên "note gắn tag X dưới folder Y" trả lời được mà không phải tải hay phân tích lại gì
+#
+# Cú pháp truy vấn (parse_query): từ khóa tự do + bộ lọc dạng khóa:giá_trị
+#   tags:python folder:<id> category:"khoa học" todo:~viết docs meta.level:3
+
+import json
+import os
+import shlex
+import threading
+from typing import NamedTuple, Optional
+
+from .content_cache import DEFAULT_CACHE_DIR
+from .instrumentation import span
+from .md_index import parse_note
+from .sqlite_store import Transaction, connect
+
+ENABLED = os.environ.get("DRIVE2HTML_SEARCH_INDEX", "1") != "0"
+DEFAULT_LIMIT = 50
+# Khóa đặc biệt của parse_query (không phải trường front matter)
+FOLDER_KEYS = ("folder", "in")
+NAME_KEY = "name"
+# Giá trị bắt đầu bằng ~ → tìm trong bullet của section cùng tên thay vì front matter
+BULLET_PREFIX = "~"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    doc_id        INTEGER PRIMARY KEY,
+    file_id       TEXT NOT NULL UNIQUE,
+    modified_time TEXT NOT NULL,
+    front_matter  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    doc_id INTEGER NOT NULL,
+    field  TEXT NOT NULL,
+    value  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fields_lookup ON fields (field, value);
+CREATE INDEX IF NOT EXISTS fields_doc ON fields (doc_id);
+CREATE TABLE IF NOT EXISTS bullets (
+    doc_id  INTEGER NOT NULL,
+    section TEXT NOT NULL,
+    text    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bullets_section ON bullets (section);
+CREATE INDEX IF NOT EXISTS bullets_doc ON bullets (doc_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5 (
+    body, fields, bullets, tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS placement (
+    file_id       TEXT PRIMARY KEY,
+    root_id       TEXT NOT NULL,
+    folder_id     TEXT NOT NULL,
+    name          TEXT NOT NULL,
+    path          TEXT NOT NULL,
+    modified_time TEXT
+);
+CREATE INDEX IF NOT EXISTS placement_folder ON placement (folder_id);
+CREATE INDEX IF NOT EXISTS placement_root ON placement (root_id);
+CREATE TABLE IF NOT EXISTS folders (
+    folder_id TEXT PRIMARY KEY,
+    root_id   TEXT NOT NULL,
+    parent_id TEXT
+);
+CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent_id);
+"""
+
+
+class SearchHit(NamedTuple):
+    file_id: str
+    name: Optional[str]
+    path: Optional[str]
+    modified_time: str
+    snippet: str
+    front_matter: dict
+
+
+class Query(NamedTuple):
+    """Truy vấn đã tách: text cho FTS5, fields [(trường, giá trị)], bullets [(section, text)], folder."""
+    text: str = ""
+    fields: tuple = ()
+    bullets: tuple = ()
+    folder: Optional[str] = None
+    name: Optional[str] = None
+
+
+def parse_query(query):
+    """'tags:python folder:abc ~x thuật toán' → Query. Giá trị có khoảng trắng đặt trong ngoặc kép."""
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        tokens = query.split()
+    words, fields, bullets = [], [], []
+    folder = name = None
+    for token in tokens:
+        key, sep, value = token.partition(":")
+        if not sep or not key or not value or "/" in key:
+            words.append(token)
+            continue
+        key = key.lower()
+        if key in FOLDER_KEYS:
+            folder = value
+        elif key == NAME_KEY:
+            name = value
+        elif value.startswith(BULLET_PREFIX):
+            bullets.append((key, value[len(BULLET_PREFIX):]))
+        else:
+            fields.append((key, value))
+    return Query(" ".join(words), tuple(fields), tuple(bullets), folder, name)
+
+
+def flatten_fields(front_matter, prefix=""):
+    """Front matter → [(trường, giá trị viết thường)]: dict lồng nhau thành 'a.b', list tách từng phần tử."""
+    out = []
+    if isinstance(front_matter, dict):
+        for key, value in front_matter.items():
+            out.extend(flatten_fields(value, f"{prefix}{str(key).lower()}."))
+    elif isinstance(front_matter, (list, tuple, set)):
+        for value in front_matter:
+            out.extend(flatten_fields(value, prefix))
+    elif front_matter is not None and prefix:
+        out.append((prefix[:-1], str(front_matter).strip().lower()))
+    return out
+
+
+def _bullet_text(line):
+    return line.lstrip("-").strip()
+
+
+def fts_match(text):
+    """Chuỗi người dùng → biểu thức MATCH an toàn: mỗi từ một cụm trong ngoặc kép (AND), 'abc*' là tiền tố."""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """
+    Chỉ mục tìm kiếm trên đĩa, dùng chung giữa các session/process như ContentCache
+    (WAL, mỗi thread một connection). Khóa của note là (file_id, modifiedTime).
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+            path = os.path.join(DEFAULT_CACHE_DIR, "search.sqlite3")
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def _transaction(self):
+        return Transaction(self._conn())
+
+    # --- nội dung ---
+
+    def indexed_versions(self, file_ids):
+        """dict file_id -> modifiedTime đang có trong chỉ mục."""
+        conn = self._conn()
+        found = {}
+        for file_id in file_ids:
+            row = conn.execute("SELECT modified_time FROM notes WHERE file_id = ?", (file_id,)).fetchone()
+            if row is not None:
+                found[file_id] = row[0]
+        return found
+
+    def index_many(self, entries):
+        """
+        entries: iterable (file_id, modified_time, content). File đã có đúng modifiedTime thì bỏ qua,
+        bản cũ bị thay. Trả về số note đã (tái) lập chỉ mục.
+        """
+        entries = list(entries)
+        if not entries:
+            return 0
+        current = self.indexed_versions(file_id for file_id, _, _ in entries)
+        pending = [e for e in entries if current.get(e[0]) != e[1]]
+        if not pending:
+            return 0
+
+        with span("search.index") as s:
+            rows = []
+            for file_id, modified_time, content in pending:
+                s.add_bytes(len(content))
+                parsed = parse_note(file_id, modified_time, content)
+                fields = flatten_fields(parsed.front_matter)
+                bullets = [
+                    (section, _bullet_text(line))
+                    for section, lines in parsed.sections.items()
+                    for line in lines
+                ]
+                front_matter = json.dumps(parsed.front_matter, ensure_ascii=False, default=str)
+                rows.append((file_id, modified_time, content, front_matter, fields, bullets))
+
+            with self._transaction() as conn:
+                self._delete(conn, [row[0] for row in rows])
+                for file_id, modified_time, content, front_matter, fields, bullets in rows:
+                    doc_id = conn.execute(
+                        "INSERT INTO notes (file_id, modified_time, front_matter) VALUES (?, ?, ?)",
+                        (file_id, modified_time, front_matter)
+                    ).lastrowid
+                    conn.executemany("INSERT INTO fields (doc_id, field, value) VALUES (?, ?, ?)",
+                                     [(doc_id, f, v) for f, v in fields])
+                    conn.executemany("INSERT INTO bullets (doc_id, section, text) VALUES (?, ?, ?)",
+                                     [(doc_id, sec, t) for sec, t in bullets])
+                    conn.execute(
+                        "INSERT INTO notes_fts (rowid, body, fields, bullets) VALUES (?, ?, ?, ?)",
+                        (doc_id, content, " ".join(f"{f} {v}" for f, v in fields),
+                         "\n".join(t for _, t in bullets))
+                    )
+        return len(rows)
+
+    def index_note(self, file_id, modified_time, content):
+        return self.index_many([(file_id, modified_time, content)])
+
+    def _delete(self, conn, file_ids):
+        for file_id in file_ids:
+            row = conn.execute("SELECT doc_id FROM notes WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None:
+                continue
+            doc_id = row[0]
+            conn.execute("DELETE FROM notes_fts WHERE rowid = ?", (doc_id,))
+            conn.execute("DELETE FROM fields WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM bullets WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM notes WHERE doc_id = ?", (doc_id,))
+
+    def invalidate(self, file_ids):
+        """Gỡ các file (bị xóa/trash hoặc đổi nội dung) khỏi chỉ mục."""
+        with self._transaction() as conn:
+            self._delete(conn, list(file_ids))
+
+    # --- vị trí trong cây ---
+
+    def sync_tree(self, root_id, tree):
+        """
+        Ghi lại folder cha, đường dẫn và modifiedTime của mọi file .md dưới root_id theo tree
+        (dict của build_tree hoặc CompactTree). Note không còn trong cây bị gỡ khỏi chỉ mục.
+        """
+        parents = {}
+        for folder, node in tree.items():
+            for sub in node["subfolders"]:
+                # build_tree cho node ROOT liệt kê mọi folder: chỉ dùng khi chưa có cha thật
+                if folder != root_id or sub not in parents:
+                    parents[sub] = folder
+        parents.pop(root_id, None)
+
+        def folder_path(folder):
+            parts = []
+            seen = set()
+            while folder in parents and folder not in seen:
+                seen.add(folder)
+                parts.append(tree[folder]["name"])
+                folder = parents[folder]
+            return "/".join(reversed(parts))
+
+        placement = []
+        paths = {}
+        for folder, node in tree.items():
+            if folder not in paths:
+                paths[folder] = folder_path(folder)
+            for key in node["files"]:
+                file_id, modified_time, name = key.split("|", 2)
+                path = f"{paths[folder]}/{name}" if paths[folder] else name
+                placement.append((file_id, root_id, folder, name, path, modified_time))
+
+        with self._transaction() as conn:
+            old = {r[0] for r in conn.execute("SELECT file_id FROM placement WHERE root_id = ?", (root_id,))}
+            conn.execute("DELETE FROM placement WHERE root_id = ?", (root_id,))
+            conn.execute("DELETE FROM folders WHERE root_id = ?", (root_id,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO placement (file_id, root_id, folder_id, name, path, modified_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)", placement
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO folders (folder_id, root_id, parent_id) VALUES (?, ?, ?)",
+                [(folder, root_id, parents.get(folder)) for folder in tree]
+            )
+            removed = old - {row[0] for row in placement}
+            self._delete(conn, removed)
+        return len(placement)
+
+    def stale(self, root_id):
+        """dict file_id -> modifiedTime của các note dưới root_id chưa có hoặc đã cũ trong chỉ mục."""
+        rows = self._conn().execute(
+            "SELECT p.file_id, p.modified_time FROM placement p "
+            "LEFT JOIN notes n ON n.file_id = p.file_id "
+            "WHERE p.root_id = ? AND (n.file_id IS NULL OR n.modified_time != p.modified_time)",
+            (root_id,)
+        ).fetchall()
+        return dict(rows)
+
+    # --- truy vấn ---
+
+    def search(self, query, folder=None, limit=DEFAULT_LIMIT):
+        """
+        query: chuỗi (theo cú pháp parse_query) hoặc Query. folder giới hạn trong cây con của folder đó
+        (ghi đè folder: trong query). Kết quả xếp theo độ liên quan (bm25) nếu có từ khóa, ngược lại theo đường dẫn.
+        """
+        if isinstance(query, str):
+            query = parse_query(query)
+        folder = folder or query.folder
+
+        joins, where, params = [], [], []
+        select_snippet = "''"
+        order = "p.path, n.file_id"
+        match = fts_match(query.text)
+        if match:
+            joins.append("JOIN notes_fts ON notes_fts.rowid = n.doc_id")
+            where.append("notes_fts MATCH ?")
+            params.append(match)
+            select_snippet = "snippet(notes_fts, 0, '[', ']', '…', 12)"
+            order = "bm25(notes_fts)"
+        for field, value in query.fields:
+            where.append("n.doc_id IN (SELECT doc_id FROM fields WHERE field = ? AND value = ?)")
+            params.extend([field, value.strip().lower()])
+        for section, text in query.bullets:
+            where.append("n.doc_id IN (SELECT doc_id FROM bullets WHERE section = ? AND text LIKE ?)")
+            params.extend([section, f"%{text}%"])
+        if query.name:
+            where.append("p.name LIKE ?")
+            params.append(f"%{query.name}%")
+        with_clause = ""
+        if folder:
+            with_clause = (
+                "WITH RECURSIVE sub(id) AS (SELECT ? UNION SELECT f.folder_id FROM folders f "
+                "JOIN sub ON f.parent_id = sub.id) "
+            )
+            params.insert(0, folder)
+            where.append("p.folder_id IN sub")
+
+        sql = (
+            f"{with_clause}SELECT n.file_id, p.name, p.path, n.modified_time, {select_snippet}, n.front_matter "
+            f"FROM notes n {' '.join(joins)} "
+            f"{'JOIN' if folder else 'LEFT JOIN'} placement p ON p.file_id = n.file_id "
+            f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+            f"ORDER BY {order} LIMIT ?"
+        )
+        params.append(limit)
+        with span("search.query"):
+            rows = self._conn().execute(sql, params).fetchall()
+        return [
+            SearchHit(file_id, name, path, modified_time, " ".join(snippet.split()), json.loads(front_matter))
+            for file_id, name, path, modified_time, snippet, front_matter in rows
+        ]
+
+    def field_values(self, field, folder=None, limit=100):
+        """Các giá trị của một trường front matter (vd. mọi tag) kèm số note, nhiều nhất trước."""
+        params = [field]
+        sql = "SELECT f.value, COUNT(DISTINCT f.doc_id) AS n FROM fields f "
+        if folder:
+            sql = (
+                "WITH RECURSIVE sub(id) AS (SELECT ? UNION SELECT f.folder_id FROM folders f "
+                "JOIN sub ON f.parent_id = sub.id) " + sql +
+                "JOIN notes n ON n.doc_id = f.doc_id JOIN placement p ON p.file_id = n.file_id "
+                "WHERE f.field = ? AND p.folder_id IN sub "
+            )
+            params.insert(0, folder)
+        else:
+            sql += "WHERE f.field = ? "
+        sql += "GROUP BY f.value ORDER BY n DESC, f.value LIMIT ?"
+        params.append(limit)
+        return self._conn().execute(sql, params).fetchall()
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_search_index():
+    """SearchIndex dùng chung cho cả process."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = SearchIndex()
+        return _default_index
+
+
+def index_contents(entries):
+    """Hook cho đường tải nội dung: entries (file_id, modified_time, content); tắt bằng DRIVE2HTML_SEARCH_INDEX=0."""
+    if ENABLED:
+        get_search_index().index_many(entries)
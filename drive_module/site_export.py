@@ -0,0 +1,488 @@
+#site_export.py
+
+# Xuất cả cây ghi chú trên Drive thành site HTML tĩnh (mỗi file .md một trang, mỗi folder một index.html).
+#   python -m drive_module.cli export <folder_id|url> --out site/
+# Chạy tăng dần: build manifest nhớ chữ ký của từng trang, trang nào không đổi thì không render lại.
+
+import hashlib
+import html
+import json
+import os
+import posixpath
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import markdown
+
+from .drive_api import fetch_contents, list_folder_contents_recursive
+from .md_index import parse_markdown
+from .snippets import image_html, thumbnail_url, video_iframe
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+MANIFEST_NAME = ".drive2html-manifest.json"
+# Tăng khi template hoặc cách render đổi → mọi trang được render lại
+RENDERER_VERSION = 2
+# Cạnh dài của ảnh nhúng trong trang note / trong lưới ảnh của index
+EMBED_SIZE = 1600
+GALLERY_SIZE = 480
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists"]
+# Dưới ngưỡng này render ngay trong process hiện tại, không đáng để dựng process pool
+MIN_PARALLEL_PAGES = 16
+
+DRIVE_LINK_RE = re.compile(
+    r"https?://drive\.google\.com/"
+    r"(?:file/d/|open\?id=|thumbnail\?id=|uc\?(?:[^\s)\"'<>]*?&)?id=)"
+    r"([a-zA-Z0-9_-]+)[^\s)\"'<>\]]*"
+)
+BARE_LINK_RE = re.compile(r"^[ \t]*(" + DRIVE_LINK_RE.pattern + r")[ \t]*$", re.MULTILINE)
+# Link Drive kèm ngữ cảnh: "target" có khi URL là đích của [..](...) hoặc [..]: ..., "<...>" là autolink
+INLINE_LINK_RE = re.compile(
+    r"(?P<target>\]\(<?|\]:[ \t]*<?)?(?P<open><)?(?P<url>" + DRIVE_LINK_RE.pattern + r")(?P<close>>)?"
+)
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="vi">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body {{ max-width: 960px; margin: 2em auto; padding: 0 1em; font-family: system-ui, sans-serif; line-height: 1.6; }}
+nav.breadcrumbs {{ font-size: 0.9em; color: #666; }}
+img {{ max-width: 100%; border-radius: 6px; }}
+.video {{ position: relative; width: 100%; padding-bottom: 56.25%; height: 0; overflow: hidden; }}
+.video iframe {{ position: absolute; top: 0; left: 0; width: 100%; height: 100%; border: 0; }}
+.gallery {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); gap: 1em; }}
+.gallery figure {{ margin: 0; }}
+dl.front-matter {{ display: grid; grid-template-columns: max-content 1fr; gap: 0.2em 1em; font-size: 0.9em; }}
+dl.front-matter dt {{ font-weight: bold; }}
+</style>
+</head>
+<body>
+<nav class="breadcrumbs">{breadcrumbs}</nav>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+
+class ExportResult(NamedTuple):
+    rendered: int
+    skipped: int
+    removed: int
+    downloaded: int
+
+
+def slugify(name):
+    """Tên file/folder → tên an toàn cho đường dẫn (giữ chữ có dấu, bỏ ký tự đặc biệt)."""
+    slug = re.sub(r"[^\w\-]+", "-", name.strip().lower()).strip("-")
+    return slug or "untitled"
+
+
+def _unique(slug, used):
+    candidate = slug
+    i = 2
+    while candidate in used:
+        candidate = f"{slug}-{i}"
+        i += 1
+    used.add(candidate)
+    return candidate
+
+
+def _href(from_page, to_page):
+    return posixpath.relpath(to_page, posixpath.dirname(from_page) or ".")
+
+
+def strip_front_matter(content):
+    """Bỏ khối front matter '---' ở đầu file (nếu có) khỏi phần thân markdown."""
+    if not content.startswith("---"):
+        return content
+    end = content.find("\n---", 3)
+    if end < 0:
+        return content
+    line_end = content.find("\n", end + 4)
+    return "" if line_end < 0 else content[line_end + 1:]
+
+
+# --- lập kế hoạch site (process chính) ---
+
+class SitePlan:
+    """
+    Cấu trúc site dựng từ danh sách item phẳng của list_folder_contents_recursive:
+    đường dẫn trang của mọi folder/note, và bảng tra link Drive → ảnh/video/note trong cây.
+    """
+
+    def __init__(self, items, root_id, title):
+        self.root_id = root_id
+        self.folders = {root_id: {"name": title, "subfolders": [], "notes": [], "media": []}}
+        for item in items:
+            if item["mimeType"] == FOLDER_MIME:
+                self.folders.setdefault(item["id"], {"subfolders": [], "notes": [], "media": []})
+                self.folders[item["id"]]["name"] = item["name"]
+
+        self.notes = {}    # file_id -> item
+        self.media = {}    # file_id -> item
+        for item in items:
+            parents = item.get("parents") or []
+            if not parents or parents[0] not in self.folders:
+                continue
+            parent = self.folders[parents[0]]
+            mime = item["mimeType"]
+            if mime == FOLDER_MIME:
+                parent["subfolders"].append(item["id"])
+            elif mime == "text/markdown":
+                parent["notes"].append(item["id"])
+                self.notes[item["id"]] = item
+            elif mime.startswith(("image/", "video/")):
+                parent["media"].append(item["id"])
+                self.media[item["id"]] = item
+
+        self.folder_dirs = {}   # folder_id -> thư mục tương đối ("" là gốc)
+        self.note_paths = {}    # file_id -> đường dẫn trang .html
+        self.breadcrumbs = {}   # folder_id -> [(tên, folder_id)] từ gốc tới folder
+        self._assign_paths(root_id, "", [], set())
+
+    def _assign_paths(self, folder_id, directory, trail, visiting):
+        if folder_id in visiting or folder_id in self.folder_dirs:
+            return
+        visiting.add(folder_id)
+        folder = self.folders[folder_id]
+        self.folder_dirs[folder_id] = directory
+        self.breadcrumbs[folder_id] = trail + [(folder["name"], folder_id)]
+
+        # Sắp theo tên (rồi theo id) để đường dẫn ổn định giữa các lần build
+        folder["notes"].sort(key=lambda i: (self.notes[i]["name"].lower(), i))
+        folder["media"].sort(key=lambda i: (self.media[i]["name"].lower(), i))
+        folder["subfolders"].sort(key=lambda i: (self.folders[i]["name"].lower(), i))
+
+        used = {"index"}
+        for file_id in folder["notes"]:
+            slug = _unique(slugify(os.path.splitext(self.notes[file_id]["name"])[0]), used)
+            self.note_paths[file_id] = posixpath.join(directory, f"{slug}.html")
+        for sub in folder["subfolders"]:
+            slug = _unique(slugify(self.folders[sub]["name"]), used)
+            self._assign_paths(sub, posixpath.join(directory, slug), self.breadcrumbs[folder_id], visiting)
+        visiting.discard(folder_id)
+
+    def index_path(self, folder_id):
+        return posixpath.join(self.folder_dirs[folder_id], "index.html")
+
+    def resolve(self, file_id, from_page):
+        """Link Drive tới file_id hiển thị thế nào trong trang from_page; None nếu file không thuộc cây."""
+        if file_id in self.note_paths:
+            title = os.path.splitext(self.notes[file_id]["name"])[0]
+            return ["note", _href(from_page, self.note_paths[file_id]), title]
+        item = self.media.get(file_id)
+        if item is not None:
+            kind = "image" if item["mimeType"].startswith("image/") else "video"
+            return [kind, file_id, item["name"]]
+        return None
+
+    def _breadcrumbs(self, folder_id, page):
+        return [[name, _href(page, self.index_path(fid))] for name, fid in self.breadcrumbs[folder_id]]
+
+    def note_job(self, file_id, refs):
+        item = self.notes[file_id]
+        page = self.note_paths[file_id]
+        parent = item["parents"][0]
+        links = {}
+        for ref in sorted(refs):
+            resolved = self.resolve(ref, page)
+            if resolved:
+                links[ref] = resolved
+        return {
+            "kind": "note",
+            "path": page,
+            "title": os.path.splitext(item["name"])[0],
+            "modified": item.get("modifiedTime"),
+            "breadcrumbs": self._breadcrumbs(parent, page),
+            "links": links,
+        }
+
+    def index_job(self, folder_id):
+        folder = self.folders[folder_id]
+        page = self.index_path(folder_id)
+        return {
+            "kind": "index",
+            "path": page,
+            "title": folder["name"],
+            "breadcrumbs": self._breadcrumbs(folder_id, page)[:-1],
+            "folders": [
+                [self.folders[sub]["name"], _href(page, self.index_path(sub))]
+                for sub in folder["subfolders"] if sub in self.folder_dirs
+            ],
+            "notes": [
+                [os.path.splitext(self.notes[i]["name"])[0], _href(page, self.note_paths[i])]
+                for i in folder["notes"]
+            ],
+            "media": [
+                ["image" if self.media[i]["mimeType"].startswith("image/") else "video", i, self.media[i]["name"]]
+                for i in folder["media"]
+            ],
+        }
+
+    def note_ids(self):
+        return list(self.note_paths)
+
+    def folder_ids(self):
+        return list(self.folder_dirs)
+
+
+def signature(job):
+    """Chữ ký của trang: đổi khi nội dung nguồn, đường dẫn, breadcrumb hay link mà trang dùng thay đổi."""
+    payload = json.dumps([RENDERER_VERSION, job], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+# --- render (chạy trong process con) ---
+
+_md = None
+
+def _markdown():
+    global _md
+    if _md is None:
+        _md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return _md.reset()
+
+
+def _video_block(file_id):
+    return f'<div class="video">{video_iframe(file_id)}</div>'
+
+
+def rewrite_drive_links(body, links):
+    """
+    Link Drive trong thân markdown → nội dung nhúng:
+    - dòng chỉ có link ảnh/video → ảnh thumbnail / khung video
+    - link tới note khác trong cây → đường dẫn tương đối tới trang HTML của note đó
+      (đích của [..](...) thì thay URL, link nằm giữa câu thì thành [tên note](đường dẫn))
+    - link ảnh nằm trong ![...](...) → URL thumbnail
+    """
+    def bare(match):
+        resolved = links.get(match.group(2))
+        if resolved is None:
+            return match.group(0)
+        kind, value, name = resolved
+        if kind == "image":
+            return f"![{name}]({thumbnail_url(value, EMBED_SIZE, EMBED_SIZE)})"
+        if kind == "video":
+            return f"\n{_video_block(value)}\n"
+        return f"[{name}]({value})"
+
+    def inline(match):
+        resolved = links.get(DRIVE_LINK_RE.match(match.group("url")).group(1))
+        if resolved is None:
+            return match.group(0)
+        kind, value, name = resolved
+        target, opening, closing = match.group("target"), match.group("open") or "", match.group("close") or ""
+        if kind == "image":
+            return f"{target or ''}{opening}{thumbnail_url(value, EMBED_SIZE, EMBED_SIZE)}{closing}"
+        if kind != "note":
+            return match.group(0)
+        if target:
+            return f"{target}{value}{closing}"
+        # URL trơn giữa câu: markdown không tự tạo link → viết thành link (bỏ cặp <> của autolink)
+        label = name.replace("[", "\\[").replace("]", "\\]")
+        if opening and closing:
+            opening = closing = ""
+        return f"{opening}[{label}]({value}){closing}"
+
+    body = BARE_LINK_RE.sub(bare, body)
+    return INLINE_LINK_RE.sub(inline, body)
+
+
+def _format_value(value):
+    if isinstance(value, list):
+        return ", ".join(_format_value(v) for v in value)
+    if isinstance(value, dict):
+        return ", ".join(f"{k}: {_format_value(v)}" for k, v in value.items())
+    return str(value)
+
+
+def _render_note(job, content):
+    parsed = parse_markdown(content)
+    front_matter = parsed.front_matter if isinstance(parsed.front_matter, dict) else {}
+    title = front_matter.get("title")
+    if not isinstance(title, str) or not title.strip():
+        title = job["title"]
+
+    parts = []
+    meta = {k: v for k, v in front_matter.items() if k != "title"}
+    if meta:
+        rows = "".join(
+            f"<dt>{html.escape(str(k))}</dt><dd>{html.escape(_format_value(v))}</dd>"
+            for k, v in meta.items()
+        )
+        parts.append(f'<dl class="front-matter">{rows}</dl>')
+    body = rewrite_drive_links(strip_front_matter(content), job["links"])
+    parts.append(_markdown().convert(body))
+    return title, "\n".join(parts)
+
+
+def _render_index(job):
+    parts = []
+    if job["folders"]:
+        items = "".join(f'<li><a href="{html.escape(href)}">📁 {html.escape(name)}</a></li>'
+                        for name, href in job["folders"])
+        parts.append(f"<ul class=\"folders\">{items}</ul>")
+    if job["notes"]:
+        items = "".join(f'<li><a href="{html.escape(href)}">{html.escape(name)}</a></li>'
+                        for name, href in job["notes"])
+        parts.append(f"<ul class=\"notes\">{items}</ul>")
+
+    images = [(file_id, name) for kind, file_id, name in job["media"] if kind == "image"]
+    videos = [(file_id, name) for kind, file_id, name in job["media"] if kind == "video"]
+    if images:
+        figures = "".join(
+            f"<figure>{image_html(thumbnail_url(file_id, GALLERY_SIZE, GALLERY_SIZE), alt=html.escape(name, quote=True))}"
+            f"<figcaption>{html.escape(name)}</figcaption></figure>"
+            for file_id, name in images
+        )
+        parts.append(f'<div class="gallery">{figures}</div>')
+    for file_id, name in videos:
+        parts.append(f"<h3>{html.escape(name)}</h3>{_video_block(file_id)}")
+    return job["title"], "\n".join(parts)
+
+
+def render_page(job, content=None):
+    """HTML hoàn chỉnh của một trang (note hoặc index folder)."""
+    if job["kind"] == "note":
+        title, body = _render_note(job, content)
+    else:
+        title, body = _render_index(job)
+    breadcrumbs = " / ".join(
+        f'<a href="{html.escape(href)}">{html.escape(name)}</a>' for name, href in job["breadcrumbs"]
+    )
+    return PAGE_TEMPLATE.format(title=html.escape(title), breadcrumbs=breadcrumbs, body=body)
+
+
+def _render_task(task):
+    job, content = task
+    return render_page(job, content)
+
+
+def render_pages(tasks, max_workers=None):
+    """
+    Render danh sách (job, content) — song song trên process pool khi đủ nhiều trang.
+    Generator: trả HTML theo đúng thứ tự tasks để process chính ghi file dần.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(tasks) < MIN_PARALLEL_PAGES:
+        for task in tasks:
+            yield _render_task(task)
+        return
+    chunksize = max(1, len(tasks) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        yield from pool.map(_render_task, tasks, chunksize=chunksize)
+
+
+# --- ghi file + manifest ---
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != RENDERER_VERSION:
+        return {}
+    return manifest.get("pages", {})
+
+
+def _remove_page(out_dir, page):
+    path = os.path.join(out_dir, page)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    try:
+        os.removedirs(os.path.dirname(path))  # dọn thư mục rỗng (dừng ở thư mục còn file)
+    except OSError:
+        pass
+
+
+def export_site(root_id, out_dir, title=None, max_workers=None, force=False,
+                items=None, fetch=fetch_contents, progress=None):
+    """
+    Xuất cây thư mục root_id ra out_dir. Chỉ tải nội dung và render lại trang có chữ ký
+    khác lần build trước (file đổi modifiedTime, đổi tên/chuyển chỗ, hoặc note/ảnh mà nó link tới đổi).
+
+    - items: danh sách item đã liệt kê sẵn (mặc định list_folder_contents_recursive(root_id))
+    - fetch(dict file_id -> modifiedTime) → (dict file_id -> nội dung, số file phải tải)
+    - progress(done, total, page) được gọi sau mỗi trang được ghi
+    """
+    if items is None:
+        items = list_folder_contents_recursive(root_id)
+    plan = SitePlan(items, root_id, title or "Drive2HTML")
+    old_pages = load_manifest(out_dir)
+    pages = {}
+    pending = []        # (job, file_id) cần render
+    need_content = {}   # file_id -> modifiedTime
+
+    def unchanged(page, sig):
+        old = old_pages.get(page)
+        return not force and old is not None and old["sig"] == sig and os.path.exists(os.path.join(out_dir, page))
+
+    for folder_id in plan.folder_ids():
+        job = plan.index_job(folder_id)
+        sig = signature(job)
+        pages[job["path"]] = {"sig": sig}
+        if not unchanged(job["path"], sig):
+            pending.append((job, None))
+
+    for file_id in plan.note_ids():
+        page = plan.note_paths[file_id]
+        old = old_pages.get(page)
+        modified = plan.notes[file_id].get("modifiedTime")
+        if not force and old is not None and old.get("source") == file_id and old.get("modified") == modified:
+            # Nội dung không đổi → dùng lại danh sách link đã lưu, khỏi tải file
+            job = plan.note_job(file_id, old.get("refs", []))
+            sig = signature(job)
+            if unchanged(page, sig):
+                pages[page] = old
+                continue
+        pending.append((None, file_id))
+        need_content[file_id] = modified
+
+    contents, downloaded = fetch(need_content) if need_content else ({}, 0)
+
+    tasks = []
+    for job, file_id in pending:
+        if job is None:
+            content = contents[file_id]
+            refs = sorted(set(DRIVE_LINK_RE.findall(content)))
+            job = plan.note_job(file_id, refs)
+            pages[job["path"]] = {
+                "sig": signature(job), "source": file_id, "modified": job["modified"], "refs": refs
+            }
+            tasks.append((job, content))
+        else:
+            tasks.append((job, None))
+
+    os.makedirs(out_dir, exist_ok=True)
+    for done, ((job, _), page_html) in enumerate(zip(tasks, render_pages(tasks, max_workers)), 1):
+        _write_atomic(os.path.join(out_dir, job["path"]), page_html)
+        if progress:
+            progress(done, len(tasks), job["path"])
+
+    removed = 0
+    for page in old_pages.keys() - pages.keys():
+        _remove_page(out_dir, page)
+        removed += 1
+
+    _write_atomic(
+        os.path.join(out_dir, MANIFEST_NAME),
+        json.dumps({"version": RENDERER_VERSION, "root": root_id, "pages": pages}, ensure_ascii=False)
+    )
+    return ExportResult(len(tasks), len(pages) - len(tasks), removed, downloaded)
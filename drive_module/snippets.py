@@ -0,0 +1,127 @@
+#snippets.py
+
+# Tạo link / đoạn HTML / markdown cho ảnh và video trên Drive.
+# Không import Streamlit → dùng chung cho Drive_HTML.py và CLI (python -m drive_module.cli).
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple, Optional
+
+from .instrumentation import bind_trace
+from .media_size import get_media_size
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def thumbnail_url(file_id, width, height):
+    return f"https://drive.google.com/thumbnail?id={file_id}&sz=s{max(width, height)}"
+
+
+def preview_url(file_id):
+    return f"https://drive.google.com/file/d/{file_id}/preview"
+
+
+def image_html(src, alt="Preview", style=None):
+    if style:
+        return f"<img src='{src}' alt='{alt}' style='{style}'>"
+    return f"<img src='{src}' alt='{alt}'>"
+
+
+def image_markdown(url, alt="Preview"):
+    return f'![{alt}]({url})'
+
+
+def video_iframe(file_id):
+    return f"<iframe src='{preview_url(file_id)}' width='1024' height='576' allow='autoplay' allowfullscreen webkitallowfullscreen mozallowfullscreen></iframe>"
+
+
+def video_embed(file_id):
+    """Khung video co giãn theo bề rộng (tỉ lệ 16:9)."""
+    return f"""
+                        <style>
+                        .embed-container {{ position: relative; width: 100%; padding-bottom: 56.25%; height: 0; overflow: hidden; }}
+                        .embed-container iframe, .embed-container video {{ position: absolute; top:0; left:0; width:100%; height:100%; }}
+                        </style>
+
+                        <div class="embed-container">
+                        <iframe src="{preview_url(file_id)}" frameborder="0" allowfullscreen></iframe>
+                        </div>
+                    """
+
+
+def is_still_image(frames):
+    # 1 khung (hoặc không đếm được) → ảnh tĩnh, còn lại là ảnh động/video
+    return frames == 1 or frames < 0
+
+
+def iter_media_sizes(media_files, is_video=False, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Lấy kích thước nhiều MediaFile song song, trả về (vị trí, media, (w, h, frames), lỗi)
+    theo thứ tự hoàn thành. Lỗi của từng file không làm dừng cả lô.
+    """
+    media_files = list(media_files)
+    if not media_files:
+        return
+    measure = bind_trace(get_media_size)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(measure, media, is_video): i
+            for i, media in enumerate(media_files)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                yield i, media_files[i], future.result(), None
+            except Exception as e:
+                yield i, media_files[i], None, e
+
+
+class MediaSnippet(NamedTuple):
+    kind: str            # "image" | "video"
+    name: str
+    file_id: str
+    url: str             # thumbnail (ảnh) hoặc trang preview (video)
+    html: str
+    markdown: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    error: Optional[str] = None
+
+
+def image_snippet(media, size):
+    width, height, _ = size
+    url = thumbnail_url(media.id, width, height)
+    return MediaSnippet("image", media.name, media.id, url,
+                        image_html(url, alt=media.name), image_markdown(url, alt=media.name),
+                        width, height)
+
+
+def video_snippet(media):
+    iframe = video_iframe(media.id)
+    return MediaSnippet("video", media.name, media.id, preview_url(media.id), iframe, iframe)
+
+
+def build_snippets(images, videos=(), is_video=False, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Snippet cho toàn bộ ảnh (giữ thứ tự đầu vào, kích thước lấy song song) rồi tới video.
+    Ảnh động (nhiều khung) bị bỏ qua như trên giao diện; ảnh lỗi có error và không có link.
+    """
+    images = list(images)
+    snippets = [None] * len(images)
+    for i, media, size, error in iter_media_sizes(images, is_video, max_workers):
+        if error is not None:
+            snippets[i] = MediaSnippet("image", media.name, media.id, "", "", "", error=str(error))
+        elif is_still_image(size[2]):
+            snippets[i] = image_snippet(media, size)
+    result = [s for s in snippets if s is not None]
+    result.extend(video_snippet(video) for video in videos)
+    return result
+
+
+def mul_link(snippets):
+    """Khối link gộp ở sidebar: '- url' cho ảnh, iframe cho video."""
+    lines = []
+    for s in snippets:
+        if s.error:
+            continue
+        lines.append(f"- {s.url}" if s.kind == "image" else s.html)
+    return "\n".join(lines)
@@ -0,0 +1,28 @@
+#sqlite_store.py
+
+# Phần SQLite dùng chung cho các kho trên đĩa (content_cache, search_index):
+# connection WAL cho nhiều thread/process và transaction ghi BEGIN IMMEDIATE
+
+import sqlite3
+
+
+def connect(path):
+    """Connection autocommit (transaction tự quản bằng Transaction), WAL + busy timeout 30 giây."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK để các process ghi không giẫm lên nhau."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -0,0 +1,197 @@
+#tree_sync.py
+
+import json
+import os
+import tempfile
+import threading
+
+from .content_cache import DEFAULT_CACHE_DIR
+from .instrumentation import span
+from .scheduler import get_scheduler
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+CHANGE_FIELDS = (
+    "nextPageToken, newStartPageToken, "
+    "changes(fileId, removed, file(id, name, mimeType, parents, modifiedTime, trashed))"
+)
+
+
+class TreeSync:
+    """
+    Giữ ảnh chụp (snapshot) danh sách item của một cây thư mục cùng start page token
+    của Drive Changes API. Lần đầu liệt kê toàn bộ bằng crawl(root_id); các lần sau chỉ
+    đọc changes feed rồi vá snapshot (thêm, di chuyển, đổi tên, trash/xóa).
+
+    service_factory() trả về Drive service dùng được ở thread đang gọi.
+    on_invalidate(file_ids) được gọi với các file đã đổi nội dung hoặc bị gỡ khỏi cây,
+    để xóa các entry cache tương ứng.
+    """
+
+    def __init__(self, service_factory, root_id, crawl, state_dir=DEFAULT_CACHE_DIR, on_invalidate=None):
+        self.service_factory = service_factory
+        self.root_id = root_id
+        self.crawl = crawl
+        self.on_invalidate = on_invalidate
+        self.state_path = os.path.join(state_dir, f"tree_{root_id}.json")
+        self.items = None
+        self.page_token = None
+        # Tăng mỗi khi snapshot đổi → caller biết khi nào cần dựng lại cây
+        self.version = 0
+        self._lock = threading.Lock()
+
+    # --- snapshot trên đĩa ---
+
+    def load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if state.get("root_id") != self.root_id or not state.get("page_token"):
+            return False
+        self.page_token = state["page_token"]
+        self.items = {item["id"]: item for item in state["items"]}
+        self.version += 1
+        return True
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        state = {
+            "root_id": self.root_id,
+            "page_token": self.page_token,
+            "items": list(self.items.values()),
+        }
+        # Ghi ra file tạm rồi os.replace để không bao giờ để lại snapshot dở dang
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.state_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    # --- đồng bộ ---
+
+    def full_sync(self):
+        # Lấy token TRƯỚC khi liệt kê để không bỏ sót thay đổi xảy ra trong lúc liệt kê
+        self.page_token = get_scheduler().execute(
+            self.service_factory().changes().getStartPageToken()
+        )["startPageToken"]
+        self.items = {item["id"]: item for item in self.crawl(self.root_id)}
+        self.version += 1
+        self.save_state()
+
+    def sync(self):
+        """Trả về danh sách item hiện tại của cây (dùng được cho build_tree)."""
+        with self._lock:
+            return self._sync()
+
+    def _sync(self):
+        if self.items is None and not self.load_state():
+            self.full_sync()
+            return list(self.items.values())
+
+        changes, self.page_token = self._fetch_changes()
+        if changes:
+            self.version += 1
+            invalidated = self._apply_changes(changes)
+            if invalidated and self.on_invalidate:
+                self.on_invalidate(invalidated)
+        self.save_state()
+        return list(self.items.values())
+
+    def _fetch_changes(self):
+        changes = []
+        token = self.page_token
+        while True:
+            with span("drive.changes"):
+                result = get_scheduler().execute(self.service_factory().changes().list(
+                    pageToken=token,
+                    fields=CHANGE_FIELDS,
+                    pageSize=1000,
+                    includeRemoved=True,
+                    spaces="drive"
+                ))
+            changes.extend(result.get("changes", []))
+            if "newStartPageToken" in result:
+                return changes, result["newStartPageToken"]
+            token = result["nextPageToken"]
+
+    def _folder_ids(self):
+        folders = {i for i, item in self.items.items() if item["mimeType"] == FOLDER_MIME}
+        folders.add(self.root_id)
+        return folders
+
+    def _children_map(self):
+        """id cha -> các id con, dựng một lần cho cả đợt gỡ (tránh quét toàn snapshot cho mỗi item)."""
+        children = {}
+        for item_id, item in self.items.items():
+            for parent in item.get("parents", []):
+                children.setdefault(parent, []).append(item_id)
+        return children
+
+    def _remove_subtree(self, item_id, children):
+        """Gỡ item (và mọi item con nếu là folder) khỏi snapshot, trả về các id đã gỡ."""
+        removed = []
+        stack = [item_id]
+        while stack:
+            current = stack.pop()
+            if self.items.pop(current, None) is None:
+                continue
+            removed.append(current)
+            stack.extend(children.get(current, ()))
+        return removed
+
+    def _apply_changes(self, changes):
+        invalidated = set()
+        updated = {}
+
+        # Changes feed có thể lặp một file nhiều lần, bản sau cùng là bản đúng
+        for change in changes:
+            file = change.get("file")
+            if change.get("removed") or not file or file.get("trashed"):
+                updated[change["fileId"]] = None
+            else:
+                updated[change["fileId"]] = file
+
+        removed = [file_id for file_id, file in updated.items() if file is None]
+        if removed:
+            children = self._children_map()
+            for file_id in removed:
+                invalidated.update(self._remove_subtree(file_id, children))
+
+        # Gắn lặp cho tới khi ổn định: folder mới và file con có thể đến theo thứ tự bất kỳ
+        pending = {fid: f for fid, f in updated.items() if f is not None}
+        folders = self._folder_ids()
+        new_folders = []
+        progress = True
+        while pending and progress:
+            progress = False
+            for file_id, file in list(pending.items()):
+                if not folders.intersection(file.get("parents", [])):
+                    continue
+                del pending[file_id]
+                progress = True
+                old = self.items.get(file_id)
+                if old is not None and old.get("modifiedTime") != file.get("modifiedTime"):
+                    invalidated.add(file_id)
+                if file["mimeType"] == FOLDER_MIME and file_id not in folders:
+                    folders.add(file_id)
+                    if old is None:
+                        new_folders.append(file_id)
+                self.items[file_id] = {k: v for k, v in file.items() if k != "trashed"}
+
+        # Không còn nằm dưới cây (bị chuyển ra ngoài) → gỡ nếu trước đó có trong snapshot
+        moved_out = [file_id for file_id in pending if file_id in self.items]
+        if moved_out:
+            children = self._children_map()
+            for file_id in moved_out:
+                invalidated.update(self._remove_subtree(file_id, children))
+
+        # Folder chuyển vào từ nơi khác mang theo nội dung cũ không có trong changes feed
+        for folder_id in new_folders:
+            for item in self.crawl(folder_id):
+                self.items.setdefault(item["id"], item)
+
+        return invalidated
@@ -0,0 +1,171 @@
+#yaml_merge.py
+
+import itertools
+from collections import OrderedDict
+
+
+def freeze(value):
+    """
+    Khóa hashable đại diện cho value, bằng nhau khi và chỉ khi value == nhau
+    (dict/list lồng nhau được đóng băng đệ quy). Báo TypeError nếu không đóng băng được.
+    """
+    if isinstance(value, dict):
+        return ("__dict__", frozenset((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("__list__", tuple(freeze(v) for v in value))
+    hash(value)
+    return value
+
+
+class _ListIndex:
+    """Tập "đã thấy" của một list trong kết quả merge: phần hashable tra O(1), phần còn lại so tuần tự."""
+
+    __slots__ = ("items", "hashed", "unhashable")
+
+    def __init__(self, items):
+        self.items = items
+        self.hashed = set()
+        self.unhashable = []
+        for x in items:
+            self._remember(x)
+
+    def _remember(self, x):
+        try:
+            self.hashed.add(freeze(x))
+        except TypeError:
+            self.unhashable.append(x)
+
+    def append_new(self, values):
+        for x in values:
+            try:
+                key = freeze(x)
+            except TypeError:
+                if x in self.unhashable:
+                    continue
+                self.unhashable.append(x)
+            else:
+                if key in self.hashed:
+                    continue
+                self.hashed.add(key)
+            self.items.append(x)
+
+
+def _copy(value):
+    # Không giữ tham chiếu tới document nguồn: kết quả merge bị sửa tiếp ở các lần sau
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def merge_into(d, u, indexes=None):
+    """
+    Merge dict u vào dict d như deep_update: dict merge sâu, list nối thêm phần tử chưa có,
+    khác kiểu thì ghi đè. indexes (id(list) -> _ListIndex) giữ tập đã thấy giữa các lần gọi
+    để tổng chi phí merge N document là tuyến tính.
+    """
+    if indexes is None:
+        indexes = {}
+    for k, v in u.items():
+        if k in d:
+            current = d[k]
+            if isinstance(current, dict) and isinstance(v, dict):
+                merge_into(current, v, indexes)
+            elif isinstance(current, list) and isinstance(v, list):
+                index = indexes.get(id(current))
+                if index is None or index.items is not current:
+                    index = indexes[id(current)] = _ListIndex(current)
+                index.append_new(_copy(x) for x in v)
+            else:
+                d[k] = _copy(v)  # ghi đè nếu không cùng type
+        else:
+            d[k] = _copy(v)
+    return d
+
+
+class YamlMerger:
+    """
+    Merge front matter của nhiều file theo thứ tự nguồn, hỗ trợ merge lại tăng dần.
+
+    - add/update của nguồn mới (nằm cuối) chỉ merge thêm document đó vào kết quả hiện có
+    - update của nguồn đã có hoặc remove: kết quả được dựng lại từ các document đã
+      phân tích sẵn (không phân tích lại YAML), ở lần đọc `merged` kế tiếp
+    - sync() đối chiếu với danh sách nguồn hiện tại, chỉ phân tích nguồn mới/đổi version
+    """
+
+    def __init__(self, docs=None):
+        self._docs = OrderedDict()
+        self._versions = {}
+        self._merged = {}
+        self._indexes = {}
+        self._dirty = False
+        self._anonymous = itertools.count()
+        if docs is not None:
+            self.extend(docs)
+
+    def extend(self, docs):
+        """docs: iterable các document (dict) hoặc cặp (source_id, document), merge dạng luồng."""
+        for doc in docs:
+            if isinstance(doc, tuple):
+                self.update(*doc)
+            else:
+                self.update(("__anonymous__", next(self._anonymous)), doc)
+        return self
+
+    def update(self, source_id, doc):
+        doc = doc or {}
+        if source_id in self._docs:
+            if self._docs[source_id] == doc:
+                return
+            self._docs[source_id] = doc
+            self._dirty = True
+            return
+        self._docs[source_id] = doc
+        if not self._dirty and doc:
+            merge_into(self._merged, doc, self._indexes)
+
+    def remove(self, source_id):
+        self._versions.pop(source_id, None)
+        if self._docs.pop(source_id, None):
+            self._dirty = True
+
+    def sync(self, entries):
+        """
+        entries: (source_id, version, load) theo thứ tự nguồn hiện tại; load() trả về document.
+        load() chỉ được gọi cho nguồn mới hoặc đổi version; nguồn không còn trong entries bị gỡ.
+        Chỉ thêm nguồn vào cuối → merge tăng dần, còn lại dựng lại từ document đã có.
+        Trả về kết quả merge (dùng chung với merger, không sửa trực tiếp).
+        """
+        order = []
+        for source_id, version, load in entries:
+            order.append(source_id)
+            if source_id in self._docs and self._versions.get(source_id) == version:
+                continue
+            self._versions[source_id] = version
+            self.update(source_id, load())
+        current = set(order)
+        for source_id in [s for s in self._docs if s not in current]:
+            self.remove(source_id)
+        # Nguồn mới chen giữa hoặc đổi thứ tự → thứ tự merge phải theo thứ tự nguồn hiện tại
+        if list(self._docs) != order:
+            self._docs = OrderedDict((s, self._docs[s]) for s in order)
+            self._dirty = True
+        return self.merged
+
+    def __contains__(self, source_id):
+        return source_id in self._docs
+
+    def sources(self):
+        return list(self._docs)
+
+    @property
+    def merged(self):
+        if self._dirty:
+            self._merged = {}
+            self._indexes = {}
+            for doc in self._docs.values():
+                if doc:
+                    merge_into(self._merged, doc, self._indexes)
+            self._dirty = False
+        return self._merged